@@ -0,0 +1,351 @@
+"""
+# Benchmarks for musicSearch
+#
+# times every search function on synthetic scores of growing size and on real scores,
+#    and reports throughput (notes per second), latency percentiles and peak memory
+#
+#    python benchmark.py                                   # 1k, 10k, 100k and 1M notes
+#    python benchmark.py --sizes 1000 10000 --save base.json
+#    python benchmark.py --compare base.json               # exits with 1 if anything got slower
+#
+# Synthetic scores of any size are made straight into a ScoreIndex (see syntheticIndex()), since
+#    making a million music21 Notes would take longer than the searches themselves.
+# Building the index from a real Stream and coloring the score need music21 objects,
+#    so those are only timed up to --stream-limit notes.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+import contextlib
+from collections import namedtuple
+import numpy
+import music21
+from music21 import stream, note
+import musicSearch
+
+
+SIZES = (1000, 10000, 100000, 1000000) # total number of notes of the synthetic scores
+PARTS = 4 # parts of a synthetic score
+STEPS = 'CDEFGAB'
+SEMITONES = (0, 2, 4, 5, 7, 9, 11) # of every step of C major above C
+DURATIONS = (0.5, 0.5, 1.0, 1.0, 1.0, 2.0) # quarter lengths the synthetic notes pick from
+DURATION_NAMES = {0.5: 'eighth', 1.0: 'quarter', 2.0: 'half'}
+FUGUE_SOURCE = 'bach/artOfFugue_bwv1080/' # the Art of the Fugue in music21's corpus, when it's there
+CHORALE_SOURCES = ('bach/bwv66.6', 'bach/bwv1.6') # timed instead when it isn't, every corpus has these
+
+NOTES = 'C D E F' # motifs searched for, all of them appear in the synthetic scores
+RHYTHM = 'C4 D4 E8 F8'
+CONTOUR = '*uud'
+CONTOUR_RHYTHM = 'C4 D4 E4 F4'
+
+SyntheticPitch = namedtuple('SyntheticPitch', ['midi', 'pitchClass', 'diatonicNoteNum', 'ps', 'name', 'alter', 'octave'])
+SyntheticDuration = namedtuple('SyntheticDuration', ['quarterLength', 'type'])
+SyntheticNote = namedtuple('SyntheticNote', ['isNote', 'isRest', 'pitch', 'duration', 'offset', 'measureNumber'])
+
+
+def syntheticElements(count, seed):
+    """
+    # input: number of notes and rests, and the seed of the random walk
+    # output: list of SyntheticNotes, a random stepwise walk over C major with the odd leap and rest
+    #    they have everything PartFeatures reads from a Note or Rest
+    """
+    generator = random.Random(seed)
+    elements = []
+    degree = 28 # C4, as steps above C0
+    offset = 0.0
+
+    for num in range(0, count):
+        quarterLength = generator.choice(DURATIONS)
+        thisDuration = SyntheticDuration(quarterLength, DURATION_NAMES[quarterLength])
+        measureNumber = int(offset // 4) + 1
+
+        if generator.random() < 0.05: # a rest now and then
+            elements.append(SyntheticNote(False, True, None, thisDuration, offset, measureNumber))
+        else:
+            degree = min(max(degree + generator.choice((-1, -1, 1, 1, -2, 2, 0, -4, 4)), 14), 42) # C2 to C6
+            octave, step = divmod(degree, 7)
+            midi = 12 * (octave + 1) + SEMITONES[step]
+            thisPitch = SyntheticPitch(midi, midi % 12, degree + 1, float(midi), STEPS[step], 0.0, octave)
+            elements.append(SyntheticNote(True, False, thisPitch, thisDuration, offset, measureNumber))
+
+        offset = offset + quarterLength
+
+    return elements
+
+
+def syntheticIndex(size, seed = 0):
+    """
+    # input: total number of notes, and a seed
+    # output: a ScoreIndex of PARTS parts of synthetic notes, without any music21 objects
+    """
+    index = musicSearch.ScoreIndex(None)
+    index.parts = [musicSearch.PartFeatures(syntheticElements(size // PARTS, seed + partNum)) for partNum in range(0, PARTS)]
+    index.clefs = ['TrebleClef'] * PARTS
+    return index
+
+
+def syntheticScore(size, seed = 0):
+    """
+    # input: total number of notes, and a seed
+    # output: a music21 Score with the very same notes as syntheticIndex(size, seed)
+    """
+    score = stream.Score()
+    for partNum in range(0, PARTS):
+        part = stream.Part()
+        for element in syntheticElements(size // PARTS, seed + partNum):
+            if element.isNote:
+                newNote = note.Note(element.pitch.name + str(element.pitch.octave))
+            else:
+                newNote = note.Rest()
+            newNote.duration.quarterLength = element.duration.quarterLength
+            part.append(newNote)
+        score.insert(0, part.makeMeasures())
+    return score
+
+
+def noteCount(index):
+    return sum(len(part) for part in index.parts)
+
+
+def timeCall(function, repeat):
+    """
+    # input: a function taking no arguments, and how many times to call it
+    # output: (list of the time of every call in seconds, peak memory of one more call in bytes)
+    #    whatever function prints is thrown away
+    """
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            for num in range(0, repeat):
+                gc.collect()
+                start = time.perf_counter()
+                function()
+                times.append(time.perf_counter() - start)
+
+            tracemalloc.start() # apart from the timed calls, tracing slows everything down
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return (times, peak)
+
+
+def summarize(times, peak, notes):
+    """
+    # input: the times and peak memory from timeCall(), and how many notes were searched
+    # output: dictionary of the results, as saved in the baseline
+    """
+    return {'notes': notes,
+            'repeat': len(times),
+            'p50': float(numpy.percentile(times, 50)),
+            'p90': float(numpy.percentile(times, 90)),
+            'p99': float(numpy.percentile(times, 99)),
+            'notesPerSecond': notes / max(float(numpy.percentile(times, 50)), 1e-9),
+            'peakBytes': peak}
+
+
+def searchCases(index):
+    """
+    # input: a ScoreIndex
+    # output: list of (name, function) of every search to time on it
+    #    motifs are given as strings, so nothing needs the score itself
+    """
+    return [('exactNoteSearch', lambda: musicSearch.exactNoteSearch(index, 0, 0, 0, notes = NOTES, records = 1)),
+            ('exactPitchSearch', lambda: musicSearch.exactPitchSearch(index, 0, 0, 0, notes = NOTES, records = 1)),
+            ('exactRhythmSearch', lambda: musicSearch.exactRhythmSearch(index, 0, 0, 0, rhythm = RHYTHM, records = 1)),
+            ('exactIntervalSearch', lambda: musicSearch.exactIntervalSearch(index, 0, 0, 0, notes = NOTES, records = 1)),
+            ('genericIntervalSearch', lambda: musicSearch.genericIntervalSearch(index, 0, 0, 0, notes = NOTES, records = 1)),
+            ('genericIntervalSearch(approx, inverse)', lambda: musicSearch.genericIntervalSearch(index, 0, 0, 0, notes = NOTES,
+                                                                                              approx = 1, inverse = 1, records = 1)),
+            ('exactContourSearch', lambda: musicSearch.exactContourSearch(index, 0, 0, 0, contour = CONTOUR, records = 1)),
+            ('rhythmContourSearch', lambda: musicSearch.rhythmContourSearch(index, 0, 0, 0, contour = CONTOUR,
+                                                                            rhythm = CONTOUR_RHYTHM, records = 1))]
+
+
+def benchmarkIndex(label, index, repeat, results, print_ = 1):
+    """
+    # input: a label for the score, its ScoreIndex, how many times to call every search,
+    #    the dictionary to put the results in, and whether to print them as they come
+    """
+    notes = noteCount(index)
+    for (name, function) in searchCases(index):
+        (times, peak) = timeCall(function, repeat)
+        key = '%s %s' % (name, label)
+        results[key] = summarize(times, peak, notes)
+        if print_:
+            printResult(key, results[key])
+
+
+def benchmarkStreams(size, repeat, results, print_ = 1):
+    """
+    # input: total number of notes, how many times to call every function, the results dictionary, and print_
+    # times what needs real music21 objects: indexing a Stream, and coloring the matches with colorScore()
+    """
+    score = syntheticScore(size)
+
+    (times, peak) = timeCall(lambda: musicSearch.ScoreIndex(score), repeat)
+    key = 'ScoreIndex synthetic-%d' % size
+    results[key] = summarize(times, peak, size)
+    if print_:
+        printResult(key, results[key])
+
+    index = musicSearch.ScoreIndex(score)
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            matchList = musicSearch.exactIntervalSearch(index, 0, 0, 0, notes = NOTES, records = 1)
+    matchTupleList = [(match, match.partNum) for match in matchList]
+
+    (times, peak) = timeCall(lambda: musicSearch.colorScore(index, matchTupleList), repeat)
+    key = 'colorScore synthetic-%d' % size
+    results[key] = summarize(times, peak, size)
+    if print_:
+        printResult(key, results[key])
+
+
+def benchmarkParsers(repeat, results, print_ = 1):
+    """
+    # input: how many times to call every parser, the results dictionary, and print_
+    # times the string parsers on 1000 note strings, 'notes' being the number of notes parsed
+    """
+    generator = random.Random(0)
+    names = ' '.join(generator.choice(STEPS) + generator.choice(('', '#', '-')) for num in range(0, 1000))
+    rhythms = ' '.join(generator.choice(STEPS) + generator.choice(('4', '8', '16', '4.')) for num in range(0, 1000))
+    contour = '*' + ''.join(generator.choice('udr') for num in range(0, 999))
+
+    for (name, function) in (('stringToNotes', lambda: musicSearch.stringToNotes(names)),
+                             ('stringToNotesRhythm', lambda: musicSearch.stringToNotesRhythm(rhythms)),
+                             ('contourToNotes', lambda: musicSearch.contourToNotes(contour))):
+        (times, peak) = timeCall(function, repeat)
+        results[name] = summarize(times, peak, 1000)
+        if print_:
+            printResult(name, results[name])
+
+
+def benchmarkScores(paths, repeat, results, print_ = 1):
+    """
+    # input: file paths of real scores, how many times to call every search, the results dictionary, and print_
+    # times parsing and indexing every score, then every search on it
+    """
+    for path in paths:
+        label = os.path.splitext(os.path.basename(path))[0]
+        (times, peak) = timeCall(lambda: musicSearch.ScoreIndex(music21.converter.parse(path)), 1)
+        index = musicSearch.ScoreIndex(music21.converter.parse(path), path)
+        key = 'parse+ScoreIndex ' + label
+        results[key] = summarize(times, peak, noteCount(index))
+        if print_:
+            printResult(key, results[key])
+        benchmarkIndex(label, index, repeat, results, print_)
+
+
+def printResult(key, result):
+    print('%-55s %9d notes  p50 %9.4fs  p90 %9.4fs  p99 %9.4fs  %12.0f notes/s  peak %8.1f MB' %
+          (key, result['notes'], result['p50'], result['p90'], result['p99'], result['notesPerSecond'],
+           result['peakBytes'] / 1e6))
+
+
+def compareResults(results, baseline, threshold, minSeconds = 0.01):
+    """
+    # input: results of this run, those of a saved baseline, how many times slower (p50) counts as a regression,
+    #    and the shortest p50 (in seconds) worth flagging, anything quicker being mostly timer noise
+    # output: list of the keys that got slower than that
+    #    prints the ratio of every result present in both
+    """
+    regressions = []
+    print('\nCompared to the baseline (p50 now / p50 then):')
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        ratio = results[key]['p50'] / max(baseline[key]['p50'], 1e-9)
+        flag = ''
+        if ratio > threshold and max(results[key]['p50'], baseline[key]['p50']) >= minSeconds:
+            flag = '  <-- slower'
+            regressions.append(key)
+        print('\t%-55s %6.2fx%s' % (key, ratio, flag))
+    return regressions
+
+
+def environment():
+    return {'python': platform.python_version(),
+            'music21': music21.VERSION_STR,
+            'numpy': numpy.__version__,
+            'machine': platform.machine(),
+            'system': platform.system(),
+            'processor': platform.processor(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the musicSearch search functions.')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = list(SIZES),
+                        help = 'total notes of the synthetic scores (default: %(default)s)')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'calls of every function per size (default: %(default)s)')
+    parser.add_argument('--stream-limit', type = int, default = 10000,
+                        help = 'largest size to build real music21 Streams for, to time ScoreIndex and colorScore (default: %(default)s)')
+    parser.add_argument('--score', action = 'append', default = [],
+                        help = 'score file (or corpus path) to time as well, can be given more than once '
+                               '(default: the Art of the Fugue movements, or two Bach chorales if music21 does not have them)')
+    parser.add_argument('--save', help = 'write the results to this JSON file, as a baseline')
+    parser.add_argument('--compare', help = 'compare the results with this JSON baseline')
+    parser.add_argument('--threshold', type = float, default = 1.25,
+                        help = 'p50 ratio above which a result counts as slower than the baseline (default: %(default)s)')
+    parser.add_argument('--min-seconds', type = float, default = 0.01,
+                        help = 'results quicker than this are compared but never counted as slower (default: %(default)s)')
+    options = parser.parse_args(arguments)
+
+    paths = [] # found before anything is timed, so a wrong --score fails straight away
+    for source in options.score:
+        sourcePaths = musicSearch.scorePaths(source)
+        if not sourcePaths:
+            parser.error('no score found for ' + source)
+        paths.extend(sourcePaths)
+    if not options.score:
+        paths = musicSearch.scorePaths(FUGUE_SOURCE)
+        if not paths: # left out of some music21 releases
+            print('The Art of the Fugue (%s) is not in music21\'s corpus, timing %s instead\n' %
+                  (FUGUE_SOURCE, ', '.join(CHORALE_SOURCES)), file = sys.stderr)
+            for source in CHORALE_SOURCES:
+                paths.extend(musicSearch.scorePaths(source))
+
+    results = {}
+
+    print('Synthetic scores:')
+    for size in options.sizes:
+        repeat = options.repeat if size < 1000000 else max(1, options.repeat // 2) # a million notes takes a while
+        index = syntheticIndex(size)
+        benchmarkIndex('synthetic-%d' % size, index, repeat, results)
+        if size <= options.stream_limit:
+            benchmarkStreams(size, repeat, results)
+        del index
+
+    print('\nString parsers:')
+    benchmarkParsers(options.repeat, results)
+
+    print('\nScores:')
+    benchmarkScores(paths, options.repeat, results)
+
+    if options.save:
+        with open(options.save, 'w') as baselineFile:
+            json.dump({'environment': environment(), 'results': results}, baselineFile, indent = 1, sort_keys = True)
+        print('\nResults saved to ' + options.save)
+
+    if options.compare:
+        with open(options.compare) as baselineFile:
+            baseline = json.load(baselineFile)
+        regressions = compareResults(results, baseline['results'], options.threshold, options.min_seconds)
+        if regressions:
+            print('%d result(s) slower than the baseline' % len(regressions))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
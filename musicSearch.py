@@ -1,5 +1,305 @@
 from __future__ import print_function
-from music21 import stream, note, duration, interval, corpus
+import os
+import sys
+import pickle
+import hashlib
+import zipfile
+import bisect
+import heapq
+import time
+import functools
+import contextlib
+import logging
+import json
+import csv
+import io
+import re
+import glob
+import fnmatch
+import shlex
+import argparse
+import asyncio
+import http
+import threading
+from collections import namedtuple, deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy
+from music21 import stream, note, duration, interval, corpus, converter
+
+
+NO_INTERVAL = 9999 # stands in for an interval/contour step that touches a rest or chord
+    # no real interval can ever be this big, so it never matches anything in a motif
+
+DURATION_TYPES = ('duplex-maxima', 'maxima', 'longa', 'breve', 'whole', 'half', 'quarter', 'eighth',
+                  '16th', '32nd', '64th', '128th', '256th', '512th', '1024th', '2048th',
+                  'zero', 'complex', 'inexpressible') # a duration type is encoded as its place in this tuple
+
+CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.musicSearch') # default place for cachedScoreIndex()
+CACHE_VERSION = 2 # bump whenever PartFeatures changes, so old cache files get rebuilt
+
+APPROX_CLASSES = {2: 1001, 3: 1001, -2: -1001, -3: -1001, # 'steps'
+                  4: 1002, 5: 1002, -4: -1002, -5: -1002, # 'perfect'
+                  6: 1003, 7: 1003, -6: -1003, -7: -1003} # 'leaps'
+    # directed generic interval -> its group for approxInterval(), no real interval is ever that big
+
+HASH_BASE = 1000003 # rolling hash of a window of intervals: its intervals as digits in this base...
+HASH_MODULUS = (1 << 61) - 1 # ...modulo this (Mersenne) prime
+
+SCORE_EXTENSIONS = ('.xml', '.mxl', '.musicxml', '.krn', '.abc', '.mid', '.midi', '.zip') # files scorePaths() picks up
+MOTIF_CACHE_SIZE = 512 # motifs compiledMotif() keeps parsed, the least recently used one goes first
+
+currentStats = None # SearchStats of the search running right now, if anyone asked for them (see recordStats())
+statsHook = None # function given the SearchStats of every search, see setStatsHook()
+
+logger = logging.getLogger('musicSearch') # where everything the search functions would print goes in quiet mode
+quietLevel = None # logging level of quiet mode, None to print as usual (see setQuiet())
+pendingText = '' # the start of a line said with end = '' in quiet mode, logged once the line is done
+
+
+class SearchStats(object):
+    """
+    # Where the time of a search went
+    #
+    # pass one to any search function as stats = SearchStats() and it gets filled in (see recordStats()):
+    #
+    #    stats = SearchStats()
+    #    exactIntervalSearch(score, 0, 0, 5, stats = stats)
+    #    print(stats.report())
+    #
+    # attributes:
+    #    function - name of the search function
+    #    calls - how many searches were added up in here
+    #    total - seconds for the whole of the calls
+    #    phases - phase name -> seconds spent in it, not counting the phases inside it:
+    #        'flatten' - part.flat of every part
+    #        'notesAndRests' - getting the notes and rests of every flattened part
+    #        'features' - reading the notes of every part, and of the motif, into PartFeatures
+    #        'motif' - parsing the motif string, or taking it from the score
+    #        'match' - scanning the score for the motif
+    #        'excerpt' - making the match Streams (or MatchRecords)
+    #        'color' - coloring the score
+    #    windows - places in the score the motif was compared against
+    #    earlyBreaks - times a scan stopped before the end of the part (nothing left that could match, or a limit reached)
+    #    matches - matches found
+    """
+
+    def __init__(self, function = ''):
+        self.function = function
+        self.calls = 0
+        self.total = 0.0
+        self.phases = {}
+        self.windows = 0
+        self.earlyBreaks = 0
+        self.matches = 0
+        self.openPhases = [] # time taken by the phases inside every phase still going on
+
+
+    def add(self, other):
+        # adds the numbers of another SearchStats to these
+        self.calls = self.calls + other.calls
+        self.total = self.total + other.total
+        for (name, seconds) in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.windows = self.windows + other.windows
+        self.earlyBreaks = self.earlyBreaks + other.earlyBreaks
+        self.matches = self.matches + other.matches
+
+
+    def toDict(self):
+        # plain dictionary of the numbers, e.g. to write as JSON
+        return {'function': self.function, 'calls': self.calls, 'total': self.total, 'phases': dict(self.phases),
+                'windows': self.windows, 'earlyBreaks': self.earlyBreaks, 'matches': self.matches}
+
+
+    def report(self):
+        # the numbers as a few lines of text, slowest phase first
+        lines = ['%s: %d call(s), %.4fs, %d window(s), %d early break(s), %d match(es)' %
+                 (self.function, self.calls, self.total, self.windows, self.earlyBreaks, self.matches)]
+        for (name, seconds) in sorted(self.phases.items(), key = lambda phase: -phase[1]):
+            lines.append('\t%-14s %.4fs (%d%%)' % (name, seconds, round(100 * seconds / self.total) if self.total else 0))
+        other = self.total - sum(self.phases.values()) # printing, slicing the motif out of the score, ...
+        lines.append('\t%-14s %.4fs (%d%%)' % ('other', other, round(100 * other / self.total) if self.total else 0))
+        return '\n'.join(lines)
+
+
+class StatsCollector(object):
+    """
+    # Adds up the SearchStats of every search, function by function, over a batch run
+    #
+    #    collector = StatsCollector()
+    #    setStatsHook(collector)
+    #    ... any number of searches ...
+    #    print(collector.report())
+    #
+    # byFunction - search function name -> SearchStats of all its calls
+    """
+
+    def __init__(self):
+        self.byFunction = {}
+
+
+    def __call__(self, stats):
+        self.byFunction.setdefault(stats.function, SearchStats(stats.function)).add(stats)
+
+
+    def toDict(self):
+        return dict((function, stats.toDict()) for (function, stats) in self.byFunction.items())
+
+
+    def report(self):
+        return '\n'.join(self.byFunction[function].report() for function in sorted(self.byFunction))
+
+
+def setStatsHook(hook):
+    """
+    # input: a function taking a SearchStats (e.g. a StatsCollector), or None to stop
+    # every search from now on keeps SearchStats, and hands them to hook when it's done
+    """
+    global statsHook
+    statsHook = hook
+
+
+def recordStats(function):
+    """
+    # decorator of the search functions: adds a stats argument to them
+    #    stats - a SearchStats to fill in, None to only keep stats if there's a hook (see setStatsHook())
+    #
+    # while the search runs its SearchStats are currentStats, for timedPhase() and countStats() to fill in
+    # nothing is timed or counted when neither a SearchStats nor a hook is given
+    """
+    @functools.wraps(function)
+    def search(*args, **kwargs):
+        global currentStats
+        stats = kwargs.pop('stats', None)
+        if stats is None and statsHook is None:
+            return function(*args, **kwargs)
+        if stats is None:
+            stats = SearchStats()
+            
+        stats.function = function.__name__
+        outerStats = currentStats # a search run from inside another one
+        currentStats = stats
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.total = stats.total + time.perf_counter() - start
+            stats.calls = stats.calls + 1
+            currentStats = outerStats
+            if statsHook is not None:
+                statsHook(stats)
+    return search
+
+
+@contextlib.contextmanager
+def timedPhase(name):
+    """
+    # context manager adding the time spent in it to phase name of currentStats, if there are any
+    #    time spent in another phase inside it only goes to that phase
+    """
+    stats = currentStats
+    if stats is None:
+        yield
+        return
+    
+    stats.openPhases.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        inner = stats.openPhases.pop()
+        stats.phases[name] = stats.phases.get(name, 0.0) + elapsed - inner
+        if stats.openPhases: # the phase around this one doesn't get this time
+            stats.openPhases[-1] = stats.openPhases[-1] + elapsed
+
+
+def phase(name):
+    """
+    # decorator putting all the time of a function into phase name (see timedPhase())
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            if currentStats is None:
+                return function(*args, **kwargs)
+            with timedPhase(name):
+                return function(*args, **kwargs)
+        return timed
+    return decorate
+
+
+def countStats(windows = 0, earlyBreaks = 0, matches = 0):
+    # adds to the counts of currentStats, if there are any
+    if currentStats is not None:
+        currentStats.windows = currentStats.windows + windows
+        currentStats.earlyBreaks = currentStats.earlyBreaks + earlyBreaks
+        currentStats.matches = currentStats.matches + matches
+
+
+def timedMatches(matches):
+    """
+    # input: a generator of matches (e.g. intervalMatches())
+    # generates the same matches, the time spent finding them going to the 'match' phase of currentStats
+    #    and every one of them counted
+    """
+    if currentStats is None:
+        for match in matches:
+            yield match
+        return
+        
+    matches = iter(matches)
+    while True:
+        with timedPhase('match'):
+            match = next(matches, None)
+        if match is None:
+            return
+        countStats(matches = 1)
+        yield match
+
+
+def setQuiet(level = logging.INFO):
+    """
+    # input: a logging level, or None to go back to printing
+    # quiet mode: from now on, nothing the search functions say is printed, every line of it is logged
+    #    to the 'musicSearch' logger at level instead (see say())
+    #    when the logger doesn't take that level, the lines aren't even put together
+    #
+    #    setQuiet(logging.DEBUG) # batch run, nothing shows up unless logging is set up for DEBUG
+    """
+    global quietLevel, pendingText
+    quietLevel = level
+    pendingText = ''
+
+
+def say(*args, **kwargs):
+    """
+    # what the search functions use instead of print(), same arguments
+    # prints, unless in quiet mode (see setQuiet()), where every whole line is logged instead
+    """
+    global pendingText
+    if quietLevel is None:
+        print(*args, **kwargs)
+        return
+    if not logger.isEnabledFor(quietLevel):
+        return
+    
+    text = pendingText + kwargs.get('sep', ' ').join(str(arg) for arg in args) + kwargs.get('end', '\n')
+    lines = text.split('\n')
+    pendingText = lines.pop() # what comes after the last newline isn't a whole line yet
+    for line in lines:
+        logger.log(quietLevel, line)
+
+
+def showText(match):
+    # match.show('text'), said through say() in quiet mode
+    if quietLevel is None:
+        match.show('text')
+    elif logger.isEnabledFor(quietLevel):
+        text = io.StringIO()
+        with contextlib.redirect_stdout(text):
+            match.show('text')
+        say(text.getvalue(), end = '')
 
 
 def hasNumber(inputString): 
@@ -21,6 +321,7 @@ def isNumber(inputString):
         return False
 
 
+@phase('motif')
 def stringToNotes(string):
     """
     # input: string of note names, separated by spaces
@@ -60,6 +361,7 @@ def stringToNotes(string):
     return s # return Stream
 
 
+@phase('motif')
 def stringToNotesWithOctave(string):
     """
     # input: string of note names, separated by spaces
@@ -95,6 +397,7 @@ def stringToNotesWithOctave(string):
     return s # return Stream
 
 
+@phase('motif')
 def stringToNotesRhythm(string):
     """
     # input: string of note rhythms, separated by spaces
@@ -167,6 +470,7 @@ def stringToNotesRhythm(string):
     return s
        
        
+@phase('motif')
 def contourToNotes(string):
     """
     # input: string of Parson's Code for Melodic Contours
@@ -191,13 +495,13 @@ def contourToNotes(string):
     
     for char in string: 
         
-        nute = note.Note()
+        nute = note.Note(nute.nameWithOctave) # start from the note before
         
         if char == 'u' or char == 'U': 
-            nute.ps = nute.ps + 1 # raise the pitch of nute
+            nute.pitch.ps = nute.pitch.ps + 1 # raise the pitch of nute
             
         elif char == 'd' or char == 'D':
-            nute.ps = nute.ps - 1 # lower the pitch of nute
+            nute.pitch.ps = nute.pitch.ps - 1 # lower the pitch of nute
             
         elif char == 'r' or char == 'R':
             pass # the chicken
@@ -209,13 +513,31 @@ def contourToNotes(string):
     
     return s # return Stream
 
+
+
+def rhythmContourToNotes(contour, rhythm):
+    """
+    # input: a string of Parson's code (see contourToNotes()) and one of rhythms (see stringToNotesRhythm()),
+    #    with one note of rhythm per note of contour
+    # output: a stream of Notes with the contour of the one and the durations of the other
+    """
+    if contour == None or rhythm == None:
+        raise ValueError('contour and rhythm must be given together')
+    motif = contourToNotes(contour)
+    rhythmNotes = stringToNotesRhythm(rhythm)
+    if len(motif) != len(rhythmNotes):
+        raise ValueError('contour has %d notes but rhythm has %d' % (len(motif), len(rhythmNotes)))
+    for (nute, rhythmNote) in zip(motif, rhythmNotes): # contour of the one, durations of the other
+        nute.duration = duration.Duration(rhythmNote.duration.quarterLength)
+    return motif
+
     
 def sortByMeasure(streamList):
     """
-    # input: a list of note excerpts to be sorted
+    # input: a list of note excerpts (or MatchRecords) to be sorted
     # output: sorted list by measure number of the first note in excerpt
     """
-    return sorted(list, key = lambda x: x.notesAndRests[0].measureNumber)
+    return sorted(streamList, key = firstMeasure)
 
 
 def sortTupleByMeasure(tuplelist):
@@ -223,7 +545,7 @@ def sortTupleByMeasure(tuplelist):
     # input: a list of tuples (note excerpts, partNumber it was from) to be sorted
     # output: sorted list by measure number of the first note in note excerpt of the tuple
     """
-    return sorted(list, key = lambda x: x[0].notesAndRests[0].measureNumber)
+    return sorted(tuplelist, key = lambda x: firstMeasure(x[0]))
 
         
 def approxInterval(interval1, interval2):
@@ -239,290 +561,1351 @@ def approxInterval(interval1, interval2):
     #     'leaps': 6ths and 7ths
     # 
     # A case can be made to equate 5ths and octaves, but has not been put into practice here yet
+    #
+    # the groups are in APPROX_CLASSES, see approxClasses() to compare whole lists of intervals at once
     """
     
-    # creation of the Interval objects
-    ascending2 = interval.GenericInterval('ascending second')
-    descending2 = interval.GenericInterval('descending second')
-    ascending3 = interval.GenericInterval('ascending third')
-    descending3 = interval.GenericInterval('descending third')
-    ascending4 = interval.GenericInterval('ascending fourth')
-    descending4 = interval.GenericInterval('descending fourth')
-    ascending5 = interval.GenericInterval('ascending fifth')
-    descending5 = interval.GenericInterval('descending fifth')
-    ascending6 = interval.GenericInterval('ascending sixth')
-    descending6 = interval.GenericInterval('descending sixth')
-    ascending7 = interval.GenericInterval('ascending seventh')
-    descending7 = interval.GenericInterval('descending seventh')
-    
-    if interval1 == interval2:
-        return True
-    
-    if interval1 == ascending2 or interval1 == ascending3:
-        if interval2 == ascending2 or interval2 == ascending3:
-            return True
-        
-    if interval1 == descending2 or interval1 == descending3:
-        if interval2 == descending2 or interval2 == descending3:
-            return True
-        
-    if interval1 == ascending4 or interval1 == ascending5:
-        if interval2 == ascending4 or interval2 == ascending5:
-            return True
-        
-    if interval1 == descending4 or interval1 == descending5:
-        if interval2 == descending4 or interval2 == descending5:
-            return True
-    
-    if interval1 == ascending6 or interval1 == ascending7:
-        if interval2 == ascending6 or interval2 == ascending7:
-            return True
-        
-    if interval1 == descending6 or interval1 == descending7:
-        if interval2 == descending6 or interval2 == descending7:
-            return True
+    return (APPROX_CLASSES.get(interval1.directed, interval1.directed) ==
+            APPROX_CLASSES.get(interval2.directed, interval2.directed))
 
-    return False
 
-
-def exactNoteSearch(score, motifPart, motifStart, motifEnd, notes = None, print_ = 0, octave = 1, show = 0):
+def approxClasses(generic):
     """
-    # input:
-    #    score - the parsed score to search in
-    #
-    #    motiPart - integer indicating the part in the score to grab the notes from
-    #
-    #    motifStart - integer indicating first note of the query
-    #
-    #    motifEnd - integer indicating the note after the last note of query
-    #
-    #    notes - string to be converted to a Stream with Notes via stringToNotes()
-    #        The given Stream will be used to find matches instead.
-    #        If notes isn't None, then motifPart, motifStart, and motifEnd will be ignored.
-    #        Default value is None
+    # input: an array of generic interval values (see PartFeatures)
+    # output: the same array with every interval replaced by its group in APPROX_CLASSES
+    #    intervals outside the groups (unisons, octaves and larger, NO_INTERVAL) stay as they are
     #
-    #    print_ - If True, print extra information that may be useful in the terminal
-    #        Default value is False (0)
+    # two intervals are the same by approxInterval() iff they are the same here,
+    #    so approximate matching is just exact matching over these arrays
+    """
+    classes = generic.copy()
+    for (value, classId) in APPROX_CLASSES.items():
+        classes[generic == value] = classId
+    return classes
+
+
+class PartFeatures(object):
+    """
+    # Compact arrays of everything the search functions compare, for one sequence of notes and rests
     #
-    #    octave - If True, match algorithm will ignore octaves, only matching note names
-    #        If False, match algorithm will match both octaves and note names
-    #        Default value is True
+    # input: elements - the notes and rests of a flattened Part (or of a motif Stream)
     #
-    #    show - If True, color matches to score, and use music21's show('musicxml') to visualize score
-    #        Default value is False
+    # per element (length n):
+    #    midi - MIDI pitch number, -1 for rests and chords
+    #    pitchClasses - 0 to 11, -1 for rests and chords
+    #    names - pitch name without octave (e.g. 'C#'), '' for rests and chords
+    #    nameCodes - the name as a number (step * 32 + 16 + 2 * alter), -1 for rests and chords
+    #    octaves - octave number, -1 if the note has none (e.g. from stringToNotes)
+    #    quarterLengths - duration in quarter lengths
+    #    durationTypes - duration type (e.g. 'eighth')
+    #    durationTypeCodes - the duration type as its place in DURATION_TYPES
+    #    offsets - offset of the element in its stream
+    #    measureNumbers - measure number, -1 if unknown
+    #    isNote, isRest - True if the element is a Note/Rest (chords are neither)
     #
-    # output: comparing the motif/theme against the score,
-    #    returns a list of matching Streams, excerpted from the score
-    #    A stream is a match iff all the notes match both in pitch and rhythm to the given motif/theme
+    # per pair of neighbouring elements (length n - 1):
+    #    chromatic - directed interval in semitones (same as interval.notesToChromatic)
+    #    generic - directed generic interval (same as interval.notesToGeneric)
+    #    contour - 1 going up, -1 going down, 0 for a repeat
+    #    any pair that isn't two Notes is NO_INTERVAL in all three
+    #    durationRatios - each duration divided by the one before (rests included), rounded to 6 decimals
+    #        NO_INTERVAL after a zero duration (e.g. a grace note)
     #
+    # PartFeatures(None) makes an empty one, for fromArrays() to fill in
     """
 
-    print ('\nSearching by exact note...')
-    
-    flatParts = [] 
-    for part in score.parts:
-        flatParts.append(part.flat) # flatten each Parts in the score
-        
-        
-    noteParts = []
-    for part in flatParts: # extract notes and rests for each flattened Parts
-        noteParts.append(part.notesAndRests)
-    
-    if notes != None: # if there exists a string for notes
-        print ('\tCustom motif used')
-        # a very crude way of differentiating strings with octave info and those without
-        if hasNumber(notes): # if the string has numbers
-            motif = stringToNotesWithOctave(notes) # convert string to Notes via stringToNotesWithOctave*()
-        else: # if the string has no numbers
-            motif = stringToNotes(notes) # convert string to Notes via stringToNotes()
-    else: # if notes == None
-        print ('\tMotif defined from score')
-        motif = flatParts[motifPart].notes[motifStart:motifEnd] # get match query from score
-                            
-    
-    if print_:
-        print ('\tMotif is defined as follows:')
-        for thisNote in motif:
-            print ('\t\t' + thisNote.nameWithOctave + ' ' + thisNote.duration.type + ' note')
-        print()         
-        
-    matchList = [] # list of matches found
-    matchTupleList = [] # tuple of (Stream match, integer listNum)
-    matchQ = False
-        
-    for listNum in range(0, len(noteParts)): # for all parts in the piece
-        for noteNum in range(0, len(noteParts[listNum]) - len(motif)): # for all notes in the part
-            for motifNoteNum in range(0, len(motif)): # for all notes in the motif
-                if octave: # different octaves are acceptable
-                    if motif[motifNoteNum].name == noteParts[listNum][noteNum + motifNoteNum].name:
-                        #matching pitch (not by octave)
-                        if motif[motifNoteNum].duration.type == noteParts[listNum][noteNum + motifNoteNum].duration.type: 
-                            #we're also matching length
-                            #might not be a good idea to usenote.type, since it groups all complex into 'complex'
-                            if motifNoteNum == len(motif) - 1: # if this is the last note to match 
-                                matchQ = True # flag as a match
-                                
-                        else: # note types are different, match failed
-                            break
-                    else: # note pitches are different, match failed
-                        break
-                else: # notes with different octaves are different
-                    if motif[motifNoteNum] == noteParts[listNum][noteNum + motifNoteNum]: # if note1 = note2
-                        if motifNoteNum == len(motif) - 1:
-                            matchQ = True
-                    else:
-                        break
-                    
-            if matchQ: # if after the forloops, matchQ is True
-                match = noteParts[listNum][noteNum : noteNum + len(motif)] # get the matching notes from the score
-                match.insert(0, flatParts[listNum].getClefs().elements[0]) # get the clef of the respective part
-                    # NOTE! This will fail to give the correct clef if the clef changes in the middle of the piece!
-                    # this is literally getting the first clef of the Part where the match is found
-                    # works for Art of the Fugue though
-                matchList.append(match) # insert match into matchList
-                matchTuple = (match, listNum) # define matchTuple as (Stream, integer)
-                matchTupleList.append(matchTuple) # insert matchTuple into its separate list
-                matchQ = False # reset the match flag
-                
-        
-    print (str(len(matchTupleList)) + ' match(es) found:')
-    for entry in matchTupleList: # for all the tuples in matchtupleList
-        print ('\tPart ' + str(entry[1]) + ' from measure ' + str(entry[0].notes[0].measureNumber), end = ' ')
-        print ('to ' + str(entry[0].notes[-1].measureNumber))
+    ARRAYS = ('midi', 'pitchClasses', 'nameCodes', 'octaves', 'quarterLengths', 'durationTypeCodes', 'offsets',
+              'measureNumbers', 'isNote', 'isRest', 'chromatic', 'generic', 'contour', 'durationRatios') # all the numpy arrays
+    LISTS = ('names', 'durationTypes') # all the lists of strings
+
+    @phase('features')
+    def __init__(self, elements):
+        if elements is None:
+            return
         
-    if show: 
-        score = colorScore(score, matchTupleList) # color the score with the matches
-        score.show('musicxml') # show() the score in musicxml
-    
-    return matchList #should be list of exact matches
+        midi = []
+        pitchClasses = []
+        diatonic = []
+        pitchSpaces = []
+        self.names = []
+        nameCodes = []
+        octaves = []
+        quarterLengths = []
+        self.durationTypes = []
+        offsets = []
+        measureNumbers = []
+        isNote = []
+        isRest = []
+
+        for element in elements: # walk the music21 objects only this once
+            if element.isNote:
+                thisPitch = element.pitch
+                midi.append(thisPitch.midi)
+                pitchClasses.append(thisPitch.pitchClass)
+                diatonic.append(thisPitch.diatonicNoteNum)
+                pitchSpaces.append(thisPitch.ps)
+                self.names.append(thisPitch.name)
+                nameCodes.append((thisPitch.diatonicNoteNum - 1) % 7 * 32 + 16 + int(round(2 * thisPitch.alter)))
+                    # C is 16, C# is 18, D- is 46...
+                octaves.append(thisPitch.octave if thisPitch.octave is not None else -1)
+            else: # rests and chords have no single pitch
+                midi.append(-1)
+                pitchClasses.append(-1)
+                diatonic.append(0)
+                pitchSpaces.append(0.0)
+                self.names.append('')
+                nameCodes.append(-1)
+                octaves.append(-1)
+
+            quarterLengths.append(float(element.duration.quarterLength))
+            self.durationTypes.append(element.duration.type)
+            offsets.append(float(element.offset))
+            measureNumbers.append(element.measureNumber if element.measureNumber is not None else -1)
+            isNote.append(element.isNote)
+            isRest.append(element.isRest)
+
+        self.midi = numpy.array(midi, dtype = numpy.int16)
+        self.pitchClasses = numpy.array(pitchClasses, dtype = numpy.int8)
+        self.nameCodes = numpy.array(nameCodes, dtype = numpy.int16)
+        self.octaves = numpy.array(octaves, dtype = numpy.int8)
+        self.quarterLengths = numpy.array(quarterLengths, dtype = numpy.float64)
+        self.durationTypeCodes = numpy.array([DURATION_TYPES.index(durationType) if durationType in DURATION_TYPES
+                                              else len(DURATION_TYPES) for durationType in self.durationTypes],
+                                             dtype = numpy.int8)
+        self.offsets = numpy.array(offsets, dtype = numpy.float64)
+        self.measureNumbers = numpy.array(measureNumbers, dtype = numpy.int32)
+        self.isNote = numpy.array(isNote, dtype = bool)
+        self.isRest = numpy.array(isRest, dtype = bool)
+
+        # intervals between every pair of neighbouring elements
+        pitchSpaces = numpy.array(pitchSpaces, dtype = numpy.float64)
+        diatonic = numpy.array(diatonic, dtype = numpy.int16)
+        bothNotes = self.isNote[:-1] & self.isNote[1:] # False wherever a rest or chord breaks the line
 
+        self.chromatic = numpy.rint(numpy.diff(pitchSpaces)).astype(numpy.int16)
+        self.chromatic[~bothNotes] = NO_INTERVAL
 
-def exactPitchSearch(score, motifPart, motifStart, motifEnd, notes = None, print_ = 0, octave = 1, show = 0):
+        staffDistance = numpy.diff(diatonic)
+        self.generic = numpy.where(staffDistance >= 0, staffDistance + 1, staffDistance - 1).astype(numpy.int16)
+            # same as interval.convertStaffDistanceToInterval: unisons are 1, a step up is 2, a step down is -2
+        self.generic[~bothNotes] = NO_INTERVAL
+
+        self.contour = numpy.sign(numpy.diff(pitchSpaces)).astype(numpy.int16)
+        self.contour[~bothNotes] = NO_INTERVAL
+
+        # the same rhythm augmented or diminished has the same ratios
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            self.durationRatios = numpy.round(self.quarterLengths[1:] / self.quarterLengths[:-1], 6)
+        self.durationRatios[self.quarterLengths[:-1] == 0] = NO_INTERVAL
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def toArrays(self, prefix = ''):
+        """
+        # output: dictionary of every array (string lists become numpy string arrays), keys starting with prefix
+        """
+        arrays = {}
+        for name in PartFeatures.ARRAYS:
+            arrays[prefix + name] = getattr(self, name)
+        for name in PartFeatures.LISTS:
+            arrays[prefix + name] = numpy.array(getattr(self, name), dtype = numpy.str_)
+        return arrays
+
+
+    @staticmethod
+    def fromArrays(arrays, prefix = ''):
+        """
+        # input: dictionary given by toArrays() (or a numpy .npz file of it)
+        # output: the PartFeatures again
+        """
+        features = PartFeatures(None)
+        for name in PartFeatures.ARRAYS:
+            setattr(features, name, arrays[prefix + name])
+        for name in PartFeatures.LISTS:
+            setattr(features, name, arrays[prefix + name].tolist())
+        return features
+
+
+class ScoreIndex(object):
     """
-    # input:
-    #    score - the parsed score to search in
-    #
-    #    motiPart - integer indicating the part in the score to grab the notes from
-    #
-    #    motifStart - integer indicating first note of the query
+    # Everything the search functions need from a parsed score, built once
     #
-    #    motifEnd - integer indicating the note after the last note of query
-    #
-    #    notes - string to be converted to a Stream with Notes via stringToNotes()
-    #        The given Stream will be used to find matches instead.
-    #        If notes isn't None, then motifPart, motifStart, and motifEnd will be ignored.
-    #        Default value is None
-    #
-    #    print_ - If True, print extra information that may be useful in the terminal
-    #        Default value is False (0)
+    # input: score - the parsed score
+    #    path - the file the score was parsed from, if any
     #
-    #    octave - If True, match algorithm will ignore octaves, only matching note names
-    #        If False, match algorithm will match both octaves and note names
-    #        Default value is True
+    # Flattening the parts and walking the notes is the slow part of every search,
+    # so build one ScoreIndex and hand it to as many searches as needed:
     #
-    #    show - If True, color matches to score, and use music21's show('musicxml') to visualize score
-    #        Default value is False
+    #    index = ScoreIndex(corpus.parse('bach/artOfFugue_bwv1080/06.zip'))
+    #    exactIntervalSearch(index, 4, 0, 10)
+    #    genericIntervalSearch(index, 4, 0, 10, inverse = 1)
     #
-    # output: comparing the motif/theme against the score,
-    #    returns a list of matching Streams, excerpted from the score
-    #    A stream is a match iff all the notes match both in pitch (ignores rhythm/duration) to the given motif/theme
+    # attributes:
+    #    score - the original score (used for coloring and show())
+    #    flatParts - every Part of the score, flattened
+    #    noteParts - notesAndRests of every flattened Part
+    #    parts - a PartFeatures for every Part
+    #    clefs - class name of the first clef of every Part (e.g. 'TrebleClef')
+    #    path - the file of the score, or None
     #
-    """    
-    
-    # if notes != None, use notes as motif, and ignore motifPart, motifStart, and motifEnd
-    print ('\nSearching by exact pitch...')
-    
-    flatParts = []
-    for part in score.parts:
-        flatParts.append(part.flat) # flatten each Parts in the score
-        
-        
-    noteParts = []
-    for part in flatParts: # extract notes and rests for each flattened Parts
-        noteParts.append(part.notesAndRests)
-    
-    if notes != None: # if there exists a string for notes
-        print ('\tCustom motif used')
-        # a very crude way of differentiating strings with octave info and those without        
-        if hasNumber(notes):
-            motif = stringToNotesWithOctave(notes)
-        else:
-            motif = stringToNotes(notes)
-    else: # if notes == None
-        print ('\tMotif defined from score')
-        motif = flatParts[motifPart].notes[motifStart:motifEnd]
-                            
-    
-    if print_:
-        print ('\tMotif is defined as follows:')
-        for thisNote in motif:
-            print ('\t\t' + thisNote.nameWithOctave + ' ' + thisNote.duration.type + ' note')
-        print ('')               
-        
-    matchList = []
-    matchTupleList = []    
-    matchQ = False
+    # A ScoreIndex loaded by cachedScoreIndex() only has parts, clefs and path to begin with:
+    #    score, flatParts and noteParts are parsed from path the first time they're needed
+    """
+
+    def __init__(self, score, path = None):
+        self.path = path
+        self._score = score
+        self._flatParts = None
+        self._noteParts = None
         
-    for listNum in range(0, len(noteParts)): # for all parts in the piece
-        for noteNum in range(0, len(noteParts[listNum]) - len(motif)): # for all notes in the part
-            for motifNoteNum in range(0, len(motif)): # for all notes in the motif
-                
-                if motif[motifNoteNum].name == noteParts[listNum][noteNum + motifNoteNum].name: 
-                    #if the note names are the same
-                    
-                    if octave: #allow different octaves
-                        if motifNoteNum == len(motif) - 1:
-                            matchQ = True
-                    else: #don't allow different octaves
-                        if motif[motifNoteNum].octave == noteParts[listNum][noteNum + motifNoteNum].octave:
-                            #make sure octaves work
-                            if motifNoteNum == len(motif) - 1:
-                                matchQ = True
+        if score is not None:
+            noteParts = self.noteParts
+            with timedPhase('features'):
+                self.parts = [PartFeatures(part) for part in noteParts]
+                self.clefs = []
+                for part in self.flatParts:
+                    partClefs = part.getElementsByClass('Clef')
+                    self.clefs.append(partClefs[0].__class__.__name__ if len(partClefs) > 0 else '')
 
-                            
-                else:
-                    break
 
-                    
-            if matchQ:# if after the forloops, matchQ is True
-                match = noteParts[listNum][noteNum : noteNum + len(motif)] # get the matching notes from the score
-                match.insert(0, flatParts[listNum].getClefs().elements[0]) # get the clef of the respective part
-                    # NOTE! This will fail to give the correct clef if the clef changes in the middle of the piece!
-                    # this is literally getting the first clef of the Part where the match is found
-                    # works for Art of the Fugue though
-                matchList.append(match) # insert match into matchList
-                matchTuple = (match, listNum) # define matchTuple as (Stream, integer)
-                matchTupleList.append(matchTuple) # insert matchTuple into its separate list
-                matchQ = False # reset the match flag
-                
-        
-    print (str(len(matchTupleList)) + ' match(es) found:')
-    for entry in matchTupleList:
-        print ('\tPart %d from measure %d to %d' % (entry[1], entry[0].notes[0].measureNumber, entry[0].notes[-1].measureNumber))
+    @property
+    def score(self):
+        if self._score is None: # only happens when loaded from the cache
+            self._score = converter.parse(self.path)
+        return self._score
+
+
+    @property
+    def flatParts(self):
+        if self._flatParts is None:
+            score = self.score
+            with timedPhase('flatten'):
+                self._flatParts = [part.flat for part in score.parts]
+        return self._flatParts
+
+
+    @property
+    def noteParts(self):
+        if self._noteParts is None:
+            flatParts = self.flatParts
+            with timedPhase('notesAndRests'):
+                self._noteParts = [part.notesAndRests for part in flatParts]
+        return self._noteParts
+
+
+    def __len__(self):
+        return len(self.parts)
+
+
+def fileHash(path):
+    """
+    # input: a file path
+    # output: SHA-1 hex digest of the content of the file
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as scoreFile:
+        for block in iter(lambda: scoreFile.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cachedScoreIndex(path, cacheDir = None):
+    """
+    # input: path - the file path of a score
+    #    cacheDir - directory to keep the cache files in, default CACHE_DIRECTORY
+    # output: a ScoreIndex of the score
+    #
+    # The features of every part are kept in a compressed numpy file per score,
+    #    named after the path and holding the hash of the file content.
+    # As long as the file doesn't change, the score is never parsed again
+    #    (unless something asks for the excerpts or the score itself, see ScoreIndex)
+    # If the file does change, the hash won't match and the cache file is rebuilt.
+    """
+    if cacheDir is None:
+        cacheDir = CACHE_DIRECTORY
         
-    if show:
-        score = colorScore(score, matchTupleList) # color the score with the matches
-        score.show('musicxml') # show() the score in musicxml
+    path = os.path.abspath(path)
+    cachePath = os.path.join(cacheDir, hashlib.sha1(path.encode('utf-8')).hexdigest() + '.npz')
+    contentHash = fileHash(path)
+
+    if os.path.exists(cachePath):
+        try:
+            with numpy.load(cachePath) as cached:
+                if cached['version'] == CACHE_VERSION and str(cached['contentHash']) == contentHash: # still the same file
+                    index = ScoreIndex(None, path)
+                    index.parts = [PartFeatures.fromArrays(cached, 'part%d_' % partNum)
+                                   for partNum in range(0, int(cached['partCount']))]
+                    index.clefs = cached['clefs'].tolist()
+                    return index
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile): # truncated or corrupt, rebuilt like a miss
+            pass
+
+    index = ScoreIndex(converter.parse(path), path) # not cached yet, or the file changed
     
+    arrays = {'version': CACHE_VERSION, 'contentHash': contentHash, 'partCount': len(index),
+              'clefs': numpy.array(index.clefs, dtype = numpy.str_)}
+    for partNum in range(0, len(index)):
+        arrays.update(index.parts[partNum].toArrays('part%d_' % partNum))
+        
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+    temporaryPath = cachePath + '.%d.npz' % os.getpid() # write then rename, so no one reads a half written file
+    numpy.savez_compressed(temporaryPath, **arrays)
+    os.rename(temporaryPath, cachePath)
     
-    return matchList #should be list of exact matches
+    return index
 
 
-def exactRhythmSearch(score, motifPart, motifStart, motifEnd, rhythm = None, print_ = 0, context = 0, sort = 'part', show = 0):
+def indexScore(score):
     """
-    # input:
-    #    score - the parsed score to search in
-    #
-    #    motiPart - integer indicating the part in the score to grab the notes from
+    # input: a parsed score or a ScoreIndex
+    # output: a ScoreIndex of the score
     #
-    #    motifStart - integer indicating first note of the query
+    # lets every search function take either one
+    """
+    if isinstance(score, ScoreIndex):
+        return score
+
+    return ScoreIndex(score)
+
+
+def reverseGeneric(generic):
+    """
+    # input: an array of generic interval values (see PartFeatures)
+    # output: the same intervals going the other direction, as GenericInterval.reverse() would give
+    #    unisons and NO_INTERVAL stay as they are
+    """
+    return numpy.where((generic == 1) | (generic == NO_INTERVAL), generic, -generic)
+
+
+def prefixTable(pattern):
+    """
+    # input: a list
+    # output: the Knuth-Morris-Pratt failure table of the list
+    #    entry num is the length of the longest proper prefix of pattern[:num + 1] that is also its suffix
+    """
+    table = [0] * len(pattern)
+    length = 0 # length of the current matching prefix
+
+    for num in range(1, len(pattern)):
+        while length > 0 and pattern[num] != pattern[length]:
+            length = table[length - 1] # fall back to the next shorter prefix
+        if pattern[num] == pattern[length]:
+            length = length + 1
+        table[num] = length
+
+    return table
+
+
+def iterWindows(sequence, pattern):
+    """
+    # input: two lists
+    # generates every index at which pattern appears in sequence, uninterrupted, in order
     #
-    #    motifEnd - integer indicating the note after the last note of query
+    # uses Knuth-Morris-Pratt, so every element of sequence is looked at about once
+    #    no matter how long the pattern is
+    """
+    if len(pattern) == 0:
+        return
+
+    table = prefixTable(pattern)
+    length = 0 # how much of pattern matches right now
+    countStats(windows = max(0, len(sequence) - len(pattern) + 1))
+
+    for num in range(0, len(sequence)):
+        while length > 0 and sequence[num] != pattern[length]:
+            length = table[length - 1]
+        if sequence[num] == pattern[length]:
+            length = length + 1
+            if length == len(pattern): # whole pattern matched
+                yield num - length + 1
+                length = table[length - 1] # keep going, matches can overlap
+
+
+class MotifAutomaton(object):
+    """
+    # Aho-Corasick automaton that finds many patterns in one pass over a sequence
     #
-    #    rhythm - string to be converted to a Stream with Notes via stringToRhythm()
-    #        The given Stream will be used to find matches instead.
-    #        If rhythm isn't None, then motifPart, motifStart, and motifEnd will be ignored.
-    #        Default value is None
+    # input: patterns - list of lists (e.g. interval lists of several motifs)
+    #
+    # search(sequence) returns (start, patternNum) for every place any pattern appears in sequence,
+    #    looking at every element of sequence once, however many patterns there are
+    # iterSearch(sequence) generates them one at a time instead
+    """
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.goto = [{}] # goto[state][symbol] = next state, state 0 is the root
+        self.fail = [0] # state to fall back to when the next symbol doesn't continue the current one
+        self.output = [[]] # numbers of the patterns that end at each state
+
+        for (patternNum, pattern) in enumerate(patterns): # build the trie of all the patterns
+            if len(pattern) == 0: # an empty pattern never matches
+                continue
+            state = 0
+            for symbol in pattern:
+                if symbol not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][symbol] = len(self.goto) - 1
+                state = self.goto[state][symbol]
+            self.output[state].append(patternNum)
+
+        queue = list(self.goto[0].values()) # children of the root fall back to the root
+        for state in queue: # breadth first, so shorter states always get their fail link first
+            for (symbol, nextState) in self.goto[state].items():
+                queue.append(nextState)
+                fallback = self.fail[state]
+                while fallback and symbol not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nextState] = self.goto[fallback].get(symbol, 0)
+                self.output[nextState] = self.output[nextState] + self.output[self.fail[nextState]]
+                    # a pattern ending at the fall back state also ends here
+
+
+    def iterSearch(self, sequence):
+        # generates (start, patternNum) as search() does, in order of where the matches end
+        state = 0
+        countStats(windows = len(sequence))
+
+        for (num, symbol) in enumerate(sequence):
+            while state and symbol not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(symbol, 0)
+            for patternNum in self.output[state]:
+                yield (num - len(self.patterns[patternNum]) + 1, patternNum)
+
+
+    def search(self, sequence):
+        return list(self.iterSearch(sequence))
+
+
+def matchMask(columns, motifColumns):
+    """
+    # input: columns - list of arrays of a part to compare, e.g. [nameCodes, octaves] (see PartFeatures)
+    #    motifColumns - the same arrays for the motif
+    # output: boolean array with one entry per window of the part,
+    #    True where every column of the window equals that of the motif
+    #
+    # instead of comparing the motif against one window at a time, the whole part is compared
+    # against one note of the motif at a time, so there are only len(motif) numpy passes per column
+    """
+    length = len(motifColumns[0])
+    windows = len(columns[0]) - length + 1 # number of places the motif could start
+
+    if length == 0 or windows <= 0:
+        return numpy.zeros(0, dtype = bool)
+
+    countStats(windows = windows)
+    mask = numpy.ones(windows, dtype = bool)
+    for (column, motifColumn) in zip(columns, motifColumns):
+        for motifNoteNum in range(0, length):
+            mask &= column[motifNoteNum:motifNoteNum + windows] == motifColumn[motifNoteNum]
+        if not mask.any(): # no window left to match, stop early
+            countStats(earlyBreaks = 1)
+            break
+
+    return mask
+
+
+def alignmentStart(sequence, pattern, first, end, maxEdits):
+    """
+    # input: the sequence and pattern of editWindows(), the first element a match may start at,
+    #    where the match ends (exclusive) and the most edits allowed
+    # output: where the closest alignment of pattern ending at end starts,
+    #    the one of fewest edits, then of the length closest to that of pattern
+    #
+    # edit distance of the reversed pattern against the sequence read backwards from end
+    #    only done for the matches themselves, so it costs nothing next to the search
+    """
+    reversedPattern = pattern[::-1]
+    previous = list(range(0, len(pattern) + 1)) # distances against no element at all: delete the whole prefix
+    best = (previous[-1], len(pattern), end)
+
+    for start in range(end - 1, max(first, end - len(pattern) - maxEdits) - 1, -1):
+        current = [previous[0] + 1]
+        for num in range(1, len(pattern) + 1):
+            current.append(min(previous[num] + 1, current[num - 1] + 1,
+                               previous[num - 1] + (reversedPattern[num - 1] != sequence[start])))
+        previous = current
+        best = min(best, (current[-1], abs(end - start - len(pattern)), start))
+
+    return best[2]
+
+
+def editWindows(sequence, pattern, maxEdits, barrier = None):
+    """
+    # input: two lists, the most edits (notes substituted, inserted or deleted) allowed,
+    #    and a barrier, an element no match can go through (e.g. NO_INTERVAL for a rest)
+    # generates (start, end, edits) for every part of sequence that is at most maxEdits edits away from pattern,
+    #    end being exclusive
+    #
+    # uses Myers' bit-vector algorithm: the whole column of the edit distance table is kept as two bit masks
+    #    (one bit per element of pattern, Python integers being as long as needed) and updated in a few
+    #    integer operations per element of sequence, so it runs about as fast as iterWindows()
+    #
+    # neighbouring ends are all within maxEdits around an approximate match,
+    #    only the closest one of every run of them is given
+    """
+    length = len(pattern)
+    if length == 0:
+        return
+
+    patternBits = {} # patternBits[symbol] has bit num set where pattern[num] == symbol
+    for (num, symbol) in enumerate(pattern):
+        patternBits[symbol] = patternBits.get(symbol, 0) | (1 << num)
+    allBits = (1 << length) - 1
+    lastBit = 1 << (length - 1)
+
+    countStats(windows = len(sequence))
+    plus, minus, edits = allBits, 0, length # vertical +1 / -1 differences of the column, and its last entry
+    first = 0 # first element after the last barrier
+    best = None # (edits, end) of the closest end of the current run
+
+    for (num, symbol) in enumerate(sequence):
+        if symbol == barrier: # start over after it
+            if best is not None:
+                yield (alignmentStart(sequence, pattern, first, best[1], maxEdits), best[1], best[0])
+            plus, minus, edits = allBits, 0, length
+            first = num + 1
+            best = None
+            continue
+
+        equal = patternBits.get(symbol, 0)
+        vertical = equal | minus
+        horizontal = (((equal & plus) + plus) ^ plus) | equal
+        horizontalPlus = minus | (~(horizontal | plus) & allBits)
+        horizontalMinus = plus & horizontal
+
+        if horizontalPlus & lastBit:
+            edits = edits + 1
+        elif horizontalMinus & lastBit:
+            edits = edits - 1
+
+        horizontalPlus = (horizontalPlus << 1) & allBits # nothing shifted in: a match may start anywhere
+        horizontalMinus = (horizontalMinus << 1) & allBits
+        plus = horizontalMinus | (~(vertical | horizontalPlus) & allBits)
+        minus = horizontalPlus & vertical
+
+        if edits <= maxEdits:
+            if best is None or edits < best[0]:
+                best = (edits, num + 1)
+        elif best is not None: # the run is over
+            yield (alignmentStart(sequence, pattern, first, best[1], maxEdits), best[1], best[0])
+            best = None
+
+    if best is not None:
+        yield (alignmentStart(sequence, pattern, first, best[1], maxEdits), best[1], best[0])
+
+
+def mismatchCounts(column, motifColumn, barrier = None):
+    """
+    # input: an array of a part and the same array for the motif (see PartFeatures),
+    #    and a barrier value no match can go through
+    # output: array with, for every window of the part, how many of its elements differ from the motif
+    #    windows with a barrier in them count more than the length of the motif
+    #
+    # like matchMask(), one numpy pass per note of the motif
+    """
+    length = len(motifColumn)
+    windows = len(column) - length + 1
+
+    if length == 0 or windows <= 0:
+        return numpy.zeros(0, dtype = numpy.int32)
+
+    countStats(windows = windows)
+    counts = numpy.zeros(windows, dtype = numpy.int32)
+    for motifNoteNum in range(0, length):
+        window = column[motifNoteNum:motifNoteNum + windows]
+        counts += numpy.where(window == barrier, length + 1, window != motifColumn[motifNoteNum]).astype(numpy.int32)
+
+    return counts
+
+
+def excerptMatch(index, partNum, start, end):
+    """
+    # input: a ScoreIndex, the part number and the element range [start, end) of a match
+    # output: the matching notes excerpted from the score as a Stream, with the clef of the part
+    """
+    match = stream.Stream()
+    elements = index.noteParts[partNum][start:end] # get the matching notes from the score
+        # a Stream in older music21, a plain list in newer ones, so the match is always put together here
+    for (offset, element) in zip(index.parts[partNum].offsets[start:end].tolist(), elements):
+        match.insert(offset, element)
+    match.insert(0, index.flatParts[partNum].getElementsByClass('Clef')[0]) # get the clef of the respective part
+        # NOTE! This will fail to give the correct clef if the clef changes in the middle of the piece!
+        # this is literally getting the first clef of the Part where the match is found
+        # works for Art of the Fugue though
+    return match
+
+
+class MatchRecord(namedtuple('MatchRecord', ['scoreId', 'partNum', 'noteStart', 'noteEnd', 'offsetStart', 'offsetEnd',
+                                             'measureStart', 'measureEnd', 'kind'])):
+    """
+    # Where a match is, without any music21 objects
+    #
+    #    scoreId - the file path of the score (None if the score didn't come from a file)
+    #    partNum - number of the part
+    #    noteStart, noteEnd - first note (or rest) of the match, and the one after the last
+    #    offsetStart, offsetEnd - offset of the start of the match, and of the end of its last note
+    #    measureStart, measureEnd - measure numbers of the first and last notes
+    #    kind - 'regular', 'inverse', 'retrograde', 'retrogradeInverse', 'approximate', 'augmentation' or 'diminution'
+    #
+    # search functions give these instead of Streams when called with records = 1
+    # excerpt(index) makes the Stream the search function would have given, when it's actually needed
+    """
+    __slots__ = ()
+
+    def excerpt(self, index):
+        return excerptMatch(index, self.partNum, self.noteStart, self.noteEnd)
+
+
+class MatchExporter(object):
+    """
+    # Writes MatchRecords to a JSON Lines or CSV file, one line per match, as they come
+    #
+    #    with MatchExporter('matches.jsonl') as exporter:
+    #        for record in iterExactIntervalSearch(index, notes = 'C D E- F'):
+    #            exporter.write(record)
+    #
+    # every line goes to the file as soon as it's written (the file is line buffered),
+    #    so a pipeline can read it while the search is still going
+    #
+    # input:
+    #    path - file to write (overwritten), or an open file (e.g. sys.stdout), flushed after every line
+    #    format - 'jsonl' or 'csv', None to go by the extension of path (.csv is CSV, anything else JSON Lines)
+    #        Default value is None
+    #    extraFields - names of more fields for every line, their values given to write() after the record
+    #        Default value is ()
+    #
+    # every line has the fields of MatchRecord, then extraFields (CSV files start with them as a header)
+    """
+    FORMATS = ('jsonl', 'csv')
+
+    def __init__(self, path, format = None, extraFields = ()):
+        if format is None:
+            format = 'csv' if str(getattr(path, 'name', path)).lower().endswith('.csv') else 'jsonl'
+        if format not in MatchExporter.FORMATS:
+            raise ValueError('format must be one of %s, not %r' % (', '.join(MatchExporter.FORMATS), format))
+        
+        self.path = path
+        self.format = format
+        self.extraFields = tuple(extraFields)
+        self.count = 0 # records written so far
+        self.ownFile = not hasattr(path, 'write') # only close files opened here
+        self.file = open(path, 'w', buffering = 1, newline = '') if self.ownFile else path
+        if format == 'csv':
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(MatchRecord._fields + self.extraFields)
+            self.flush()
+
+
+    def write(self, record, *extra):
+        # writes one MatchRecord, followed by the values of extraFields
+        if self.format == 'csv':
+            self.writer.writerow(tuple(record) + extra)
+        else:
+            line = record._asdict()
+            line.update(zip(self.extraFields, extra))
+            self.file.write(json.dumps(line) + '\n')
+        self.flush()
+        self.count = self.count + 1
+
+
+    def flush(self):
+        if not self.ownFile: # a file of our own is line buffered already
+            self.file.flush()
+
+
+    def writeAll(self, records):
+        # writes every MatchRecord of records (e.g. a generator from an iter*Search function), one at a time
+        for record in records:
+            self.write(record)
+
+
+    def close(self):
+        if self.ownFile:
+            self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def exportMatches(records, path, format = None):
+    """
+    # input: MatchRecords (a list from a search function called with records = 1, or any iter*Search generator),
+    #    the file to write them to, and its format (see MatchExporter)
+    # output: how many records were written
+    #
+    #    exportMatches(iterGenericIntervalSearch(index, notes = 'C D E F', inverse = 1), 'matches.csv')
+    """
+    with MatchExporter(path, format) as exporter:
+        exporter.writeAll(records)
+    return exporter.count
+
+
+@phase('excerpt')
+def newMatch(index, partNum, start, end, records = 0, kind = 'regular'):
+    """
+    # input: a ScoreIndex, the part number and the element range [start, end) of a match,
+    #    whether to make a MatchRecord, and the kind of match (see MatchRecord)
+    # output: a MatchRecord if records is True, the excerpted Stream (see excerptMatch()) otherwise
+    """
+    if records:
+        part = index.parts[partNum]
+        return MatchRecord(index.path, partNum, start, end, float(part.offsets[start]),
+                           float(part.offsets[end - 1] + part.quarterLengths[end - 1]),
+                           int(part.measureNumbers[start]), int(part.measureNumbers[end - 1]), kind)
+
+    return excerptMatch(index, partNum, start, end)
+
+
+def firstMeasure(match):
+    """
+    # input: a match Stream or MatchRecord
+    # output: measure number of its first note
+    """
+    if isinstance(match, MatchRecord):
+        return match.measureStart
+    return match.notes[0].measureNumber
+
+
+def lastMeasure(match):
+    """
+    # input: a match Stream or MatchRecord
+    # output: measure number of its last note
+    """
+    if isinstance(match, MatchRecord):
+        return match.measureEnd
+    return match.notes[-1].measureNumber
+
+
+def contextRange(index, partNum, start, end, context):
+    """
+    # input: a ScoreIndex, the part number and the element range [start, end) of a match
+    #    and the context flag of the search function
+    # output: (start, end) widened by up to 3 notes or rests on either side if context is True
+    """
+    if context:
+        start = max(0, start - 3)
+        end = min(len(index.parts[partNum]), end + 3)
+
+    return (start, end)
+
+
+def partNumbers(index, parts):
+    """
+    # input: a ScoreIndex and a list of part numbers, or None
+    # output: the part numbers to search, every part if parts is None
+    """
+    if parts is None:
+        return range(0, len(index))
+    return parts
+
+
+@phase('motif')
+def motifFromScore(index, motifPart, motifStart, motifEnd, notes = None):
+    """
+    # input: the usual motif arguments of the search functions
+    # output: the motif as a Stream, from the notes string if there is one, from the score otherwise
+    """
+    if notes is None:
+        return index.flatParts[motifPart].notes[motifStart:motifEnd]
+    if hasNumber(notes): # a very crude way of differentiating strings with octave info and those without
+        return stringToNotesWithOctave(notes)
+    return stringToNotes(notes)
+
+
+class MotifCache(object):
+    """
+    # The PartFeatures of the last motif strings parsed, least recently used first (see compiledMotif())
+    #
+    # attributes:
+    #    maxSize - how many motifs are kept at most
+    #    hits - times a motif was already there
+    #    misses - times a motif had to be parsed
+    #
+    # safe to use from many threads at once (see SearchServer)
+    """
+
+    def __init__(self, maxSize = MOTIF_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.motifs = OrderedDict() # key -> PartFeatures, the most recently used last
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+    def get(self, key, build):
+        """
+        # input: the key of a motif, and a function giving its PartFeatures if they aren't kept yet
+        # output: the PartFeatures of the motif, their arrays read only as they're shared by every search
+        """
+        with self.lock:
+            features = self.motifs.get(key)
+            if features is not None:
+                self.motifs.move_to_end(key)
+                self.hits = self.hits + 1
+                return features
+            self.misses = self.misses + 1
+            
+        features = build() # not holding the lock, parsing is the slow part (two threads may both parse a motif, that's all)
+        for name in PartFeatures.ARRAYS:
+            getattr(features, name).setflags(write = False)
+            
+        with self.lock:
+            self.motifs[key] = features
+            self.motifs.move_to_end(key)
+            while len(self.motifs) > self.maxSize:
+                self.motifs.popitem(last = False)
+        return features
+
+
+    def clear(self):
+        with self.lock:
+            self.motifs.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+    def info(self):
+        # hits, misses and size, e.g. for /metrics of SearchServer
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.motifs), 'maxSize': self.maxSize}
+
+
+motifCache = MotifCache() # used by compiledMotif()
+
+
+def compiledMotif(kind, string, rhythm = None):
+    """
+    # input:
+    #    kind - what string is: 'notes' (see motifFromScore()), 'rhythm' (see stringToNotesRhythm()),
+    #        'contour' (see contourToNotes()) or 'rhythmContour' (see rhythmContourToNotes(), with rhythm)
+    #    string, rhythm - the motif
+    # output: PartFeatures of the motif, from motifCache if it's been parsed before
+    #
+    # every encoding the matchers use (pitches, intervals, durations, contour) is in the PartFeatures,
+    #    so one parse serves every search type and option (inverse, retrograde, approx, ...)
+    """
+    if kind == 'notes':
+        build = lambda: PartFeatures(motifFromScore(None, 0, 0, 0, string))
+    elif kind == 'rhythm':
+        build = lambda: PartFeatures(stringToNotesRhythm(string))
+    elif kind == 'contour':
+        build = lambda: PartFeatures(contourToNotes(string))
+    elif kind == 'rhythmContour':
+        build = lambda: PartFeatures(rhythmContourToNotes(string, rhythm))
+    else:
+        raise ValueError('kind must be notes, rhythm, contour or rhythmContour, not %r' % kind)
+    return motifCache.get((kind, string, rhythm), build)
+
+
+def motifFeatures(index, motifPart, motifStart, motifEnd, notes = None):
+    """
+    # input: the usual motif arguments of the search functions
+    # output: PartFeatures of the motif, compiled once for a notes string (see compiledMotif()), from the score otherwise
+    """
+    if notes is not None:
+        return compiledMotif('notes', notes)
+    return PartFeatures(motifFromScore(index, motifPart, motifStart, motifEnd))
+
+
+def printMotifNotes(motif):
+    # says every note of the PartFeatures of a motif, with its octave (if it has one) and duration type
+    for (name, octave, durationType) in zip(motif.names, motif.octaves.tolist(), motif.durationTypes):
+        say('\t\t' + name + (str(octave) if octave >= 0 else '') + ' ' + durationType + ' note')
+
+
+def invertIntervals(intervals):
+    """
+    # input: an array of intervals in semitones or of contour steps (see PartFeatures)
+    # output: the same intervals going the other direction, NO_INTERVAL stays as it is
+    """
+    return numpy.where(intervals == NO_INTERVAL, intervals, -intervals)
+
+
+def serialMatches(index, motifSequence, partSequence, invert, inverse = 0, retrograde = 0, parts = None, encode = None):
+    """
+    # input: index - a ScoreIndex
+    #    motifSequence - the intervals of the motif as an array (e.g. motif.generic)
+    #    partSequence - function giving the same array of a part (e.g. lambda part: part.generic)
+    #    invert - function inverting such an array (e.g. reverseGeneric)
+    #    inverse, retrograde - which serial forms to look for besides the motif itself
+    #        (both gives all four: regular, inverse, retrograde and retrograde inverse)
+    #    parts - the part numbers to search, None for all
+    #    encode - function to encode the arrays with before comparing them (e.g. approxClasses), None for none
+    # generates (partNum, start, end, kind) for every match, part by part,
+    #    kind being 'regular', 'inverse', 'retrograde' or 'retrogradeInverse'
+    #
+    # the retrograde of a motif has the same intervals in reverse order, going the other way,
+    #    so every form is just another pattern over the very same arrays: the score is never reversed or copied,
+    #    and one pass of a MotifAutomaton finds all the forms at once
+    # a place matching more than one form (e.g. a motif that is its own retrograde) is given once,
+    #    as the first of them in the order above
+    """
+    forms = [('regular', motifSequence)]
+    if inverse:
+        forms.append(('inverse', invert(motifSequence)))
+    if retrograde:
+        forms.append(('retrograde', invert(motifSequence)[::-1]))
+        if inverse:
+            forms.append(('retrogradeInverse', motifSequence[::-1]))
+    if encode is not None:
+        forms = [(kind, encode(pattern)) for (kind, pattern) in forms]
+    
+    automaton = MotifAutomaton([pattern.tolist() for (kind, pattern) in forms])
+    length = len(motifSequence)
+    
+    for partNum in partNumbers(index, parts):
+        sequence = partSequence(index.parts[partNum])
+        if encode is not None:
+            sequence = encode(sequence)
+            
+        lastStart = None
+        for (start, patternNum) in automaton.iterSearch(sequence.tolist()):
+            # all the forms are as long as each other, so every form matching at a start comes out together,
+            # first form first, since the patterns were added in that order
+            if start != lastStart:
+                yield (partNum, start, start + length + 1, forms[patternNum][0])
+                lastStart = start
+
+
+def noteMatches(index, motif, octave = 1, parts = None):
+    """
+    # input: a ScoreIndex, the PartFeatures of the motif, octave as in exactNoteSearch(),
+    #    and the part numbers to search (None for all)
+    # generates (partNum, start, end, kind) for every match, part by part
+    """
+    if octave: # different octaves are acceptable, match note names and note types
+        #might not be a good idea to use note.type, since it groups all complex into 'complex'
+        motifColumns = [motif.nameCodes, motif.durationTypeCodes]
+    else: # notes with different octaves are different, match name, octave and length
+        motifColumns = [motif.nameCodes, motif.octaves, motif.quarterLengths]
+        
+    for partNum in partNumbers(index, parts):
+        part = index.parts[partNum]
+        if octave:
+            partColumns = [part.nameCodes, part.durationTypeCodes]
+        else:
+            partColumns = [part.nameCodes, part.octaves, part.quarterLengths]
+            
+        for start in numpy.flatnonzero(matchMask(partColumns, motifColumns)).tolist(): # for every place the whole motif matches
+            yield (partNum, start, start + len(motif), 'regular')
+
+
+def pitchMatches(index, motif, octave = 1, parts = None):
+    """
+    # input: a ScoreIndex, the PartFeatures of the motif, octave as in exactPitchSearch(),
+    #    and the part numbers to search (None for all)
+    # generates (partNum, start, end, kind) for every match, part by part
+    """
+    if octave: #allow different octaves, note names only
+        motifColumns = [motif.nameCodes]
+    else: #don't allow different octaves
+        motifColumns = [motif.nameCodes, motif.octaves]
+        
+    for partNum in partNumbers(index, parts):
+        part = index.parts[partNum]
+        if octave:
+            partColumns = [part.nameCodes]
+        else:
+            partColumns = [part.nameCodes, part.octaves]
+            
+        for start in numpy.flatnonzero(matchMask(partColumns, motifColumns)).tolist(): # for every place the whole motif matches
+            yield (partNum, start, start + len(motif), 'regular')
+
+
+def rhythmMatches(index, motif, parts = None, scale = 1):
+    """
+    # input: a ScoreIndex, the PartFeatures of the motif, the part numbers to search (None for all)
+    #    and scale as in exactRhythmSearch()
+    # generates (partNum, start, end, kind) for every place all the durations are those of the motif,
+    #    times one of the scale factors allowed
+    #    kind is 'regular' for the same durations, 'augmentation' for longer ones and 'diminution' for shorter ones
+    """
+    if scale == 1: # the very same durations
+        motifLengths = motif.quarterLengths.tolist() # durations (in quarter length) of the motif
+        
+        for partNum in partNumbers(index, parts):
+            for start in iterWindows(index.parts[partNum].quarterLengths.tolist(), motifLengths):
+                yield (partNum, start, start + len(motif), 'regular')
+        return
+    
+    if scale is None: # any factor at all
+        factors = None
+    elif isinstance(scale, (list, tuple, set)):
+        factors = set(round(float(factor), 6) for factor in scale)
+    else:
+        factors = set([round(float(scale), 6)])
+    
+    if len(motif) == 0 or motif.quarterLengths[0] == 0: # no factor to be found
+        return
+    motifRatios = motif.durationRatios.tolist()
+    firstLength = float(motif.quarterLengths[0])
+    
+    for partNum in partNumbers(index, parts):
+        partLengths = index.parts[partNum].quarterLengths
+        for start in iterWindows(index.parts[partNum].durationRatios.tolist(), motifRatios):
+            # same ratios: the window is the motif scaled by some factor, the first durations tell which
+            factor = round(float(partLengths[start]) / firstLength, 6)
+            if factors is not None and factor not in factors:
+                continue
+            if factor == 1:
+                kind = 'regular'
+            elif factor > 1:
+                kind = 'augmentation'
+            else:
+                kind = 'diminution'
+            yield (partNum, start, start + len(motif), kind)
+
+
+def intervalMatches(index, motif, parts = None, inverse = 0, retrograde = 0):
+    """
+    # input: a ScoreIndex, the PartFeatures of the motif, the part numbers to search (None for all),
+    #    and which other serial forms to look for (see serialMatches())
+    # generates (partNum, start, end, kind) for every place all the intervals (in semitones) match the motif
+    #    rests are never a match, as their intervals are NO_INTERVAL
+    """
+    return serialMatches(index, motif.chromatic, lambda part: part.chromatic, invertIntervals, inverse, retrograde, parts)
+
+
+def genericMatches(index, motif, approx = 0, inverse = 0, parts = None, retrograde = 0):
+    """
+    # input: a ScoreIndex, the PartFeatures of the motif, approx, inverse and retrograde as in genericIntervalSearch(),
+    #    and the part numbers to search (None for all)
+    # generates (partNum, start, end, kind) for every match, part by part (see serialMatches())
+    """
+    return serialMatches(index, motif.generic, lambda part: part.generic, reverseGeneric, inverse, retrograde, parts,
+                         approxClasses if approx else None) # approxInterval() is exact matching over its groups
+
+
+def contourMatches(index, motif, inverse = 0, parts = None, retrograde = 0):
+    """
+    # input: a ScoreIndex, the PartFeatures of the motif, inverse and retrograde as in exactContourSearch(),
+    #    and the part numbers to search (None for all)
+    # generates (partNum, start, end, kind) for every match, part by part (see serialMatches())
+    #    'up' and 'down' swap in the inverse, 'repeat' stays 'repeat'; rests and chords are never matched
+    """
+    return serialMatches(index, motif.contour, lambda part: part.contour, invertIntervals, inverse, retrograde, parts)
+
+
+def approxMatches(index, motif, maxEdits = 1, kind = 'pitch', indels = 1, parts = None):
+    """
+    # input: a ScoreIndex, the PartFeatures of the motif, maxEdits, kind and indels as in approximateSearch(),
+    #    and the part numbers to search (None for all)
+    # generates (partNum, start, end, kind) for every match, part by part,
+    #    kind being 'regular' for an exact match and 'approximate' otherwise
+    """
+    if kind == 'pitch': # note names, rests and chords break the match
+        motifSequence = motif.nameCodes
+        barrier = -1
+    else: # 'interval' or 'generic', rests break the match
+        motifSequence = motif.chromatic if kind == 'interval' else motif.generic
+        barrier = NO_INTERVAL
+    extraNote = 0 if kind == 'pitch' else 1 # n intervals span n + 1 notes
+
+    for partNum in partNumbers(index, parts):
+        if kind == 'pitch':
+            partSequence = index.parts[partNum].nameCodes
+        else:
+            partSequence = index.parts[partNum].chromatic if kind == 'interval' else index.parts[partNum].generic
+
+        if indels: # substitutions, insertions and deletions
+            matches = editWindows(partSequence.tolist(), motifSequence.tolist(), maxEdits, barrier)
+        else: # substitutions only, every match is as long as the motif
+            counts = mismatchCounts(partSequence, motifSequence, barrier)
+            matches = [(start, start + len(motifSequence), int(counts[start]))
+                       for start in numpy.flatnonzero(counts <= maxEdits).tolist()]
+
+        for (start, end, edits) in matches:
+            if end > start:
+                yield (partNum, start, end + extraNote, 'regular' if edits == 0 else 'approximate')
+
+
+def strettoPairs(index, matches, maxLag = None):
+    """
+    # input: a ScoreIndex, an iterable of (partNum, start, end, kind) (e.g. genericMatches()),
+    #    and the longest time lag (in quarter lengths) to report, None for any lag
+    # output: list of (leader, follower, lag, semitones, generic) for every entry (follower) that starts
+    #    while an entry in another part (leader) is still going on
+    #    leader and follower are MatchRecords, lag is how much later the follower starts,
+    #    semitones and generic are the interval of imitation, from the first note of the leader to that of the follower
+    #    entries starting at the same time are doublings, not imitation, and aren't reported
+    #
+    # the entries of every part are already in order of offset; merging them gives all the entries in time order,
+    #    and only the entries still sounding are kept while going through them,
+    #    so each entry is only compared with the ones it actually overlaps
+    """
+    partRecords = {}
+    for (partNum, start, end, kind) in matches:
+        record = newMatch(index, partNum, start, end, 1, kind)
+        partRecords.setdefault(partNum, []).append((record.offsetStart, record))
+    
+    pairs = []
+    sounding = [] # entries that haven't ended yet
+    for (offset, follower) in heapq.merge(*[sorted(records) for records in partRecords.values()]):
+        sounding = [leader for leader in sounding if leader.offsetEnd > offset]
+        
+        for leader in sounding:
+            lag = offset - leader.offsetStart
+            if leader.partNum == follower.partNum or lag <= 0 or (maxLag is not None and lag > maxLag):
+                continue
+            leaderPart = index.parts[leader.partNum]
+            followerPart = index.parts[follower.partNum]
+            semitones = int(followerPart.midi[follower.noteStart]) - int(leaderPart.midi[leader.noteStart])
+            staffDistance = ((int(followerPart.octaves[follower.noteStart]) * 7 + int(followerPart.nameCodes[follower.noteStart]) // 32) -
+                             (int(leaderPart.octaves[leader.noteStart]) * 7 + int(leaderPart.nameCodes[leader.noteStart]) // 32))
+            generic = staffDistance + 1 if staffDistance >= 0 else staffDistance - 1
+            pairs.append((leader, follower, lag, semitones, generic))
+            
+        sounding.append(follower)
+        
+    return pairs
+
+
+def rhythmContourMatches(index, motif, approx = 0, parts = None):
+    """
+    # input: a ScoreIndex, the PartFeatures of the motif, approx as in rhythmContourSearch(),
+    #    and the part numbers to search (None for all)
+    # generates (partNum, start, end, kind) for every place both the contour and the rhythm match the motif
+    #
+    # both are fused into one symbol per pair of neighbouring notes, (contour step, duration of the first note,
+    #    duration of the second) or with approx (contour step, ratio of the durations),
+    #    so one pass of iterWindows() checks both at once
+    """
+    if approx:
+        motifSymbols = list(zip(motif.contour.tolist(), motif.durationRatios.tolist()))
+    else:
+        motifSymbols = list(zip(motif.contour.tolist(), motif.quarterLengths[:-1].tolist(), motif.quarterLengths[1:].tolist()))
+    
+    for partNum in partNumbers(index, parts):
+        part = index.parts[partNum]
+        if approx:
+            partSymbols = list(zip(part.contour.tolist(), part.durationRatios.tolist()))
+        else:
+            partSymbols = list(zip(part.contour.tolist(), part.quarterLengths[:-1].tolist(), part.quarterLengths[1:].tolist()))
+            
+        for start in iterWindows(partSymbols, motifSymbols): # rests are never matched, as their contour is NO_INTERVAL
+            yield (partNum, start, start + len(motif), 'regular')
+
+
+def iterMatches(index, matches, limit = None, stopAfterFirst = 0, measures = None):
+    """
+    # input: a ScoreIndex, a generator of (partNum, start, end, kind) (e.g. intervalMatches()),
+    #    and when to stop (see iterExactIntervalSearch())
+    # generates a MatchRecord for every match, as soon as it's found
+    """
+    if stopAfterFirst:
+        limit = 1
+    if limit is not None and limit <= 0:
+        return
+        
+    found = 0
+    for (partNum, start, end, kind) in matches:
+        record = newMatch(index, partNum, start, end, 1, kind)
+        if measures is not None and (record.measureStart < measures[0] or record.measureEnd > measures[1]):
+            continue # outside the measures asked for
+            
+        yield record
+        found = found + 1
+        if limit is not None and found >= limit: # stop scanning, the rest of the score is never looked at
+            countStats(earlyBreaks = 1)
+            return
+
+
+def printRetrogradeMatches(retrogradeMatchTupleLists, inverse):
+    """
+    # input: dictionary of the matchTupleLists of the 'retrograde' and 'retrogradeInverse' matches,
+    #    and whether retrograde inverse matches were looked for
+    # prints them like the search functions print their matches
+    """
+    forms = [('RETROGRADE', 'retrograde')]
+    if inverse:
+        forms.append(('RETROGRADE INVERSE', 'retrogradeInverse'))
+        
+    for (title, form) in forms:
+        say('\n%s MATCHES:' % title)
+        say(str(len(retrogradeMatchTupleLists[form])) + ' match(es) found:')
+        for matchTuple in retrogradeMatchTupleLists[form]:
+            say('\tPart %d from measure %d to %d' % (matchTuple[1], firstMeasure(matchTuple[0]), lastMeasure(matchTuple[0])))
+
+
+@recordStats
+def exactNoteSearch(score, motifPart, motifStart, motifEnd, notes = None, print_ = 0, octave = 1, show = 0, records = 0):
+    """
+    # input:
+    #    score - the parsed score to search in
+    #
+    #    motiPart - integer indicating the part in the score to grab the notes from
+    #
+    #    motifStart - integer indicating first note of the query
+    #
+    #    motifEnd - integer indicating the note after the last note of query
+    #
+    #    notes - string to be converted to a Stream with Notes via stringToNotes()
+    #        The given Stream will be used to find matches instead.
+    #        If notes isn't None, then motifPart, motifStart, and motifEnd will be ignored.
+    #        Default value is None
+    #
+    #    print_ - If True, print extra information that may be useful in the terminal
+    #        Default value is False (0)
+    #
+    #    octave - If True, match algorithm will ignore octaves, only matching note names
+    #        If False, match algorithm will match both octaves and note names
+    #        Default value is True
+    #
+    #    show - If True, color matches to score, and use music21's show('musicxml') to visualize score
+    #        Default value is False
+    #
+    #    records - If True, return MatchRecords instead of Streams, no excerpt is made until asked for
+    #        Default value is False
+    #
+    # output: comparing the motif/theme against the score,
+    #    returns a list of matching Streams, excerpted from the score
+    #    A stream is a match iff all the notes match both in pitch and rhythm to the given motif/theme
+    #
+    """
+
+    say('\nSearching by exact note...')
+    
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
+    
+    if notes != None: # if there exists a string for notes
+        say('\tCustom motif used')
+    else: # if notes == None
+        say('\tMotif defined from score')
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes) # a notes string is only parsed the first time
+                            
+    
+    if print_:
+        say('\tMotif is defined as follows:')
+        printMotifNotes(motif)
+        say()         
+        
+    matchList = [] # list of matches found
+    matchTupleList = [] # tuple of (Stream match, integer listNum)
+        
+    for (listNum, start, end, kind) in timedMatches(noteMatches(index, motif, octave)): # for every place the whole motif matches
+        match = newMatch(index, listNum, start, end, records) # get the matching notes from the score
+        matchList.append(match) # insert match into matchList
+        matchTuple = (match, listNum) # define matchTuple as (Stream, integer)
+        matchTupleList.append(matchTuple) # insert matchTuple into its separate list
+                
+        
+    say(str(len(matchTupleList)) + ' match(es) found:')
+    for entry in matchTupleList: # for all the tuples in matchtupleList
+        say('\tPart ' + str(entry[1]) + ' from measure ' + str(firstMeasure(entry[0])), end = ' ')
+        say('to ' + str(lastMeasure(entry[0])))
+        
+    if show: 
+        score = colorScore(index, matchTupleList) # color the score with the matches
+        score.show('musicxml') # show() the score in musicxml
+    
+    return matchList #should be list of exact matches
+
+
+@recordStats
+def exactPitchSearch(score, motifPart, motifStart, motifEnd, notes = None, print_ = 0, octave = 1, show = 0, records = 0):
+    """
+    # input:
+    #    score - the parsed score to search in
+    #
+    #    motiPart - integer indicating the part in the score to grab the notes from
+    #
+    #    motifStart - integer indicating first note of the query
+    #
+    #    motifEnd - integer indicating the note after the last note of query
+    #
+    #    notes - string to be converted to a Stream with Notes via stringToNotes()
+    #        The given Stream will be used to find matches instead.
+    #        If notes isn't None, then motifPart, motifStart, and motifEnd will be ignored.
+    #        Default value is None
+    #
+    #    print_ - If True, print extra information that may be useful in the terminal
+    #        Default value is False (0)
+    #
+    #    octave - If True, match algorithm will ignore octaves, only matching note names
+    #        If False, match algorithm will match both octaves and note names
+    #        Default value is True
+    #
+    #    show - If True, color matches to score, and use music21's show('musicxml') to visualize score
+    #        Default value is False
+    #
+    #    records - If True, return MatchRecords instead of Streams, no excerpt is made until asked for
+    #        Default value is False
+    #
+    # output: comparing the motif/theme against the score,
+    #    returns a list of matching Streams, excerpted from the score
+    #    A stream is a match iff all the notes match both in pitch (ignores rhythm/duration) to the given motif/theme
+    #
+    """    
+    
+    # if notes != None, use notes as motif, and ignore motifPart, motifStart, and motifEnd
+    say('\nSearching by exact pitch...')
+    
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
+    
+    if notes != None: # if there exists a string for notes
+        say('\tCustom motif used')
+    else: # if notes == None
+        say('\tMotif defined from score')
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
+                            
+    
+    if print_:
+        say('\tMotif is defined as follows:')
+        printMotifNotes(motif)
+        say('')               
+        
+    matchList = []
+    matchTupleList = []    
+        
+    for (listNum, start, end, kind) in timedMatches(pitchMatches(index, motif, octave)): # for every place the whole motif matches
+        match = newMatch(index, listNum, start, end, records) # get the matching notes from the score
+        matchList.append(match) # insert match into matchList
+        matchTuple = (match, listNum) # define matchTuple as (Stream, integer)
+        matchTupleList.append(matchTuple) # insert matchTuple into its separate list
+                
+        
+    say(str(len(matchTupleList)) + ' match(es) found:')
+    for entry in matchTupleList:
+        say('\tPart %d from measure %d to %d' % (entry[1], firstMeasure(entry[0]), lastMeasure(entry[0])))
+        
+    if show:
+        score = colorScore(index, matchTupleList) # color the score with the matches
+        score.show('musicxml') # show() the score in musicxml
+    
+    
+    return matchList #should be list of exact matches
+
+
+@recordStats
+def exactRhythmSearch(score, motifPart, motifStart, motifEnd, rhythm = None, print_ = 0, context = 0, sort = 'part', show = 0,
+                      records = 0, scale = 1):
+    """
+    # input:
+    #    score - the parsed score to search in
+    #
+    #    motiPart - integer indicating the part in the score to grab the notes from
+    #
+    #    motifStart - integer indicating first note of the query
+    #
+    #    motifEnd - integer indicating the note after the last note of query
+    #
+    #    rhythm - string to be converted to a Stream with Notes via stringToRhythm()
+    #        The given Stream will be used to find matches instead.
+    #        If rhythm isn't None, then motifPart, motifStart, and motifEnd will be ignored.
+    #        Default value is None
     #
     #    print_ - If True, print extra information that may be useful in the terminal
     #        Default value is False (0)
@@ -536,86 +1919,200 @@ def exactRhythmSearch(score, motifPart, motifStart, motifEnd, rhythm = None, pri
     #    show - If True, color matches to score, and use music21's show('musicxml') to visualize score
     #        Default value is False
     #
+    #    records - If True, return MatchRecords instead of Streams, no excerpt is made until asked for
+    #        Default value is False
+    #
+    #    scale - which augmentations and diminutions of the motif count as matches
+    #        1 only matches the very same durations
+    #        a number (e.g. 2 for augmentation, 0.5 for diminution) matches the durations times that number
+    #        a list of numbers matches any of them (e.g. [0.5, 1, 2])
+    #        None matches any augmentation or diminution at all
+    #        Default value is 1
+    #
     # output: comparing the motif/theme against the score,
     #    returns a list of matching Streams, excerpted from the score
     #    A stream is a match iff all the notes match both in rhythm (not pitch) to the given motif/theme
+    #    (scaled by one of the factors allowed)
     #
     """    
-    print ('\nSearching by rhythm...')
+    say('\nSearching by rhythm...')
     
-    flatParts = []
-    for part in score.parts:
-        flatParts.append(part.flat) # flatten each Parts in the score
-        
-    noteParts = []
-    for part in flatParts: # extract notes and rests for each flattened Parts
-        noteParts.append(part.notesAndRests)
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
     
     if rhythm != None: # if there exists a string for rhythm
-        motif = stringToNotesRhythm(rhythm)
+        motif = compiledMotif('rhythm', rhythm)
         if print_:
-            print('Searching from string')
+            say('Searching from string')
     else: # if rhythm == None
-        motif = flatParts[motifPart].notes[motifStart:motifEnd]
+        motif = PartFeatures(index.flatParts[motifPart].notes[motifStart:motifEnd])
         if print_:
-            print('Motif taken from score')
+            say('Motif taken from score')
 
             
     if print_:
-        for note in motif:
-            print('\t%s note' % (note.duration.fullName))
-        print('')
+        for quarterLength in motif.quarterLengths.tolist():
+            say('\t%s note' % (duration.Duration(quarterLength).fullName))
+        say('')
             
     
     matchList = []
     matchTupleList = []
-    matchQ = False
     
-    for listNum in range(0, len(noteParts)): # for all parts in the piece
-        for noteNum in range(0, len(noteParts[listNum]) - len(motif)): # for all notes in the part
-            for motifNoteNum in range(0, len(motif)): # for all notes in the motif
-                
-                if motif[motifNoteNum].duration.quarterLength == noteParts[listNum][noteNum + motifNoteNum].duration.quarterLength:
-                    # if the duration (in quarter length) of the first note is the same as that of the second:
-                    if motifNoteNum == len(motif) - 1: # if this is the last notes to be matched
-                        matchQ = True # switch match flag to True
-                else: # if duration doesn't equate
-                    break
+    for (listNum, start, end, kind) in timedMatches(rhythmMatches(index, motif, scale = scale)):
+        # for every place all the durations are the same as those of the motif
+        match = newMatch(index, listNum, start, end, records, kind) # get the matching notes from the score
+        matchList.append(match) # insert match into matchList
+        matchTuple = (match, listNum) # define matchTuple as (Stream, integer)
+        matchTupleList.append(matchTuple) # insert matchTuple into its separate list
+    
+        
+        
+    say(str(len(matchTupleList)) + ' match(es) found:')
+    
+    if sort == 'part':
+        say('Sorting by parts:')
+        
+    elif sort == 'measure':
+        say('Sorting by measures: ')
+        matchList = sortByMeasure(matchList) # sort matchList by measure via sortByMeasure()
+        matchTupleList = sortTupleByMeasure(matchTupleList) # sort matchTupleList via sortTupleByMeasure()
+        
+    for entry in matchTupleList: # print all the matches found
+        say('\tPart %d from measure %d to %d' % (entry[1],firstMeasure(entry[0]),lastMeasure(entry[0])), end = '')
+        if records and entry[0].kind != 'regular':
+            say(' (%s)' % entry[0].kind, end = '')
+        say('')
+        
+    if show:
+        score = colorScore(index, matchTupleList) # color the score with the matches
+        score.show('musicxml') # show() the score in musicxml
+    
+    return matchList #should be list of exact matches
+
+
+@recordStats
+def exactIntervalSearch(score, motifPart, motifStart, motifEnd, notes = None, print_ = 0, context = 0, show = 0, records = 0,
+                        inverse = 0, retrograde = 0):
+    """
+    # input:
+    #    score - the parsed score to search in
+    #
+    #    motiPart - integer indicating the part in the score to grab the notes from
+    #
+    #    motifStart - integer indicating first note of the query
+    #
+    #    motifEnd - integer indicating the note after the last note of query
+    #
+    #    notes - string to be converted to a Stream with Notes via stringToNotes()
+    #        The given Stream will be used to find matches instead.
+    #        If notes isn't None, then motifPart, motifStart, and motifEnd will be ignored.
+    #        Default value is None
+    #
+    #    print_ - If True, print extra information that may be useful in the terminal
+    #        Default value is False (0)
+    #
+    #    context - If True, matches will include the 3 notes before or after the actual match
+    #        Default value is False
+    #
+    #    show - If True, color matches to score, and use music21's show('musicxml') to visualize score
+    #        Default value is False
+    #
+    #    records - If True, return MatchRecords instead of Streams, no excerpt is made until asked for
+    #        Default value is False
+    #
+    #    inverse - If True, finds matches for the inverse (every interval going the other way) as well
+    #        Program will color inverse matches blue for visualization
+    #        Default value is False
+    #
+    #    retrograde - If True, finds matches for the retrograde as well (and the retrograde inverse, if inverse is True)
+    #        all the forms are found in the same pass over the score (see serialMatches())
+    #        Program will color retrograde matches orange and retrograde inverse matches purple for visualization
+    #        Default value is False
+    #
+    # output: comparing the motif/theme against the score,
+    #    returns a list of matching Streams, excerpted from the score
+    #    A Stream is a match iff all the intervals of the Stream match that of the motif
+    #
+    """    
+    
+    say('\nSearching by exact intervals...')
+    
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
+    
+    if notes != None: # if there exists a string for notes
+        say('\tCustom motif used')
+    else: # if notes == None
+        say('\tMotif taken from score')
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
+    
+    
+    mIntervalList = motif.chromatic.tolist() # intervals of the motif, in semitones
+    matchList = []
+    matchTupleList = []
+    inverseMatchTupleList = []
+    retrogradeMatchTupleLists = {'retrograde': [], 'retrogradeInverse': []}
+
+    
+    if print_: 
+        say('Matching the following intervals:')
+        for semitones in mIntervalList:
+            say('\t' + str(interval.ChromaticInterval(semitones)))
             
-            if matchQ: # if after the forloops, matchQ is True
-                match = noteParts[listNum][noteNum : noteNum + len(motif)] # get the matching notes from the score
-                match.insert(0, flatParts[listNum].getClefs().elements[0]) # get the clef of the respective part
-                    # NOTE! This will fail to give the correct clef if the clef changes in the middle of the piece!
-                    # this is literally getting the first clef of the Part where the match is found
-                    # works for Art of the Fugue though
-                matchList.append(match) # insert match into matchList
-                matchTuple = (match, listNum) # define matchTuple as (Stream, integer)
-                matchTupleList.append(matchTuple) # insert matchTuple into its separate list
-                matchQ = False # reset the match flag
-    
-        
+            
+    # the actual checking
+    for (listNum, start, end, kind) in timedMatches(intervalMatches(index, motif, None, inverse, retrograde)):
+        start, end = contextRange(index, listNum, start, end, context)
+            # if context, match takes in also 3 notes before and 3 notes after match
+        match = newMatch(index, listNum, start, end, records, kind)
+        matchTuple = (match, listNum)
+        if kind == 'regular':
+            matchList.append(match)
+            matchTupleList.append(matchTuple) 
+        elif kind == 'inverse':
+            inverseMatchTupleList.append(matchTuple)
+        else: # 'retrograde' or 'retrogradeInverse'
+            retrogradeMatchTupleLists[kind].append(matchTuple)
+
         
-    print(str(len(matchTupleList)) + ' match(es) found:')
+    if (print_):
+        say('\nMATCHES:') 
+        for num in range(0,len(matchList)): # print out all the elements within the matches
+            say('Match #' + str(num))
+            say(matchList[num])
+            if not records:
+                showText(matchList[num])    
+            say('')
     
-    if sort == 'part':
-        print('Sorting by parts:')
-        
-    elif sort == 'measure':
-        print('Sorting by measures: ')
-        matchList = sortByMeasure(matchList) # sort matchList by measure via sortByMeasure()
-        matchTupleList = sortTupleByMeasure(matchTupleList) # sort matchTupleList via sortTupleByMeasure()
-        
-    for entry in matchTupleList: # print all the matches found
-        print('\tPart %d from measure %d to %d' % (entry[1],entry[0].notes[0].measureNumber,entry[0].notes[-1].measureNumber))
+    say(str(len(matchTupleList)) + ' match(es) found:')
+    
+
+    for matchTuple in matchTupleList: # print all the matches found
+        say('\tPart ' + str(matchTuple[1]) + ' from measure ' + str(firstMeasure(matchTuple[0])), end = ' ')
+        say('to ' + str(lastMeasure(matchTuple[0])))
         
+    if inverse:
+        say('\nINVERSE MATCHES:')
+        say(str(len(inverseMatchTupleList)) + ' match(es) found:')
+        for inverseMatchTuple in inverseMatchTupleList: # print all the inverse matches found
+            say('\tPart %d from measure %d to %d' % (inverseMatchTuple[1], firstMeasure(inverseMatchTuple[0]), lastMeasure(inverseMatchTuple[0])))
+            
+    if retrograde:
+        printRetrogradeMatches(retrogradeMatchTupleLists, inverse)
+
     if show:
-        score = colorScore(score, matchTupleList) # color the score with the matches
+        score = colorMatches(index, [(matchTupleList, '#FF0000'), (inverseMatchTupleList, '#0000FF'),
+                                     (retrogradeMatchTupleLists['retrograde'], '#FF8000'),
+                                     (retrogradeMatchTupleLists['retrogradeInverse'], '#800080')])
         score.show('musicxml') # show() the score in musicxml
+
     
-    return matchList #should be list of exact matches
+    return matchList
 
 
-def exactIntervalSearch(score, motifPart, motifStart, motifEnd, notes = None, print_ = 0, context = 0, show = 0):
+@recordStats
+def genericIntervalSearch(score, motifPart, motifStart, motifEnd, 
+                          notes = None, print_ = 0, approx = 0, context = 0, 
+                          sort = 'part', show = 0, inverse = 0, retrograde = 0, records = 0):
     """
     # input:
     #    score - the parsed score to search in
@@ -634,149 +2131,497 @@ def exactIntervalSearch(score, motifPart, motifStart, motifEnd, notes = None, pr
     #    print_ - If True, print extra information that may be useful in the terminal
     #        Default value is False (0)
     #
+    #    approx - If True, match by approxInterval() instead of music21.genericInterval()
+    #        Default value is False
+    #
     #    context - If True, matches will include the 3 notes before or after the actual match
     #        Default value is False
     #
+    #    sort - determines the sorting algorithm for printing matches in terminal
+    #        Accepts either 'part' or 'measure'
+    #        Default value is 'part'
+    #
     #    show - If True, color matches to score, and use music21's show('musicxml') to visualize score
     #        Default value is False
     #
+    #    inverse - If True, finds matches for inverses as well
+    #        Program will color inverse matches blue for visualization
+    #        Default value is False
+    #    
+    #    retrograde - If True, finds matches for the retrograde as well (and the retrograde inverse, if inverse is True)
+    #        all the forms are found in the same pass over the score (see serialMatches())
+    #        Program will color retrograde matches orange and retrograde inverse matches purple for visualization
+    #        Default value is False
+    #
+    #    records - If True, return MatchRecords instead of Streams, no excerpt is made until asked for
+    #        Default value is False
+    #
     # output: comparing the motif/theme against the score,
     #    returns a list of matching Streams, excerpted from the score
-    #    A Stream is a match iff all the intervals of the Stream match that of the motif
+    #    A Stream is a match iff all the generic intervals of the Stream matches that of the motif
     #
-    """    
+    """        
     
-    print('\nSearching by exact intervals...')
     
-    flatParts = []
-    for part in score.parts:
-        flatParts.append(part.flat) # flatten each Parts in the score
+    say('\nSearching by generic intervals...')
+
     
-    noteParts = []
-    for part in flatParts: # extract notes and rests for each flattened Parts
-        noteParts.append(part.notesAndRests)
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
     
     if notes != None: # if there exists a string for notes
-        print('\tCustom motif used')
-        # a very crude way of differentiating strings with octave info and those without
-        if hasNumber(notes):
-            motif = stringToNotesWithOctave(notes)
-        else:
-            motif = stringToNotes(notes)
+        say('\tCustom motif used')
     else: # if notes == None
-        print('\tMotif taken from score')
-        motif = flatParts[motifPart].notes[motifStart:motifEnd]
+        say('\tMotif taken from score')
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
     
     
-    mIntervalList = []
-    matchList = []
+    mIntervalList = motif.generic.tolist() # list of generic intervals in the motif
+    matchList = [] 
     matchTupleList = []
+    inverseMatchList = []
+    inverseMatchTupleList = []
+    retrogradeMatchTupleLists = {'retrograde': [], 'retrogradeInverse': []}
 
-    
     if print_: 
-        print('Matching the following intervals:')
-        
-    for num in range(0, len(motif) - 1):
-        mIntervalList.append(interval.notesToChromatic(motif[num], motif[num+1]))
-        if print_: 
-            print('\t' + str(mIntervalList[num]))
+        say('Matching the following intervals:')
+        for value in mIntervalList:
+            say('\t' + str(interval.GenericInterval(value)))
             
             
     # the actual checking
-    matchQ = False; # initialization of the match flag
-    i = 0 # i and j are both used for context (see below)
-    j = 0 
+    for (listNum, start, end, currentlyMatching) in timedMatches(genericMatches(index, motif, approx, inverse,
+                                                                                  retrograde = retrograde)):
+        start, end = contextRange(index, listNum, start, end, context)
+            # if context, match takes in also 3 notes before and 3 notes after match
+        match = newMatch(index, listNum, start, end, records, currentlyMatching)
+        matchTuple = (match, listNum)
+        
+        if currentlyMatching == 'regular':
+            matchList.append(match)
+            matchTupleList.append(matchTuple)
+            
+        elif currentlyMatching == 'inverse':
+            inverseMatchList.append(match)
+            inverseMatchTupleList.append(matchTuple)
+            
+        else: # 'retrograde' or 'retrogradeInverse'
+            retrogradeMatchTupleLists[currentlyMatching].append(matchTuple)
+
+        
+    if (print_):
+        
+        say('\nMATCHES:') # print all the intervals of every match
+        
+        for num in range(0,len(matchList)):
+            say('Match #' + str(num))
+            if records:
+                say(matchList[num])
+                continue
+            for stuff in range(1, len(matchList[num].elements) - 1): # for all the note pairs
+                if matchList[num].elements[stuff].isNote and matchList[num].elements[stuff + 1].isNote:
+                    interval.notesToGeneric(matchList[num].elements[stuff], matchList[num].elements[stuff + 1])
+                    # convert notes to intervals
+            showText(matchList[num])    
+            say('')
+    
+    
+    say(str(len(matchTupleList)) + ' match(es) found:')   
+    
+    for matchTuple in matchTupleList: # print all the matches found
+        say('\tPart', str(matchTuple[1]) + ' from measure ' + str(firstMeasure(matchTuple[0])), end = '')
+        say(' to ' + str(lastMeasure(matchTuple[0])))
+    
+    if inverse:
+        say('\nINVERSE MATCHES:')
+        say(str(len(inverseMatchTupleList)) + ' match(es) found:')
+        for inverseMatchTuple in inverseMatchTupleList: # print all the inverse matches found
+            say('\tPart ' + str(inverseMatchTuple[1]) + ' from measure ' + str(firstMeasure(inverseMatchTuple[0])), end = '')
+            say(' to ' + str(lastMeasure(inverseMatchTuple[0])))
+            
+    if retrograde:
+        printRetrogradeMatches(retrogradeMatchTupleLists, inverse)
+
+    if show:
+        say('Coloring matches...')
+        score = colorMatches(index, [(matchTupleList, '#FF0000'), (inverseMatchTupleList, '#0000FF'),
+                                     (retrogradeMatchTupleLists['retrograde'], '#FF8000'),
+                                     (retrogradeMatchTupleLists['retrogradeInverse'], '#800080')])
+        say('Coloring finished')
+        score.show('musicxml') # show() the score in musicxml
+
+    return matchList
+
+
+@recordStats
+def multiIntervalSearch(score, motifs, print_ = 0, generic = 0, context = 0, show = 0, records = 0):
+    """
+    # input:
+    #    score - the parsed score (or ScoreIndex) to search in
+    #
+    #    motifs - list of the motifs to search for, each one either
+    #        a string of notes, as given to stringToNotes() or stringToNotesWithOctave()
+    #        or a tuple (motifPart, motifStart, motifEnd) taking the motif from the score
+    #
+    #    print_ - If True, print extra information that may be useful in the terminal
+    #        Default value is False (0)
+    #
+    #    generic - If True, match generic intervals like genericIntervalSearch()
+    #        If False, match intervals in semitones like exactIntervalSearch()
+    #        Default value is False
+    #
+    #    context - If True, matches will include the 3 notes before or after the actual match
+    #        Default value is False
+    #
+    #    show - If True, color matches to score, and use music21's show('musicxml') to visualize score
+    #        Default value is False
+    #
+    #    records - If True, return MatchRecords instead of Streams, no excerpt is made until asked for
+    #        Default value is False
+    #
+    # output: a list with a matchList for every motif, in the order of motifs
+    #    same matches as calling exactIntervalSearch() (or genericIntervalSearch()) for each motif,
+    #    but all the motifs are put into one MotifAutomaton and every part is only scanned once
+    """
+
+    say('\nSearching for %d motifs by %s intervals...' % (len(motifs), 'generic' if generic else 'exact'))
+    
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
+    
+    mIntervalLists = []
+    for motifNum in range(0, len(motifs)):
+        if isinstance(motifs[motifNum], tuple): # (motifPart, motifStart, motifEnd)
+            motif = motifFeatures(index, *motifs[motifNum])
+        else:
+            motif = compiledMotif('notes', motifs[motifNum])
         
-    for listNum in range(0, len(noteParts)): # for all parts in the piece
-        for noteNum in range(0, len(noteParts[listNum]) - len(mIntervalList)): # for all notes in the part
-            for mIntervalNum in range(0, len(mIntervalList)): # for all notes in the motif
+        if generic:
+            mIntervalLists.append(motif.generic.tolist())
+        else:
+            mIntervalLists.append(motif.chromatic.tolist())
+            
+        if print_:
+            say('\tMotif #%d: %s' % (motifNum, ' '.join(str(value) for value in mIntervalLists[motifNum])))
 
-                if noteParts[listNum][noteNum + mIntervalNum].isNote:
-                    if noteParts[listNum][noteNum + mIntervalNum + 1].isNote : #check if both notes are notes at all
-                        #if yes, make interval of this and next note, and use that to compare with motif
-                        intervalCandidate = interval.notesToChromatic(noteParts[listNum][noteNum + mIntervalNum], noteParts[listNum][noteNum + mIntervalNum + 1])
+    automaton = MotifAutomaton(mIntervalLists)
+    matchLists = [[] for motif in motifs]
+    matchTupleLists = [[] for motif in motifs]
 
-                else:  # if not, break
-                    #matchQ == False
-                    break
+    for listNum in range(0, len(index)): # for all parts in the piece, one pass each
+        if generic:
+            partIntervals = index.parts[listNum].generic.tolist()
+        else:
+            partIntervals = index.parts[listNum].chromatic.tolist()
             
-                
-                if (intervalCandidate == mIntervalList[mIntervalNum]): 
-                    if mIntervalNum == len(mIntervalList) - 1:
-                        matchQ = True
-                
-                else:
-                    break  #candidate interval =/= motif interval
+        with timedPhase('match'):
+            hits = sorted(automaton.search(partIntervals), key = lambda hit: (hit[1], hit[0]))
+        countStats(matches = len(hits))
+            
+        for (noteNum, motifNum) in hits:
+            start, end = contextRange(index, listNum, noteNum, noteNum + len(mIntervalLists[motifNum]) + 1, context)
+                # if context, match takes in also 3 notes before and 3 notes after match
+            match = newMatch(index, listNum, start, end, records)
+            matchLists[motifNum].append(match)
+            matchTupleLists[motifNum].append((match, listNum))
 
-            if matchQ: #if intervalCandidate matches motif
-                
-                if context: # getting the closest three surrounding notes for the match
-                    previousNote = noteParts[listNum][noteNum].previous() # previousNote = the element before the first note of the match
-                    nextNote = noteParts[listNum][noteNum + len(mIntervalList) + 1].next() 
-                        # nextNote = the element after the last note of the match
-                    
-                    for num in range(0, 3): # for 3 times
-                        if 'Barline' in previousNote.classes: # if the previousNote is a barline
-                            num = num - 1 # ignore it (move the pointer num back)
-                            
-                        elif 'note' in previousNote.classes or 'rest' in previousNote.classes: # if previousNote is a note or rest
-                            previousNote = previousNote.previous() # move previousNote to the previous note of the original previousNote
-                            i = i + 1 # increment i
-                            
-                        else : break # if previousNote is neither barline nor note, break
-                        
-                    for num in range(0, 3):
-                        if 'Barline' in nextNote.classes: # if the nextNote is a barline
-                            num = num - 1 # ignore it (move the pointer num back)
-                        elif 'note' in nextNote.classes or 'rest' in nextNote.classes:# if nextNote is a note or rest
-                            nextNote = nextNote.next() # move nextNote to the next note of the original nextNote
-                            j = j + 1 # increment j
-                            
-                        else : break # if nextNote is neither barline nor note, break
-                
+    for motifNum in range(0, len(motifs)):
+        say('Motif #%d: %d match(es) found:' % (motifNum, len(matchTupleLists[motifNum])))
+        for matchTuple in matchTupleLists[motifNum]:
+            say('\tPart %d from measure %d to %d' % (matchTuple[1], firstMeasure(matchTuple[0]), lastMeasure(matchTuple[0])))
+
+    if show:
+        score = colorMatches(index, [(matchTupleList, '#FF0000') for matchTupleList in matchTupleLists])
+        score.show('musicxml') # show() the score in musicxml
+
+    return matchLists
+
+
+@recordStats
+def exactContourSearch(score, motifPart, motifStart, motifEnd, 
+                       contour = None, print_ = 0, approx = 0, context = 0, sort = 'part', show = 0, inverse = 0, records = 0,
+                       retrograde = 0):
+    """
+    # Given a score, which part the motif occurs (motifPart), where it starts (motifStart) and ends (motifEnd) by notes,
+    #    returns a list of Part excerpts that contain a matching contour line to the theme
+    #
+    # contour is a string that will be used to match contour lines. motifPart, motifStart, and motifEnd will be ignored
+    #
+    # print_ is a boolean value that, if true, make the program print out additional information (what notes are in the matches)
+    #
+    # approx is not used (transferred over from genericIntervalSearch). 
+    #    TODO: make approx match excerpts based on looser criteria?
+    #
+    # context is a boolean value that, if true, will grab surrounding measures for context when returning the matchList
+    #    justification: might want to use this function if you are using matchList to print out each matches separately?
+    #
+    # sort is a string of values either 'part' or 'measure'
+    #    the printed list will be sorted by either part or measure, respectively
+    #    TODO: sort the returned matchList as well
+    #
+    # show is a boolean value that, if true, will export the score (using music21's show() function)
+    #    the exported score will have all the matches colored in red
+    #    if inverse is also True, the exported score will have all inverse matches colored in green
+    #
+    # records is a boolean value that, if true, returns MatchRecords instead of Streams
+    #    no excerpt is made until MatchRecord.excerpt() is called
+    #
+    # retrograde is a boolean value that, if true, finds matches for the retrograde contour as well
+    #    (and the retrograde inverse, if inverse is also True), all in the same pass over the score
+    #    retrograde matches are colored orange and retrograde inverse matches purple
+    #
+    """
     
-                match = noteParts[listNum][noteNum - i: noteNum + len(mIntervalList) + 1 + j]
-                    # match takes in also i notes before and j notes after match
-                
+    say('\nSearching by contour...')
     
-                match.insert(0, flatParts[listNum].getClefs().elements[0]) # get the clef of the respective part
-                    # NOTE! This will fail to give the correct clef if the clef changes in the middle of the piece!
-                    # this is literally getting the first clef of the Part where the match is found
-                    # works for Art of the Fugue though
-                matchTuple = (match, listNum)
-                matchList.append(match)
-                matchTupleList.append(matchTuple) 
-                i = 0 # reset i, j, and matchQ
-                j = 0
-                matchQ = False
+    matchList = []
+    matchTupleList = []
+    inverseMatchList = []
+    inverseMatchTupleList = []
+    retrogradeMatchTupleLists = {'retrograde': [], 'retrogradeInverse': []}
+    
+    
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
+
+
+    if contour != None: # if there exists a custom contour
+        say('\tCustom motif used')
+        motif = compiledMotif('contour', contour) # features of notes with the given contour, parsed the first time only
+         
+    else: # if no custom contour found (contour == None)
+        say('\tMotif taken from score')
+        motif = PartFeatures(index.flatParts[motifPart].notes[motifStart:motifEnd]) # the notes pointed by motifPart, motifStart & End
+        
+    if print_: # verbose
+        say('Contour is defined as follows:')
+        for step in motif.contour.tolist(): # 1 for 'up', -1 for 'down', 0 for 'repeat'
+            say({1: 'up', -1: 'down', 0: 'repeat'}[step])
+        say('')
 
+    for (partNum, start, end, currentlyMatching) in timedMatches(contourMatches(index, motif, inverse, retrograde = retrograde)):
+        match = newMatch(index, partNum, start, end, records, currentlyMatching)
+        matchTuple = (match, partNum)
+        
+        if currentlyMatching == 'regular':
+            matchList.append(match)
+            matchTupleList.append(matchTuple)
         
+        elif currentlyMatching == 'inverse': 
+            inverseMatchList.append(match)
+            inverseMatchTupleList.append(matchTuple)
+            
+        else: # 'retrograde' or 'retrogradeInverse'
+            retrogradeMatchTupleLists[currentlyMatching].append(matchTuple)
+
+                
     if (print_):
-        print('\nMATCHES:') 
-        for num in range(0,len(matchList)): # print out all the elements within the matches
-            print('Match #' + str(num))
-            print(matchList[num])
-            matchList[num].show('text')    
-            print('')
+        say('\nMATCHES:')
+        for num in range(0,len(matchList)):
+            say('Match #' + str(num))
+            say(matchList[num])
+            if not records:
+                showText(matchList[num])    
+            say('')
+    
     
-    print(str(len(matchTupleList)) + ' match(es) found:')
     
+    say(str(len(matchTupleList)) + ' match(es) found:')
+    
+    if sort == 'part':
+        pass
+            
+    elif sort == 'measure':
+        say('Sorting by measures: ')
+        matchList = sortByMeasure(matchList)
+        matchTupleList = sortTupleByMeasure(matchTupleList)
+    
+    for matchTuple in matchTupleList:
+        say('\tPart %d from measure %d to %d' % (matchTuple[1], firstMeasure(matchTuple[0]), lastMeasure(matchTuple[0])))
 
-    for matchTuple in matchTupleList: # print all the matches found
-        print('\tPart ' + str(matchTuple[1]) + ' from measure ' + str(matchTuple[0].notes[0].measureNumber), end = ' ')
-        print('to ' + str(matchTuple[0].notes[-1].measureNumber))
+    
+    if inverse:
+        say(str(len(inverseMatchTupleList)) + ' inverse match(es) found:')  
+        for inverseMatchTuple in inverseMatchTupleList:
+            say('\tPart %d from measure %d to %d' % (inverseMatchTuple[1], firstMeasure(inverseMatchTuple[0]), lastMeasure(inverseMatchTuple[0])))      
+    
+    if retrograde:
+        printRetrogradeMatches(retrogradeMatchTupleLists, inverse)
+    
+    if show:
+        score = colorMatches(index, [(matchTupleList, '#FF0000'), (inverseMatchTupleList, '#00FF00'),
+                                     (retrogradeMatchTupleLists['retrograde'], '#FF8000'),
+                                     (retrogradeMatchTupleLists['retrogradeInverse'], '#800080')])
+        score.show('musicxml')
+        
+    
+    return matchList
 
+
+@recordStats
+def discoverThemes(score, minNotes = 8, print_ = 0, generic = 0, sort = 'coverage', limit = 10, show = 0, records = 0):
+    """
+    # input:
+    #    score - the parsed score (or ScoreIndex) to search in
+    #
+    #    minNotes - only patterns of at least this many notes are reported
+    #        Default value is 8
+    #
+    #    print_ - If True, print extra information that may be useful in the terminal
+    #        Default value is False (0)
+    #
+    #    generic - If True, patterns are made of generic intervals (like genericIntervalSearch())
+    #        If False, of intervals in semitones (like exactIntervalSearch())
+    #        Default value is False
+    #
+    #    sort - how to rank the patterns
+    #        'coverage' ranks by how many notes of the score the occurrences cover, then by occurrences
+    #        'occurrences' ranks by number of occurrences, then by coverage
+    #        Default value is 'coverage'
+    #
+    #    limit - how many of the top patterns to return, None for all of them
+    #        Default value is 10
+    #
+    #    show - If True, color the occurrences of the top pattern, and use music21's show('musicxml') to visualize score
+    #        Default value is False
+    #
+    #    records - If True, return MatchRecords instead of Streams, no excerpt is made until asked for
+    #        Default value is False
+    #
+    # output: without needing a motif, finds every maximal repeated interval pattern of the score
+    #    (see SuffixArrayIndex.maximalRepeats()) and returns a list with, for each pattern, the list of
+    #    (match, partNum) of its occurrences, like the matchTupleList of the search functions
+    #    best ranked pattern first
+    """
+    
+    say('\nDiscovering repeated %s interval patterns of at least %d notes...' % ('generic' if generic else 'exact', minNotes))
+    
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
+    with timedPhase('match'):
+        repeats = SuffixArrayIndex(index, generic).maximalRepeats(max(1, minNotes - 1))
+    countStats(matches = sum(len(positions) for (length, positions) in repeats))
+    
+    rankedRepeats = []
+    for (length, positions) in repeats:
+        covered = set()
+        for (scoreNum, partNum, noteNum) in positions: # notes covered by any occurrence, counted once
+            covered.update((partNum, num) for num in range(noteNum, noteNum + length + 1))
+        rankedRepeats.append((length, positions, len(covered)))
+        
+    if sort == 'occurrences':
+        rankedRepeats.sort(key = lambda repeat: (-len(repeat[1]), -repeat[2], repeat[1]))
+    else: # sort == 'coverage'
+        rankedRepeats.sort(key = lambda repeat: (-repeat[2], -len(repeat[1]), repeat[1]))
+    
+    say(str(len(rankedRepeats)) + ' pattern(s) found')
+    if limit is not None:
+        rankedRepeats = rankedRepeats[:limit]
+    
+    themes = []
+    for (patternNum, (length, positions, coverage)) in enumerate(rankedRepeats):
+        matchTupleList = [(newMatch(index, partNum, noteNum, noteNum + length + 1, records), partNum)
+                          for (scoreNum, partNum, noteNum) in positions]
+        themes.append(matchTupleList)
+        
+        say('Pattern #%d: %d notes, %d occurrence(s), %d notes covered' % (patternNum, length + 1, len(positions), coverage))
+        if print_:
+            for matchTuple in matchTupleList:
+                say('\tPart %d from measure %d to %d' % (matchTuple[1], firstMeasure(matchTuple[0]), lastMeasure(matchTuple[0])))
+    
+    if show and len(themes) > 0:
+        score = colorScore(index, themes[0])
+        score.show('musicxml') # show() the score in musicxml
+    
+    return themes
+
+
+@recordStats
+def strettoSearch(score, motifPart, motifStart, motifEnd, notes = None, print_ = 0, generic = 1, inverse = 0,
+                  maxLag = None, show = 0, records = 0):
+    """
+    # input:
+    #    score - the parsed score to search in
+    #
+    #    motiPart - integer indicating the part in the score to grab the notes from
+    #
+    #    motifStart - integer indicating first note of the subject
+    #
+    #    motifEnd - integer indicating the note after the last note of the subject
+    #
+    #    notes - string to be converted to a Stream with Notes via stringToNotes()
+    #        If notes isn't None, then motifPart, motifStart, and motifEnd will be ignored.
+    #        Default value is None
+    #
+    #    print_ - If True, print extra information that may be useful in the terminal
+    #        Default value is False (0)
+    #
+    #    generic - If True, entries are found by generic intervals (like genericIntervalSearch()),
+    #        so tonal answers count; if False, by intervals in semitones (like exactIntervalSearch())
+    #        Default value is True
+    #
+    #    inverse - If True, entries of the inverted subject count as well
+    #        (every generic interval inverted, or every interval in semitones when generic is False)
+    #        Default value is False
+    #
+    #    maxLag - longest time (in quarter lengths) between two entries to report, None for any overlap
+    #        Default value is None
+    #
+    #    show - If True, color the entries in stretto, and use music21's show('musicxml') to visualize score
+    #        regular entries are colored red, inverse ones green
+    #        Default value is False
+    #
+    #    records - If True, leaders and followers are MatchRecords instead of Streams
+    #        Default value is False
+    #
+    # output: finds every entry of the subject, then every pair of entries in different parts that overlap in time,
+    #    returns a list of (leader, follower, lag, semitones, generic), in order of when the follower comes in
+    #    leader and follower are the matches, lag is how many quarter lengths later the follower comes in,
+    #    semitones and generic give the interval of imitation (e.g. 7 and 5 for an answer a fifth above)
+    #
+    """
+    
+    say('\nSearching for stretti...')
+    
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
+    
+    if notes != None: # if there exists a string for notes
+        say('\tCustom motif used')
+    else:
+        say('\tMotif taken from score')
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
+    
+    if generic:
+        entries = genericMatches(index, motif, 0, inverse)
+    else:
+        entries = intervalMatches(index, motif, None, inverse)
+    pairs = strettoPairs(index, timedMatches(entries), maxLag)
+    
+    say(str(len(pairs)) + ' stretto entr(ies) found:')
+    for (leader, follower, lag, semitones, genericValue) in pairs:
+        direction = 'above' if semitones > 0 else 'below' if semitones < 0 else ''
+        say('\tPart %d (measure %d) answered by Part %d (measure %d) %s quarter(s) later, %s %s (%d semitones)%s' %
+              (leader.partNum, leader.measureStart, follower.partNum, follower.measureStart, lag,
+               interval.GenericInterval(genericValue).niceName, direction, semitones,
+               ', inverted' if follower.kind != leader.kind else ''))
+        if print_:
+            say('\t\tfrom offset %s to %s, and from %s to %s' % (leader.offsetStart, leader.offsetEnd,
+                                                              follower.offsetStart, follower.offsetEnd))
+    
     if show:
-        score = colorScore(score, matchTupleList) # color the score with the matches
-        score.show('musicxml') # show() the score in musicxml
-
+        entries = set()
+        for pair in pairs:
+            entries.update(pair[:2])
+        score = colorMatches(index, [([(entry, entry.partNum) for entry in sorted(entries) if entry.kind == 'regular'], '#FF0000'),
+                                     ([(entry, entry.partNum) for entry in sorted(entries) if entry.kind == 'inverse'], '#00FF00')])
+        score.show('musicxml')
     
-    return matchList
+    if not records:
+        pairs = [(leader.excerpt(index), follower.excerpt(index), lag, semitones, genericValue)
+                 for (leader, follower, lag, semitones, genericValue) in pairs]
+    
+    return pairs
 
 
-def genericIntervalSearch(score, motifPart, motifStart, motifEnd, 
-                          notes = None, print_ = 0, approx = 0, context = 0, 
-                          sort = 'part', show = 0, inverse = 0, retrograde = 0):
+@recordStats
+def approximateSearch(score, motifPart, motifStart, motifEnd, notes = None, print_ = 0, maxEdits = 1, kind = 'pitch',
+                      indels = 1, context = 0, show = 0, records = 0):
     """
     # input:
     #    score - the parsed score to search in
@@ -788,553 +2633,1544 @@ def genericIntervalSearch(score, motifPart, motifStart, motifEnd,
     #    motifEnd - integer indicating the note after the last note of query
     #
     #    notes - string to be converted to a Stream with Notes via stringToNotes()
-    #        The given Stream will be used to find matches instead.
     #        If notes isn't None, then motifPart, motifStart, and motifEnd will be ignored.
     #        Default value is None
     #
     #    print_ - If True, print extra information that may be useful in the terminal
     #        Default value is False (0)
     #
-    #    approx - If True, match by approxInterval() instead of music21.genericInterval()
-    #        Default value is False
+    #    maxEdits - the most notes that may be substituted, inserted or deleted compared to the motif
+    #        Default value is 1
+    #
+    #    kind - what is compared
+    #        'pitch' compares note names (octaves don't matter, like exactPitchSearch())
+    #        'interval' compares intervals in semitones (like exactIntervalSearch())
+    #        'generic' compares generic intervals (like genericIntervalSearch())
+    #        Default value is 'pitch'
+    #
+    #    indels - If True, notes may be inserted or deleted (edit distance)
+    #        If False, only substituted (k mismatches), so every match is as long as the motif
+    #        Default value is True
     #
     #    context - If True, matches will include the 3 notes before or after the actual match
     #        Default value is False
     #
-    #    sort - determines the sorting algorithm for printing matches in terminal
-    #        Accepts either 'part' or 'measure'
-    #        Default value is 'part'
-    #
     #    show - If True, color matches to score, and use music21's show('musicxml') to visualize score
+    #        exact matches are colored red, approximate ones blue
     #        Default value is False
     #
-    #    inverse - If True, finds matches for inverses as well
-    #        Program will color inverse matches blue for visualization
+    #    records - If True, return MatchRecords instead of Streams, no excerpt is made until asked for
     #        Default value is False
-    #    
-    #    retrograde - Unimplemented. 
-    #       To be made into a parameter that would allow searches for retrograde melody.
     #
     # output: comparing the motif/theme against the score,
     #    returns a list of matching Streams, excerpted from the score
-    #    A Stream is a match iff all the generic intervals of the Stream matches that of the motif
+    #    A Stream is a match iff its notes (or intervals) are at most maxEdits edits away from those of the motif
+    #    finds ornamented or varied entries of a theme that the exact searches miss
+    #    a rest always breaks a match
     #
-    """        
+    """
     
+    say('\nSearching by %s with up to %d edit(s)...' % (kind, maxEdits))
     
-    print('\nSearching by generic intervals...')
-
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
     
-    flatParts = []
-    for part in score.parts:
-        flatParts.append(part.flat) # flatten each Parts in the score
+    if notes != None: # if there exists a string for notes
+        say('\tCustom motif used')
+    else:
+        say('\tMotif taken from score')
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
     
-    noteParts = []
-    for part in flatParts: # extract notes and rests for each flattened Parts
-        noteParts.append(part.notesAndRests)
+    matchList = []
+    matchTupleList = []
+    approxMatchTupleList = []
     
-    if notes != None: # if there exists a string for notes
-        print('\tCustom motif used')
-        # a very crude way of differentiating strings with octave info and those without
-        if hasNumber(notes):
-            motif = stringToNotesWithOctave(notes)
+    for (partNum, start, end, matchKind) in timedMatches(approxMatches(index, motif, maxEdits, kind, indels)):
+        start, end = contextRange(index, partNum, start, end, context)
+        match = newMatch(index, partNum, start, end, records, matchKind)
+        matchList.append(match)
+        if matchKind == 'regular':
+            matchTupleList.append((match, partNum))
         else:
-            motif = stringToNotes(notes)
-    else: # if notes == None
-        print('\tMotif taken from score')
-        motif = flatParts[motifPart].notes[motifStart:motifEnd]
+            approxMatchTupleList.append((match, partNum))
+    
+    if (print_):
+        say('\nMATCHES:') 
+        for num in range(0,len(matchList)): # print out all the elements within the matches
+            say('Match #' + str(num))
+            say(matchList[num])
+            if not records:
+                showText(matchList[num])    
+            say('')
     
+    say('%d match(es) found, %d of them approximate:' % (len(matchList), len(approxMatchTupleList)))
     
-    mIntervalList = [] # list of intervals in the motif
-    matchList = [] 
+    for matchTuple in sorted(matchTupleList + approxMatchTupleList, key = lambda matchTuple: matchTuple[1]):
+        say('\tPart %d from measure %d to %d' % (matchTuple[1], firstMeasure(matchTuple[0]), lastMeasure(matchTuple[0])))
+    
+    if show:
+        score = colorMatches(index, [(matchTupleList, '#FF0000'), (approxMatchTupleList, '#0000FF')])
+        score.show('musicxml')
+    
+    return matchList
+
+
+def iterExactIntervalSearch(score, motifPart = 0, motifStart = 0, motifEnd = 0, notes = None, inverse = 0, retrograde = 0,
+                            limit = None, stopAfterFirst = 0, parts = None, measures = None):
+    """
+    # Same matches as exactIntervalSearch(), but as a generator of MatchRecords, each one given as soon as it's found
+    #    nothing is printed, and no excerpt is made (see MatchRecord.excerpt())
+    #
+    # input:
+    #    score, motifPart, motifStart, motifEnd, notes, inverse, retrograde - as in exactIntervalSearch()
+    #
+    #    limit - stop after this many matches, None for no limit
+    #        Default value is None
+    #
+    #    stopAfterFirst - If True, stop at the first match (same as limit = 1)
+    #        Default value is False
+    #
+    #    parts - list of the part numbers to search, None for every part
+    #        Default value is None
+    #
+    #    measures - (first, last) only give matches within these measures, None for the whole score
+    #        Default value is None
+    #
+    # once the generator stops (or isn't asked for more), the rest of the score is never scanned, e.g.
+    #    next(iterExactIntervalSearch(index, notes = 'C D E- F'), None) is None
+    # tells whether the motif appears at all
+    #
+    # the other iter*Search functions take the same limit, stopAfterFirst, parts and measures
+    #    they take no stats argument, and aren't given to the stats hook: their time is spent by whoever asks for the matches
+    """
+    index = indexScore(score)
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
+    return iterMatches(index, intervalMatches(index, motif, parts, inverse, retrograde), limit, stopAfterFirst, measures)
+
+
+def iterExactNoteSearch(score, motifPart = 0, motifStart = 0, motifEnd = 0, notes = None, octave = 1,
+                        limit = None, stopAfterFirst = 0, parts = None, measures = None):
+    """
+    # Same matches as exactNoteSearch(), as a generator of MatchRecords (see iterExactIntervalSearch())
+    """
+    index = indexScore(score)
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
+    return iterMatches(index, noteMatches(index, motif, octave, parts), limit, stopAfterFirst, measures)
+
+
+def iterExactPitchSearch(score, motifPart = 0, motifStart = 0, motifEnd = 0, notes = None, octave = 1,
+                         limit = None, stopAfterFirst = 0, parts = None, measures = None):
+    """
+    # Same matches as exactPitchSearch(), as a generator of MatchRecords (see iterExactIntervalSearch())
+    """
+    index = indexScore(score)
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
+    return iterMatches(index, pitchMatches(index, motif, octave, parts), limit, stopAfterFirst, measures)
+
+
+def iterExactRhythmSearch(score, motifPart = 0, motifStart = 0, motifEnd = 0, rhythm = None, scale = 1,
+                          limit = None, stopAfterFirst = 0, parts = None, measures = None):
+    """
+    # Same matches as exactRhythmSearch(), as a generator of MatchRecords (see iterExactIntervalSearch())
+    """
+    index = indexScore(score)
+    if rhythm is not None:
+        motif = compiledMotif('rhythm', rhythm)
+    else:
+        motif = PartFeatures(index.flatParts[motifPart].notes[motifStart:motifEnd])
+    return iterMatches(index, rhythmMatches(index, motif, parts, scale), limit, stopAfterFirst, measures)
+
+
+def iterGenericIntervalSearch(score, motifPart = 0, motifStart = 0, motifEnd = 0, notes = None, approx = 0, inverse = 0,
+                              retrograde = 0, limit = None, stopAfterFirst = 0, parts = None, measures = None):
+    """
+    # Same matches as genericIntervalSearch(), as a generator of MatchRecords (see iterExactIntervalSearch())
+    #    matches of every form come in the order they're found, told apart by MatchRecord.kind
+    """
+    index = indexScore(score)
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
+    return iterMatches(index, genericMatches(index, motif, approx, inverse, parts, retrograde), limit, stopAfterFirst, measures)
+
+
+def iterExactContourSearch(score, motifPart = 0, motifStart = 0, motifEnd = 0, contour = None, inverse = 0, retrograde = 0,
+                           limit = None, stopAfterFirst = 0, parts = None, measures = None):
+    """
+    # Same matches as exactContourSearch(), as a generator of MatchRecords (see iterExactIntervalSearch())
+    #    matches of every form come in the order they're found, told apart by MatchRecord.kind
+    """
+    index = indexScore(score)
+    if contour is not None:
+        motif = compiledMotif('contour', contour)
+    else:
+        motif = PartFeatures(index.flatParts[motifPart].notes[motifStart:motifEnd])
+    return iterMatches(index, contourMatches(index, motif, inverse, parts, retrograde), limit, stopAfterFirst, measures)
+
+
+def iterApproximateSearch(score, motifPart = 0, motifStart = 0, motifEnd = 0, notes = None, maxEdits = 1, kind = 'pitch',
+                          indels = 1, limit = None, stopAfterFirst = 0, parts = None, measures = None):
+    """
+    # Same matches as approximateSearch(), as a generator of MatchRecords (see iterExactIntervalSearch())
+    #    exact matches have kind 'regular', the others 'approximate'
+    """
+    index = indexScore(score)
+    motif = motifFeatures(index, motifPart, motifStart, motifEnd, notes)
+    return iterMatches(index, approxMatches(index, motif, maxEdits, kind, indels, parts), limit, stopAfterFirst, measures)
+
+
+def iterRhythmContourSearch(score, motifPart = 0, motifStart = 0, motifEnd = 0, approx = 0, contour = None, rhythm = None,
+                            limit = None, stopAfterFirst = 0, parts = None, measures = None):
+    """
+    # Same matches as rhythmContourSearch(), as a generator of MatchRecords (see iterExactIntervalSearch())
+    """
+    index = indexScore(score)
+    if contour is not None or rhythm is not None:
+        motif = compiledMotif('rhythmContour', contour, rhythm)
+    else:
+        motif = PartFeatures(index.flatParts[motifPart].notes[motifStart:motifEnd])
+    return iterMatches(index, rhythmContourMatches(index, motif, approx, parts), limit, stopAfterFirst, measures)
+
+
+@recordStats
+def rhythmContourSearch(score, motifPart, motifStart, motifEnd, contour = None, print_ = 0, approx = 0, context = 0, sort = 'part',
+                        rhythm = None, show = 0, records = 0):
+    """
+    # Given a score, which part the motif occurs (motifPart), where it starts (motifStart) and ends (motifEnd) by notes,
+    #    returns a list of Part excerpts that have both the contour line and the rhythm of the theme
+    #
+    # contour and rhythm are strings (see contourToNotes() and stringToNotesRhythm()) that will be used instead of the score
+    #    they must be given together, with one note of rhythm per note of contour
+    #    motifPart, motifStart, and motifEnd will then be ignored
+    #
+    # print_ is a boolean value that, if true, make the program print out additional information (what notes are in the matches)
+    #
+    # approx is a boolean value that, if true, matches relative rhythm (the ratios between neighbouring durations),
+    #    so the theme also matches in augmentation or diminution
+    #
+    # context is a boolean value that, if true, matches will include the 3 notes before or after the actual match
+    #
+    # sort is a string of values either 'part' or 'measure'
+    #    the printed list will be sorted by either part or measure, respectively
+    #
+    # show is a boolean value that, if true, will export the score (using music21's show() function)
+    #    the exported score will have all the matches colored in red
+    #
+    # records is a boolean value that, if true, returns MatchRecords instead of Streams
+    #    no excerpt is made until MatchRecord.excerpt() is called
+    #
+    """
+    
+    say('\nSearching by rhythm and contour...')
+    
+    index = indexScore(score) # flattens the score and reads all the notes, unless it's already a ScoreIndex
+    
+    if contour != None or rhythm != None: # custom motif
+        say('\tCustom motif used')
+        motif = compiledMotif('rhythmContour', contour, rhythm)
+    else:
+        say('\tMotif taken from score')
+        motif = PartFeatures(index.flatParts[motifPart].notes[motifStart:motifEnd])
+    
+    if print_: # verbose
+        say('Contour and rhythm are defined as follows:')
+        for (step, quarterLength) in zip([None] + motif.contour.tolist(), motif.quarterLengths.tolist()):
+            say('%s%s' % ({None: '', 1: 'up, ', -1: 'down, ', 0: 'repeat, '}[step], quarterLength))
+        say('')
+    
+    matchList = []
     matchTupleList = []
-    inverseMatchList = []
-    inverseMatchTupleList = []
+    
+    for (partNum, start, end, kind) in timedMatches(rhythmContourMatches(index, motif, approx)):
+        start, end = contextRange(index, partNum, start, end, context)
+        match = newMatch(index, partNum, start, end, records)
+        matchList.append(match)
+        matchTupleList.append((match, partNum))
+    
+    if (print_):
+        say('\nMATCHES:')
+        for num in range(0,len(matchList)):
+            say('Match #' + str(num))
+            say(matchList[num])
+            if not records:
+                showText(matchList[num])    
+            say('')
+    
+    say(str(len(matchTupleList)) + ' match(es) found:')
+    
+    if sort == 'measure':
+        say('Sorting by measures: ')
+        matchList = sortByMeasure(matchList)
+        matchTupleList = sortTupleByMeasure(matchTupleList)
+    
+    for matchTuple in matchTupleList:
+        say('\tPart %d from measure %d to %d' % (matchTuple[1], firstMeasure(matchTuple[0]), lastMeasure(matchTuple[0])))
+    
+    if show:
+        score = colorScore(index, matchTupleList)
+        score.show('musicxml')
+    
+    return matchList
+
+
+def colorScore(score, matchTupleList, noteColor = '#FF0000'):
+    """
+    # Given a score (or ScoreIndex) and a matchTupleList (Stream or MatchRecord, int)
+    #    for all the matchTuples: color its respective part in the score
+    #
+    # noteColor defines the color, red by default
+    #
+    # see colorMatches() to color several matchTupleLists in different colors at once
+    """
+    
+    return colorMatches(score, [(matchTupleList, noteColor)])
+
 
-    currentlyMatching = 'none'
+@phase('color')
+def colorMatches(score, coloredMatchLists):
+    """
+    # Given a score (or ScoreIndex) and a list of (matchTupleList, noteColor)
+    #    colors the matches of every matchTupleList in its color, all in one pass
+    #    (where matches overlap, later lists color over earlier ones)
+    #
+    # every part is flattened at most once (never, if given a ScoreIndex) and gets a dictionary
+    #    from offset to the first note or rest at that offset, so finding a match is a single lookup
+    #
+    # returns the colored score
+    """
     
-    if print_: 
-        print('Matching the following intervals:')
+    if isinstance(score, ScoreIndex): # the parts are already flattened, and their offsets known
+        noteParts = score.noteParts
+        partOffsets = [part.offsets.tolist() for part in score.parts]
+        score = score.score
+    else:
+        noteParts = [part.flat.notesAndRests for part in score.parts] # flatten every part, only this once
+        partOffsets = [[element.offset for element in part] for part in noteParts]
         
-    for num in range(0, len(motif) - 1):
-        mIntervalList.append(interval.notesToGeneric(motif[num], motif[num+1]))
-        if print_: 
-            print('\t' + str(mIntervalList[num]))
+    offsetMapList = [None] * len(noteParts) # offset -> note number, made when a part first gets a match
+    
+    for (matchTupleList, noteColor) in coloredMatchLists:
+        for match in matchTupleList: # for every match in matchTupleList
+            if isinstance(match[0], MatchRecord): # already knows exactly which notes it is
+                for num in range(match[0].noteStart, match[0].noteEnd):
+                    noteParts[match[1]][num].style.color = noteColor
+                continue
+                
+            targetOffset = match[0].flat.notesAndRests[0].offset 
+                # define targetOffset as the offset (distance from the front) of the first element in match
+            partNum = match[1]
             
+            if offsetMapList[partNum] is None:
+                offsetMapList[partNum] = {}
+                for (noteNum, offset) in enumerate(partOffsets[partNum]):
+                    offsetMapList[partNum].setdefault(offset, noteNum) # keep the first note at every offset
+                    
+            matchPlace = offsetMapList[partNum].get(targetOffset, -1)
             
-    # the actual checking
-    matchQ = False;
-    i = 0
-    j = 0
+            if matchPlace != -1: # if we found a note at the given offset
+                for num in range(0, len(match[0].notesAndRests)):
+                    noteParts[partNum][matchPlace + num].style.color = noteColor
+                    
+            else: # if we didn't find any note at the given offset
+                say('Cannot color score as %s cannot be found' % match[0])
+    
+    return score
+
+
+def buildSuffixArray(sequence):
+    """
+    # input: a list of integers
+    # output: numpy array of the start of every suffix of sequence, in sorted order of the suffixes
+    #
+    # prefix doubling: suffixes are sorted by their first 1, 2, 4, 8... elements, each round one numpy sort
+    """
+    length = len(sequence)
+    if length == 0:
+        return numpy.zeros(0, dtype = numpy.int64)
+
+    rank = numpy.unique(numpy.asarray(sequence), return_inverse = True)[1].astype(numpy.int64)
+    suffixArray = numpy.argsort(rank, kind = 'stable')
+    step = 1
+
+    while step < length and rank.max() < length - 1: # until every suffix has a rank of its own
+        nextRank = numpy.full(length, -1, dtype = numpy.int64) # past the end sorts first
+        nextRank[:length - step] = rank[step:]
+        suffixArray = numpy.lexsort((nextRank, rank))
         
-    for listNum in range(0, len(noteParts)): # for all parts in the piece
-        for noteNum in range(0, len(noteParts[listNum]) - len(mIntervalList)): # for all notes in the part
-            for mIntervalNum in range(0, len(mIntervalList)): # for all notes in the motif
+        changed = (rank[suffixArray][1:] != rank[suffixArray][:-1]) | (nextRank[suffixArray][1:] != nextRank[suffixArray][:-1])
+        rank = numpy.empty(length, dtype = numpy.int64)
+        rank[suffixArray] = numpy.concatenate(([0], numpy.cumsum(changed)))
+        step = step * 2
 
-                if noteParts[listNum][noteNum + mIntervalNum].isNote:
-                    if noteParts[listNum][noteNum + mIntervalNum + 1].isNote : #check if both notes are notes at all
-                        #if yes, make interval of this and next note, and use that to compare with motif
-                        intervalCandidate = interval.notesToGeneric(noteParts[listNum][noteNum + mIntervalNum], noteParts[listNum][noteNum + mIntervalNum + 1])
+    return suffixArray
 
-                else:  # if not, break
-                    #matchQ == False
-                    break
-                
-                
-                if mIntervalNum == 0: # when matching the first interval
-                    if intervalCandidate == mIntervalList[mIntervalNum]: # if first interval match
-                        currentlyMatching = 'regular'
-                        
-                    elif inverse and intervalCandidate.reverse() == mIntervalList[mIntervalNum]: # if intervals are inverted
-                        currentlyMatching = 'inverse'
-                        
-                    elif approx:
-                        if approxInterval(intervalCandidate, mIntervalList[mIntervalNum]): 
-                            currentlyMatching = 'regular'
-                        
-                        elif inverse and approxInterval(intervalCandidate.reverse(), mIntervalList[mIntervalNum]):
-                            currentlyMatching = 'inverse'
-                        
-                        else:
-                            currentlyMatching = 'none'
-                            break
-                    
-                    else: # if intervals don't match
-                        currentlyMatching = 'none' # reset currentlyMatching
-                        break
-                    
-                    if mIntervalNum == len(mIntervalList) - 1: # if matching the last interval
-                        matchQ = True
+
+def buildLCPArray(sequence, suffixArray):
+    """
+    # input: a list and its suffix array (see buildSuffixArray())
+    # output: list where entry num is the length of the longest common prefix of
+    #    suffixes suffixArray[num - 1] and suffixArray[num] (entry 0 is 0)
+    #
+    # Kasai's algorithm, linear time
+    """
+    length = len(sequence)
+    rank = [0] * length
+    for (num, start) in enumerate(suffixArray.tolist()):
+        rank[start] = num
+
+    lcp = [0] * length
+    common = 0
+    for start in range(0, length): # suffixes in order of where they start
+        if rank[start] == 0:
+            common = 0
+            continue
+        previous = suffixArray[rank[start] - 1]
+        while start + common < length and previous + common < length and sequence[start + common] == sequence[previous + common]:
+            common = common + 1
+        lcp[rank[start]] = common
+        if common > 0: # the next suffix shares at least one less
+            common = common - 1
+
+    return lcp
+
+
+class SuffixArrayIndex(object):
+    """
+    # Suffix array (with LCP array) of the intervals of every part of one or many scores
+    #
+    # input: scores - a score or ScoreIndex, or a list of scores, ScoreIndexes or score file paths
+    #        (file paths are read through cachedScoreIndex())
+    #    generic - If True, index generic intervals like genericIntervalSearch()
+    #        If False, index intervals in semitones like exactIntervalSearch()
+    #        Default value is False
+    #    approx - If True, index the groups of approxInterval() (see approxClasses()),
+    #        like genericIntervalSearch() with approx; implies generic
+    #        Default value is False
+    #
+    # All the parts are put one after the other in one sequence. Every rest and the end of every part
+    #    gets a number of its own, so nothing ever matches across a rest or from one part into the next.
+    #
+    #    suffixIndex = SuffixArrayIndex(scorePaths('bach/'))
+    #    suffixIndex.search('C D E- F')
+    #
+    # finding a motif is a binary search over the suffix array, O(m log n) whatever the motif length,
+    #    and every occurrence comes out of one run of the suffix array
+    """
+
+    def __init__(self, scores, generic = 0, approx = 0):
+        if not isinstance(scores, (list, tuple)):
+            scores = [scores]
             
-                
-                elif (intervalCandidate == mIntervalList[mIntervalNum]): # if interval matches
-                    if currentlyMatching == 'regular':
-                        if mIntervalNum == len(mIntervalList) - 1: # if matching last interval
-                            matchQ = True
-                    else: # currentlyMatching != 'regular'
-                        currentlyMatching = 'none' # reset currentlyMatching
-                        break
-                    
-                elif inverse and intervalCandidate.reverse() == mIntervalList[mIntervalNum]:
-                    # if interval is inverted
-                    if currentlyMatching == 'inverse':
-                        if mIntervalNum == len(mIntervalList) - 1: # if matching last interval
-                            matchQ = True
-                    else:
-                        currentlyMatching = 'none' # reset currentlyMatching
-                        break
-                        
-                elif approx:
-                    if approxInterval(intervalCandidate, mIntervalList[mIntervalNum]):
-                        # if the two intervals are approximately the same (see approxInterval())
-                        if currentlyMatching == 'regular':
-                            if mIntervalNum == len(mIntervalList) - 1: # if matching last interval
-                                matchQ = True
-                        else:
-                            currentlyMatching = 'none' # reset currentlyMatching
-                            break
-                            
-                    elif inverse and approxInterval(intervalCandidate.reverse(), mIntervalList[mIntervalNum]):
-                        # if the inverted interval of one is approximately the same as the other (see approxInterval())
-                        if currentlyMatching == 'inverse':
-                            if mIntervalNum == len(mIntervalList) - 1: # if matching last interval
-                                matchQ = True
-                        else:
-                            currentlyMatching = 'none' # reset currentlyMatching
-                            break 
-                            
-                    else:
-                        break
-                
-                else:
-                    break  #candidate interval != motif interval
+        self.generic = generic or approx
+        self.approx = approx
+        self.indexes = [] # scoreNum -> ScoreIndex
+        self.keys = [] # (scoreNum, partNum) of every part in the sequence
+        self.starts = [] # where every part starts in the sequence
+        self.sequence = []
+        separator = NO_INTERVAL + 1 # every separator is a new number
 
-            if matchQ: #if intervalCandidate matches motif
-                
-                if context: # getting the closest three surrounding notes for the match
-                    previousNote = noteParts[listNum][noteNum].previous() # previousNote = the element before the first note of the match
-                    nextNote = noteParts[listNum][noteNum + len(mIntervalList) + 1].next() 
-                        # nextNote = the element after the last note of the match
-                    
-                    for num in range(0, 3): # for 3 times
-                        if 'Barline' in previousNote.classes: # if the previousNote is a barline
-                            num = num - 1 # ignore it (move the pointer num back)
-                            
-                        elif 'note' in previousNote.classes or 'rest' in previousNote.classes: # if previousNote is a note or rest
-                            previousNote = previousNote.previous() # move previousNote to the previous note of the original previousNote
-                            i = i + 1 # increment i
-                            
-                        else : break # if previousNote is neither barline nor note, break
-                        
-                    for num in range(0, 3):
-                        if 'Barline' in nextNote.classes: # if the nextNote is a barline
-                            num = num - 1 # ignore it (move the pointer num back)
-                        elif 'note' in nextNote.classes or 'rest' in nextNote.classes:# if nextNote is a note or rest
-                            nextNote = nextNote.next() # move nextNote to the next note of the original nextNote
-                            j = j + 1 # increment j
-                            
-                        else : break # if nextNote is neither barline nor note, break                
-                
-                
-                match = noteParts[listNum][noteNum - i: noteNum + len(mIntervalList) + 1 + j]             
+        for (scoreNum, score) in enumerate(scores):
+            if isinstance(score, str):
+                index = cachedScoreIndex(score)
+            else:
+                index = indexScore(score)
+            self.indexes.append(index)
+            
+            for partNum in range(0, len(index)):
+                self.keys.append((scoreNum, partNum))
+                self.starts.append(len(self.sequence))
+                intervals = index.parts[partNum].generic if self.generic else index.parts[partNum].chromatic
+                if approx:
+                    intervals = approxClasses(intervals)
+                for value in intervals.tolist():
+                    if value == NO_INTERVAL: # a rest, never the same as anything else
+                        value = separator
+                        separator = separator + 1
+                    self.sequence.append(value)
+                self.sequence.append(separator) # end of the part
+                separator = separator + 1
+
+        self.suffixArray = buildSuffixArray(self.sequence)
+        self.lcp = buildLCPArray(self.sequence, self.suffixArray)
+
+
+    def position(self, start):
+        """
+        # input: a place in the sequence
+        # output: (scoreNum, partNum, noteNum) it stands for
+        """
+        partIndex = bisect.bisect_right(self.starts, start) - 1
+        (scoreNum, partNum) = self.keys[partIndex]
+        return (scoreNum, partNum, start - self.starts[partIndex])
+
+
+    def suffixRange(self, pattern):
+        """
+        # input: a list of intervals
+        # output: (low, high), the suffixes in suffixArray[low:high] are all that start with pattern
+        """
+        sequence = self.sequence
+        suffixArray = self.suffixArray
+        length = len(pattern)
+
+        low = 0
+        high = len(suffixArray)
+        while low < high: # first suffix not smaller than pattern
+            middle = (low + high) // 2
+            if sequence[suffixArray[middle]:suffixArray[middle] + length] < pattern:
+                low = middle + 1
+            else:
+                high = middle
+        first = low
+
+        high = len(suffixArray)
+        while low < high: # first suffix past all those starting with pattern
+            middle = (low + high) // 2
+            if sequence[suffixArray[middle]:suffixArray[middle] + length] <= pattern:
+                low = middle + 1
+            else:
+                high = middle
+
+        return (first, low)
+
+
+    def find(self, pattern):
+        """
+        # input: a list of intervals
+        # output: sorted list of (scoreNum, partNum, noteNum) of everywhere pattern appears
+        """
+        if len(pattern) == 0:
+            return []
+        (low, high) = self.suffixRange(list(pattern))
+        return sorted(self.position(start) for start in self.suffixArray[low:high].tolist())
+
+
+    def search(self, notes, print_ = 0):
+        """
+        # input: notes - string of notes, as given to stringToNotes() or stringToNotesWithOctave(),
+        #        or a Stream of notes
+        #    print_ - If True, print every match in the terminal
+        # output: list of (scoreNum, partNum, noteStart, noteEnd) for every match, noteEnd being the note after the match
+        """
+        motif = compiledMotif('notes', notes) if isinstance(notes, str) else PartFeatures(notes)
+        pattern = motif.generic if self.generic else motif.chromatic
+        if self.approx:
+            pattern = approxClasses(pattern)
+        pattern = pattern.tolist()
+
+        matches = [(scoreNum, partNum, noteNum, noteNum + len(pattern) + 1) for (scoreNum, partNum, noteNum) in self.find(pattern)]
+
+        if print_:
+            say(str(len(matches)) + ' match(es) found:')
+            for (scoreNum, partNum, noteStart, noteEnd) in matches:
+                measureNumbers = self.indexes[scoreNum].parts[partNum].measureNumbers
+                say('\tScore %d: Part %d from measure %d to %d' % (scoreNum, partNum, measureNumbers[noteStart], measureNumbers[noteEnd - 1]))
+
+        return matches
+
+
+    def maximalRepeats(self, minLength):
+        """
+        # input: minLength - shortest number of intervals worth reporting
+        # output: list of (length, positions) for every maximal repeated interval pattern at least minLength long
+        #    positions is the sorted list of (scoreNum, partNum, noteNum) of all its occurrences
+        #
+        # A repeat is maximal when its occurrences can't all be made longer on either side.
+        # Every group of suffixes sharing a prefix (an LCP interval) is a repeat that can't be made longer
+        #    to the right; it's kept if not all its occurrences follow the same interval.
+        # The LCP intervals come from one pass over the LCP array with a stack, so this is linear
+        #    in the length of the sequence plus the number of occurrences reported.
+        """
+        sequence = self.sequence
+        suffixArray = self.suffixArray.tolist()
+        repeats = []
+        stack = [(0, 0)] # (length of common prefix, first suffix of the group)
+
+        for num in range(1, len(suffixArray) + 1):
+            common = self.lcp[num] if num < len(suffixArray) else 0
+            first = num - 1
+            while common < stack[-1][0]: # the group on top of the stack ends at suffix num - 1
+                (length, first) = stack.pop()
+                if length >= minLength:
+                    starts = suffixArray[first:num]
+                    before = set(sequence[start - 1] if start > 0 else None for start in starts)
+                    if len(before) > 1: # left maximal too
+                        repeats.append((length, sorted(self.position(start) for start in starts)))
+            if common > stack[-1][0]:
+                stack.append((common, first))
+
+        return repeats
+
+
+def sequenceHash(sequence):
+    """
+    # input: a list of integers
+    # output: its Rabin-Karp hash, the same as rollingHashes() gives for a window of the same elements
+    """
+    value = 0
+    for element in sequence:
+        value = (value * HASH_BASE + element) % HASH_MODULUS
+    return value
+
+
+def rollingHashes(sequence, length, barrier = NO_INTERVAL):
+    """
+    # input: a list of integers, the length of the windows,
+    #    and a barrier (e.g. NO_INTERVAL for a rest) no window can go through
+    # generates (start, hash) of every window of sequence, in order
+    #
+    # each hash comes from the one before: take out the element leaving the window, put in the one entering it,
+    #    so all the windows of a sequence are hashed in one pass whatever their length
+    """
+    if length == 0:
+        return
     
-                match.insert(0, flatParts[listNum].getClefs().elements[0]) # get the clef of the respective part
-                    # NOTE! This will fail to give the correct clef if the clef changes in the middle of the piece!
-                    # this is literally getting the first clef of the Part where the match is found
-                    # works for Art of the Fugue though
-                matchTuple = (match, listNum)
-                
-                if currentlyMatching == 'regular':
-                    matchList.append(match)
-                    matchTupleList.append(matchTuple)
-                    
-                elif inverse and currentlyMatching == 'inverse':
-                    inverseMatchList.append(match)
-                    inverseMatchTupleList.append(matchTuple)
-                
-                i = 0 # i, j, matchQ, and currentlyMatching
-                j = 0
-                matchQ = False 
-                currentlyMatching = 'none'
+    leaving = pow(HASH_BASE, length - 1, HASH_MODULUS) # weight of the first element of a window
+    value = 0
+    clean = 0 # elements since the last barrier
+    
+    for (num, element) in enumerate(sequence):
+        if element == barrier: # start over after it
+            value = 0
+            clean = 0
+            continue
+        if clean >= length: # the window is full, drop its first element
+            value = (value - sequence[num - length] * leaving) % HASH_MODULUS
+        value = (value * HASH_BASE + element) % HASH_MODULUS
+        clean = clean + 1
+        if clean >= length:
+            yield (num - length + 1, value)
+
 
+class IntervalHashTable(object):
+    """
+    # Rabin-Karp hash tables of the intervals of every part of one or many scores, for transposition invariant search
+    #
+    # input: scores - a score or ScoreIndex, or a list of scores, ScoreIndexes or score file paths
+    #        (file paths are read through cachedScoreIndex())
+    #    lengths - motif lengths (in intervals) to hash right away, default (3, 4, 5)
+    #        any other length is hashed the first time a motif of that length is looked for, and kept
+    #    cacheDir - where to cache the features of scores given as paths (see cachedScoreIndex())
+    #
+    # intervals are in semitones, as in exactIntervalSearch(), and no match goes through a rest
+    #
+    #    hashTable = IntervalHashTable(scorePaths('bach/'))
+    #    hashTable.search('C D E- F')
+    #    hashTable.searchMany(['C D E- F', 'G F E- D C'])
+    #
+    # every window of every part is hashed once per length, so building a table is expected linear time
+    #    and a lookup is one bucket; every hit is checked against the intervals themselves,
+    #    so a hash collision never gives a wrong match
+    """
+
+    def __init__(self, scores = None, lengths = (3, 4, 5), cacheDir = None):
+        self.indexes = [] # scoreNum -> ScoreIndex
+        self.paths = [] # scoreNum -> file path of the score, None if it was given parsed
+        self.intervals = {} # (scoreNum, partNum) -> list of intervals of the part
+        self.buckets = {} # length -> hash -> list of (scoreNum, partNum, noteNum)
         
-    if (print_):
+        if scores is None:
+            scores = []
+        elif not isinstance(scores, (list, tuple)):
+            scores = [scores]
+            
+        for score in scores:
+            self.addScore(score, cacheDir)
+        for length in lengths:
+            self.table(length)
+    
+    
+    def addScore(self, score, cacheDir = None):
+        """
+        # input: a score, ScoreIndex or score file path, and where to cache its features if it's a path
+        # output: the scoreNum given to the score
+        #    the score is hashed into every table built so far
+        """
+        if isinstance(score, str):
+            self.paths.append(score)
+            index = cachedScoreIndex(score, cacheDir)
+        else:
+            self.paths.append(None)
+            index = indexScore(score)
+        scoreNum = len(self.indexes)
+        self.indexes.append(index)
         
-        print('\nMATCHES:') # print all the intervals of every match
+        for partNum in range(0, len(index)):
+            self.intervals[(scoreNum, partNum)] = index.parts[partNum].chromatic.tolist()
+            for length in self.buckets:
+                self.hashPart(scoreNum, partNum, length)
+                
+        return scoreNum
+    
+    
+    def hashPart(self, scoreNum, partNum, length):
+        buckets = self.buckets[length]
+        for (start, value) in rollingHashes(self.intervals[(scoreNum, partNum)], length):
+            buckets.setdefault(value, []).append((scoreNum, partNum, start))
+    
+    
+    def table(self, length):
+        """
+        # input: a number of intervals
+        # output: the hash table of every window of that length, hashing the windows if it hasn't been done yet
+        """
+        if length not in self.buckets:
+            self.buckets[length] = {}
+            for (scoreNum, partNum) in sorted(self.intervals):
+                self.hashPart(scoreNum, partNum, length)
+        return self.buckets[length]
+    
+    
+    def find(self, pattern):
+        """
+        # input: a list of intervals
+        # output: sorted list of (scoreNum, partNum, noteNum) of everywhere pattern appears
+        """
+        if len(pattern) == 0:
+            return []
         
-        for num in range(0,len(matchList)):
-            print('Match #' + str(num))
-            for stuff in range(1, len(matchList[num].elements) - 1): # for all the note pairs
-                if matchList[num].elements[stuff].isNote and matchList[num].elements[stuff + 1].isNote:
-                    interval.notesToGeneric(matchList[num].elements[stuff], matchList[num].elements[stuff + 1])
-                    # convert notes to intervals
-            matchList[num].show('text')    
-            print('')
+        pattern = list(pattern)
+        candidates = self.table(len(pattern)).get(sequenceHash(pattern), [])
+        return sorted((scoreNum, partNum, noteNum) for (scoreNum, partNum, noteNum) in candidates
+                      if self.intervals[(scoreNum, partNum)][noteNum:noteNum + len(pattern)] == pattern)
+                          # same hash might still be different intervals
     
     
-    print(str(len(matchTupleList)) + ' match(es) found:')   
+    def search(self, notes, print_ = 0):
+        """
+        # input: notes - string of notes, as given to stringToNotes() or stringToNotesWithOctave(),
+        #        or a Stream of notes
+        #    print_ - If True, print every match in the terminal
+        # output: list of (scoreNum, partNum, noteStart, noteEnd) for every match, at any pitch level,
+        #    noteEnd being the note after the match
+        """
+        motif = compiledMotif('notes', notes) if isinstance(notes, str) else PartFeatures(notes)
+        pattern = motif.chromatic.tolist()
+        
+        matches = [(scoreNum, partNum, noteNum, noteNum + len(pattern) + 1) for (scoreNum, partNum, noteNum) in self.find(pattern)]
+        
+        if print_:
+            say(str(len(matches)) + ' match(es) found:')
+            for (scoreNum, partNum, noteStart, noteEnd) in matches:
+                measureNumbers = self.indexes[scoreNum].parts[partNum].measureNumbers
+                name = self.paths[scoreNum] if self.paths[scoreNum] is not None else 'Score %d' % scoreNum
+                say('\t%s: Part %d from measure %d to %d' % (name, partNum, measureNumbers[noteStart], measureNumbers[noteEnd - 1]))
+                
+        return matches
     
-    for matchTuple in matchTupleList: # print all the matches found
-        print('\tPart', str(matchTuple[1]) + ' from measure ' + str(matchTuple[0].notes[0].measureNumber), end = '')
-        print(' to ' + str(matchTuple[0].notes[-1].measureNumber))
     
-    if inverse:
-        print('\nINVERSE MATCHES:')
-        print(str(len(inverseMatchTupleList)) + ' match(es) found:')
-        for inverseMatchTuple in inverseMatchTupleList: # print all the inverse matches found
-            print('\tPart ' + str(inverseMatchTuple[1]) + ' from measure ' + str(inverseMatchTuple[0].notes[0].measureNumber), end = '')
-            print(' to ' + str(inverseMatchTuple[0].notes[-1].measureNumber))
+    def searchMany(self, motifs, print_ = 0):
+        """
+        # input: motifs - list of motifs, each as given to search()
+        #    print_ - If True, print the matches of every motif in the terminal
+        # output: list with the matches of every motif (see search()), in the same order
+        #    motifs of the same length share one table, so each length is only ever hashed once
+        """
+        motifMatches = []
+        for (motifNum, notes) in enumerate(motifs):
+            if print_:
+                say('Motif #%d:' % motifNum, end = ' ')
+            motifMatches.append(self.search(notes, print_))
+        return motifMatches
 
-    if show:
-        print('Coloring matches...')
-        score = colorScore(score, matchTupleList)
-        score = colorScore(score, inverseMatchTupleList, noteColor = '#0000FF')
-        print('Coloring finished')
-        score.show('musicxml') # show() the score in musicxml
 
-    return matchList
+def scorePaths(source):
+    """
+    # input: a directory of score files, a single score file, or a path in music21's corpus (e.g. 'bach/')
+    # output: sorted list of the file paths of all the scores
+    """
+    if os.path.isdir(source): # every score file under the directory
+        paths = []
+        for (directory, subdirectories, files) in os.walk(source):
+            paths.extend(os.path.join(directory, name) for name in files if name.lower().endswith(SCORE_EXTENSIONS))
+            
+    elif os.path.isfile(source):
+        paths = [source]
+        
+    else: # every corpus path that starts with source
+        paths = [str(path) for path in corpus.getPaths()
+                 if str(path).replace(os.sep, '/').split('/corpus/', 1)[-1].startswith(source)]
+        
+    return sorted(paths)
 
 
-def exactContourSearch(score, motifPart, motifStart, motifEnd, 
-                       contour = None, print_ = 0, approx = 0, context = 0, sort = 'part', show = 0, inverse = 0):
+class CorpusIndex(object):
     """
-    # Given a score, which part the motif occurs (motifPart), where it starts (motifStart) and ends (motifEnd) by notes,
-    #    returns a list of Part excerpts that contain a matching contour line to the theme
-    #
-    # contour is a string that will be used to match contour lines. motifPart, motifStart, and motifEnd will be ignored
-    #
-    # print_ is a boolean value that, if true, make the program print out additional information (what notes are in the matches)
-    #
-    # approx is not used (transferred over from genericIntervalSearch). 
-    #    TODO: make approx match excerpts based on looser criteria?
+    # Inverted index of the n-grams of every part of many scores, kept on disk
     #
-    # context is a boolean value that, if true, will grab surrounding measures for context when returning the matchList
-    #    justification: might want to use this function if you are using matchList to print out each matches separately?
+    # input: n - length of the n-grams, default 4
     #
-    # sort is a string of values either 'part' or 'measure'
-    #    the printed list will be sorted by either part or measure, respectively
-    #    TODO: sort the returned matchList as well
+    # two kinds of n-grams are indexed:
+    #    'interval' - intervals in semitones (as in exactIntervalSearch)
+    #    'pitch' - MIDI pitches (octave and enharmonic sensitive)
+    # each n-gram maps to the (scoreId, partNum, noteNum) of everywhere it appears
     #
-    # show is a boolean value that, if true, will export the score (using music21's show() function)
-    #    the exported score will have all the matches colored in red
-    #    if inverse is also True, the exported score will have all inverse matches colored in green
+    #    corpusIndex = buildCorpusIndex('bach/', 'bach.index')
+    #    ...
+    #    corpusIndex = CorpusIndex.load('bach.index')
+    #    corpusIndex.search('C D E- F')
     #
+    # searching only looks up the n-grams of the motif, no score is parsed or scanned
     """
-    
-    print('\nSearching by contour...')
-    
-    matchList = []
-    matchTupleList = []
-    inverseMatchList = []
-    inverseMatchTupleList = []
-    
-    motifContour = []
-    
-    
-    flatParts = []
-    for part in score.parts: # flatten each part of the score and put it in a list
-        flatParts.append(part.flat) 
-    
-    noteParts = []
-    for part in flatParts: # extract only notes and rests of the list of flat parts
-        noteParts.append(part.notesAndRests)
 
+    def __init__(self, n = 4):
+        self.n = n
+        self.paths = [] # scoreId -> file path of the score
+        self.measureNumbers = [] # scoreId -> partNum -> measure number of every note
+        self.grams = {'interval': {}, 'pitch': {}} # kind -> n-gram -> list of (scoreId, partNum, noteNum)
+        self.prefixes = {'interval': {}, 'pitch': {}} # kind -> prefix shorter than n -> list of the n-grams starting with it
 
-    if contour != None: # if there exists a custom contour
-        print('\tCustom motif used')
-        motif = contourToNotes(contour) # gives notes with the given contour from string
-         
-    else: # if no custom contour found (contour == None)
-        print('\tMotif taken from score')
-        motif = flatParts[motifPart].notes[motifStart:motifEnd] # get the notes pointed by motifPart, motifStart & End
-    
-    # append contour information into motifConour list
-    for num in range(0, len(motif) - 1): # for every interval/pairs of notes
-        if motif[num].ps < motif[num + 1].ps: # if first note is lower than the second
-            motifContour.append('up')
-            
-        elif motif[num].ps > motif[num + 1].ps: # if first note is higher than the second
-            motifContour.append('down')
-            
-        elif motif[num].ps == motif[num + 1].ps: # if the first note is the same as the second
-            motifContour.append('repeat')
-            
-        else: # should never happen
-            print('SOMERTHING HAS GONER RONG')
-            pass # the bacon, please
+
+    def addScore(self, path, score = None, cacheDir = None):
+        """
+        # input: the file path of a score, and the score itself (or a ScoreIndex) if it's already been parsed
+        #    if it hasn't, its features are taken from the cache in cacheDir (see cachedScoreIndex())
+        # output: the scoreId given to the score
+        """
+        index = indexScore(score) if score is not None else cachedScoreIndex(path, cacheDir)
+        scoreId = len(self.paths)
+        self.paths.append(path)
+        self.measureNumbers.append([part.measureNumbers.tolist() for part in index.parts])
+
+        for partNum in range(0, len(index)):
+            part = index.parts[partNum]
+            for (kind, sequence) in (('interval', part.chromatic.tolist()), ('pitch', part.midi.tolist())):
+                padded = sequence + [NO_INTERVAL] * (self.n - 1) # so the last few notes still start an n-gram
+                grams = self.grams[kind]
+                for noteNum in range(0, len(sequence)):
+                    gram = tuple(padded[noteNum:noteNum + self.n])
+                    if gram not in grams: # a new n-gram
+                        grams[gram] = []
+                        self.addPrefixes(kind, gram)
+                    grams[gram].append((scoreId, partNum, noteNum))
+
+        return scoreId
+
+
+    def addPrefixes(self, kind, gram):
+        """
+        # input: kind of n-gram and an n-gram new to the index
+        # files the n-gram under each of its prefixes shorter than n, so patterns that short are looked up directly
+        """
+        prefixes = self.prefixes[kind]
+        for length in range(1, self.n):
+            prefixes.setdefault(gram[:length], []).append(gram)
+
+
+    def lookup(self, kind, pattern):
+        """
+        # input: kind of n-gram ('interval' or 'pitch') and the sequence to look for
+        # output: sorted list of (scoreId, partNum, noteNum) of everywhere the whole pattern appears
+        """
+        grams = self.grams[kind]
         
+        if len(pattern) == 0:
+            return []
         
-    if print_: # verbose
-        print('Contour is defined as follows:')
-        for stuff in motifContour:
-            print(stuff)
-        print('')
-
-    matchQ = False #initializing match flag
-    currentlyMatching = 'none' 
-        
-    for partNum in range(0, len(noteParts)): # for every part in the score
-        for noteNum in range(0, len(noteParts[partNum]) - len(motif)): # for all notes in the part
-            for motifNum in range(0, len(motif) - 1): #for all the notes in the motif
-                #compare noteNumth note with the next one in the part
-                if not noteParts[partNum][noteNum + motifNum].isNote: # if first element isn't a note
-                    break
-                if not noteParts[partNum][noteNum + motifNum + 1].isNote: # if second element isn't a note
-                    break
-
-                
-                if currentlyMatching == 'none': # if we're not currentlyMatching anything 
-                    # this should only be run for the first note comparison
-                    if noteParts[partNum][noteNum + motifNum].ps < noteParts[partNum][noteNum + motifNum + 1].ps:
-                        # if the first pair of notes is going up
-                        if motifContour[motifNum] == 'up': # if it matches the respective query area
-                            currentlyMatching = 'regular' 
-                        elif inverse and motifContour[motifNum] == 'down': # if it is inverted to the query area
-                            currentlyMatching = 'inverse'
-                        else: #motifContour[motifNum] == 'repeat' 
-                            # might do some approximation to allow repeats to be equal 'up'
-                            break
-                        
-                            
-                    elif noteParts[partNum][noteNum + motifNum].ps > noteParts[partNum][noteNum + motifNum + 1].ps:
-                        # if the first pair of notes is going down
-                        if motifContour[motifNum] == 'down': # if it matches the respective query area
-                            currentlyMatching = 'regular'
-                        elif inverse and motifContour[motifNum] == 'up': # if it is inverted to the query area
-                            currentlyMatching = 'inverse'
-                        else: #motifContour[motifNum] == 'repeat'
-                            break
-                            
-                            
-                    elif noteParts[partNum][noteNum + motifNum].ps == noteParts[partNum][noteNum + motifNum + 1].ps:
-                        # if the first two notes are the same
-                        if motifContour[motifNum] != 'repeat': 
-                            break
-                        else: # motifContour[motifNum] == 'repeat'
-                            pass
-                        
-                    else:
-                        print('this realllly shouldn\'t happen') # this really shouldn't happen
-                        
-                        
-                    if motifNum == len(motif) - 2: # if comparing the last contour element
-                        # note: this is to catch the degenerative case where we're only matching for two notes
-                        matchQ = True   # match flag = True
-                            # this is because if the contours doesn't match, the forloop breaks
-                            # if it reaches here that means the forloop hasn't broken yet                                 
-                            
-                    # after this, we'll have currentlyMatching information
-                
-                
-                elif currentlyMatching == 'regular':
-                    if noteParts[partNum][noteNum + motifNum].ps < noteParts[partNum][noteNum + motifNum + 1].ps:
-                        # if first note is lower than second note (going up)
-                        if motifContour[motifNum] == 'up': 
-                            if motifNum == len(motif) - 2: # if comparing the last contour element
-                                matchQ = True
-    
-                        else: # if contour element isn't 'up'
-                            currentlyMatching = 'none' # reset currentlyMatching
-                            break
-                        
-                    elif noteParts[partNum][noteNum + motifNum].ps > noteParts[partNum][noteNum + motifNum + 1].ps:
-                            # if first note is higher than second note (going down)
-                        if motifContour[motifNum] == 'down':
-                            if motifNum == len(motif) - 2: # if comparing the last contour element
-                                matchQ = True 
-                        else: # if contour element isn't 'up'
-                            currentlyMatching = 'none' # reset currentlyMatching
-                            break
-                        
-                    elif noteParts[partNum][noteNum + motifNum].ps == noteParts[partNum][noteNum + motifNum + 1].ps:
-                        # if first note is the same as the second note (repeat)
-                        if motifContour[motifNum] == 'repeat':
-                            if motifNum == len(motif) - 2: # if comparing the last contour element
-                                matchQ = True
-                        else:
-                            currentlyMatching = 'none' # reset currentlyMatching
-                            break
-                        
-                elif currentlyMatching == 'inverse':
-                    if noteParts[partNum][noteNum + motifNum].ps < noteParts[partNum][noteNum + motifNum + 1].ps:
-                        # if first note is lower than second note (going up)
-                        if motifContour[motifNum] == 'down':
-                            if motifNum == len(motif) - 2:
-                                matchQ = True
-    
-                        else:
-                            currentlyMatching = 'none' # reset currentlyMatching
-                            break
-                        
-                    elif noteParts[partNum][noteNum + motifNum].ps > noteParts[partNum][noteNum + motifNum + 1].ps:
-                        # if first note is higher than second note (going down)
-                        if motifContour[motifNum] == 'up':
-                            if motifNum == len(motif) - 2:
-                                matchQ = True
-                        else:
-                            currentlyMatching = 'none' # reset currentlyMatching
-                            break
-                        
-                    elif noteParts[partNum][noteNum + motifNum].ps == noteParts[partNum][noteNum + motifNum + 1].ps:
-                        if motifContour[motifNum] == 'repeat':
-                            if motifNum == len(motif) - 2:
-                                matchQ = True
-                        else:
-                            currentlyMatching = 'none' # reset currentlyMatching
-                            break                    
-                
-                    
-            if matchQ:
-                
-                match = noteParts[partNum][noteNum: noteNum + len(motif)]
-                match.insert(0, flatParts[partNum].getClefs().elements[0])                
-                matchTuple = (match, partNum)
-                
-                if currentlyMatching == 'regular':
-                    matchList.append(match)
-                    matchTupleList.append(matchTuple)
-                
-                elif currentlyMatching == 'inverse': 
-                    inverseMatchList.append(match)
-                    inverseMatchTupleList.append(matchTuple)
-                
+        if len(pattern) < self.n: # shorter than an n-gram: every n-gram that starts with the pattern
+            positions = []
+            for gram in self.prefixes[kind].get(tuple(pattern), []):
+                positions.extend(grams[gram])
+            return sorted(positions)
+        
+        # n-grams at 0, n, 2n... and one at the very end cover every element of the pattern,
+        # so a place where they all line up is an exact match, nothing else needs checking
+        gramStarts = list(range(0, len(pattern) - self.n + 1, self.n))
+        if gramStarts[-1] != len(pattern) - self.n:
+            gramStarts.append(len(pattern) - self.n)
+        gramStarts.sort(key = lambda start: len(grams.get(tuple(pattern[start:start + self.n]), []))) # rarest first
+        
+        candidates = None
+        for start in gramStarts:
+            aligned = set((scoreId, partNum, noteNum - start)
+                          for (scoreId, partNum, noteNum) in grams.get(tuple(pattern[start:start + self.n]), []))
+            candidates = aligned if candidates is None else candidates & aligned
+            if not candidates: # nothing left to line up
+                break
                 
-                matchQ = False
-                currentlyMatching = 'none'
+        return sorted(candidates)
 
-                
-    if (print_):
-        print('\nMATCHES:')
-        for num in range(0,len(matchList)):
-            print('Match #' + str(num))
-            print(matchList[num])
-            matchList[num].show('text')    
-            print('')
-    
-    
-    
-    print(str(len(matchTupleList)) + ' match(es) found:')
-    
-    if sort == 'part':
-        pass
+
+    def search(self, notes, kind = 'interval', print_ = 0):
+        """
+        # input: notes - string of notes, as given to stringToNotes() or stringToNotesWithOctave()
+        #        for kind = 'pitch' the notes should have octaves
+        #    kind - 'interval' or 'pitch'
+        #    print_ - If True, print every match in the terminal
+        # output: list of (path, partNum, noteStart, noteEnd) for every match, noteEnd being the note after the match
+        """
+        motif = compiledMotif('notes', notes)
             
-    elif sort == 'measure':
-        print('Sorting by measures: ')
-        matchList = sortByMeasure(matchList)
-        matchTupleList = sortTupleByMeasure(matchTupleList)
-    
-    for matchTuple in matchTupleList:
-        print('\tPart %d from measure %d to %d' % (matchTuple[1], matchTuple[0].notes[0].measureNumber, matchTuple[0].notes[-1].measureNumber))
+        if kind == 'interval':
+            pattern = motif.chromatic.tolist()
+            length = len(pattern) + 1 # number of notes in a match
+        else: # kind == 'pitch'
+            pattern = motif.midi.tolist()
+            length = len(pattern)
+
+        positions = self.lookup(kind, pattern)
+        matches = [(self.paths[scoreId], partNum, noteNum, noteNum + length) for (scoreId, partNum, noteNum) in positions]
+
+        if print_:
+            say(str(len(matches)) + ' match(es) found:')
+            for (scoreId, partNum, noteNum) in positions:
+                measureNumbers = self.measureNumbers[scoreId][partNum]
+                say('\t%s: Part %d from measure %d to %d' % (self.paths[scoreId], partNum,
+                                                              measureNumbers[noteNum], measureNumbers[noteNum + length - 1]))
 
+        return matches
+
+
+    def save(self, indexPath):
+        with open(indexPath, 'wb') as indexFile: # plain containers only, so it loads without this class being pickled
+            pickle.dump({'n': self.n, 'paths': self.paths, 'measureNumbers': self.measureNumbers, 'grams': self.grams},
+                        indexFile, pickle.HIGHEST_PROTOCOL)
+
+
+    @staticmethod
+    def load(indexPath):
+        with open(indexPath, 'rb') as indexFile:
+            contents = pickle.load(indexFile)
+            
+        corpusIndex = CorpusIndex(contents['n'])
+        corpusIndex.paths = contents['paths']
+        corpusIndex.measureNumbers = contents['measureNumbers']
+        corpusIndex.grams = contents['grams']
+        for (kind, grams) in corpusIndex.grams.items(): # the prefixes are only a few per n-gram, quicker to redo than to store
+            for gram in grams:
+                corpusIndex.addPrefixes(kind, gram)
+        return corpusIndex
+
+
+def buildCorpusIndex(source, indexPath, n = 4, print_ = 0, cacheDir = None):
+    """
+    # input: source - directory of score files, a score file or a path in music21's corpus (see scorePaths())
+    #    indexPath - file to write the CorpusIndex to
+    #    n - length of the n-grams, default 4
+    #    print_ - If True, print every score as it gets indexed
+    #    cacheDir - where to cache the features of the scores, default CACHE_DIRECTORY (see cachedScoreIndex())
+    # output: the CorpusIndex, also saved to indexPath
+    """
+    corpusIndex = CorpusIndex(n)
     
-    if inverse:
-        print(str(len(matchTupleList)) + ' inverse match(es) found:')  
-        for inverseMatchTuple in inverseMatchTupleList:
-            print('\tPart %d from measure %d to %d' % (inverseMatchTuple[1], inverseMatchTuple[0].notes[0].measureNumber, inverseMatchTuple[0].notes[-1].measureNumber))      
+    for path in scorePaths(source):
+        if print_:
+            say('Indexing ' + path)
+        corpusIndex.addScore(path, cacheDir = cacheDir)
+        
+    corpusIndex.save(indexPath)
     
-    if show:
-        score = colorScore(score, matchTupleList)
-        score = colorScore(score, inverseMatchTupleList, noteColor = '#00FF00')
-        score.show('musicxml')
+    return corpusIndex
+
+
+def corpusSearch(corpusIndex, notes, kind = 'interval', print_ = 1):
+    """
+    # input: corpusIndex - a CorpusIndex, or the file it was saved to by buildCorpusIndex()
+    #    notes - string of notes to search for (see CorpusIndex.search())
+    #    kind - 'interval' to match intervals in semitones, 'pitch' to match MIDI pitches
+    #    print_ - If True, print every match in the terminal
+    #        Default value is True
+    # output: list of (path, partNum, noteStart, noteEnd) for every match across the corpus
+    """
+    say('\nSearching the corpus by %s...' % kind)
+    
+    if not isinstance(corpusIndex, CorpusIndex):
+        corpusIndex = CorpusIndex.load(corpusIndex)
         
+    return corpusIndex.search(notes, kind, print_)
+
+
+def searchScoreFile(path, searchFn, kwargs, cacheDir = None):
+    """
+    # input: the file path of a score, a search function (or its name), and the keyword arguments for it
+    #    the features of the score come from the cache in cacheDir (see cachedScoreIndex())
+    # output: list of MatchRecords of every match
+    #
+    # this is what every worker of searchCorpus() runs: with the cache and MatchRecords,
+    #    a score that's been seen before isn't even parsed, and only plain tuples go back to the parent process
+    """
+    if not callable(searchFn):
+        searchFn = globals()[searchFn]
+
+    index = cachedScoreIndex(path, cacheDir)
     
-    return matchList
+    level = quietLevel
+    setQuiet(logging.DEBUG) # the search functions say a lot, and workers would print on top of each other
+    try:
+        return searchFn(index, records = 1, **kwargs)
+    finally:
+        setQuiet(level)
+
+
+def searchCorpus(paths, searchFn, maxWorkers = None, cacheDir = None, **kwargs):
+    """
+    # input:
+    #    paths - list of score file paths, or a source given to scorePaths() (e.g. 'bach/')
+    #
+    #    searchFn - any of the search functions returning a matchList (e.g. exactIntervalSearch), or its name
+    #
+    #    maxWorkers - number of processes to use, default is one per CPU
+    #
+    #    cacheDir - where to cache the features of the scores, default CACHE_DIRECTORY (see cachedScoreIndex())
+    #
+    #    kwargs - everything else is passed on to searchFn, e.g.
+    #        searchCorpus('bach/', genericIntervalSearch, motifPart = 0, motifStart = 0, motifEnd = 0,
+    #                     notes = 'C D E F', inverse = 1)
+    #
+    # output: list of MatchRecords (scoreId being the path) for every match in every score,
+    #    in the order of paths, then by part, then by note
+    #
+    # every score is parsed and searched in its own process
+    """
+    if not isinstance(paths, (list, tuple)):
+        paths = scorePaths(paths)
+
+    say('\nSearching %d scores with %s...' % (len(paths), searchFn if not callable(searchFn) else searchFn.__name__))
+
+    matches = []
+    executor = ProcessPoolExecutor(max_workers = maxWorkers)
+    try:
+        for scoreMatches in executor.map(searchScoreFile, paths, [searchFn] * len(paths), [kwargs] * len(paths),
+                                        [cacheDir] * len(paths)):
+            # map() gives the results back in the order of paths, however the workers finish
+            matches.extend(sorted(scoreMatches, key = lambda match: (match.partNum, match.noteStart)))
+    finally:
+        executor.shutdown()
+
+    say(str(len(matches)) + ' match(es) found:')
+    for match in matches:
+        say('\t%s: Part %d from measure %d to %d' % (match.scoreId, match.partNum, match.measureStart, match.measureEnd))
+
+    return matches
+
+
+SEARCH_TYPES = {'note': 'iterExactNoteSearch', 'pitch': 'iterExactPitchSearch', 'rhythm': 'iterExactRhythmSearch',
+                'interval': 'iterExactIntervalSearch', 'generic': 'iterGenericIntervalSearch',
+                'contour': 'iterExactContourSearch', 'rhythmContour': 'iterRhythmContourSearch',
+                'approximate': 'iterApproximateSearch'} # search type of the command line -> function it runs
+
+MOTIF_PATTERNS = {'notes': re.compile(r'^[A-Ga-g][#-]?[0-9]*$'), # one note of a notes string (see stringToNotesWithOctave())
+                  'rhythm': re.compile(r'^[A-Ga-g][#-]?[0-9]+\.*$')} # one note of a rhythm string (see stringToNotesRhythm())
+CONTOUR_PATTERN = re.compile(r'^\*[uUdDrR]+$') # a whole Parson's code string (see contourToNotes())
+
+
+def queryParser(prog = None):
+    """
+    # output: argparse parser of the options of one query, on the command line or on a line of a queries file
+    """
+    parser = argparse.ArgumentParser(prog = prog, add_help = prog is None)
+    parser.add_argument('-t', '--type', choices = sorted(SEARCH_TYPES), default = 'interval',
+                        help = 'what to match (default: %(default)s)')
+    parser.add_argument('-n', '--notes', help = "motif as note names, e.g. 'C D E- F' or 'C4 D4 E-4 F4'")
+    parser.add_argument('-r', '--rhythm', help = "motif as rhythms, e.g. 'C4 D4 E8 F8'")
+    parser.add_argument('-c', '--contour', help = "motif as Parson's code, e.g. '*uud'")
+    parser.add_argument('--name', help = 'name of the query in the results (default: its motif)')
+    parser.add_argument('--inverse', action = 'store_true', help = 'find the inverse too (interval, generic, contour)')
+    parser.add_argument('--retrograde', action = 'store_true', help = 'find the retrograde too (interval, generic, contour)')
+    parser.add_argument('--approx', action = 'store_true',
+                        help = 'approximate intervals (generic), or relative rhythm (rhythmContour)')
+    parser.add_argument('--any-scale', action = 'store_true', help = 'match augmentations and diminutions too (rhythm)')
+    parser.add_argument('--max-edits', type = int, default = 1, help = 'edits allowed (approximate, default: %(default)s)')
+    parser.add_argument('--edit-kind', choices = ('pitch', 'interval', 'generic'), default = 'pitch',
+                        help = 'what the edits are counted on (approximate, default: %(default)s)')
+    parser.add_argument('--limit', type = int, help = 'matches to find per score at most')
+    return parser
+
+
+def parseQuery(options):
+    """
+    # input: the parsed options of one query (see queryParser())
+    # output: the query as a dictionary {'name': ..., 'type': ..., 'arguments': keyword arguments of its search function}
+    #    raises ValueError if the motif is missing or can't be read
+    """
+    searchType = options.type
+    if searchType == 'rhythmContour':
+        needed = ('contour', 'rhythm')
+    elif searchType == 'contour':
+        needed = ('contour',)
+    elif searchType == 'rhythm':
+        needed = ('rhythm',)
+    else:
+        needed = ('notes',)
+    for name in needed:
+        if getattr(options, name) is None:
+            raise ValueError('a %s search needs --%s' % (searchType, name))
+    for name in ('notes', 'rhythm', 'contour'):
+        if name not in needed and getattr(options, name) is not None:
+            raise ValueError('a %s search takes no --%s' % (searchType, name))
+
+    if options.max_edits < 0:
+        raise ValueError('max edits must be 0 or more, not %d' % options.max_edits)
+    if options.limit is not None and options.limit < 0:
+        raise ValueError('limit must be 0 or more, not %d' % options.limit)
+
+    # the string parsers skip what they can't read, so a typo would silently search for another motif
+    for name in ('notes', 'rhythm'):
+        if name in needed:
+            tokens = getattr(options, name).split()
+            wrong = [token for token in tokens if not MOTIF_PATTERNS[name].match(token)]
+            if wrong or len(tokens) < 2:
+                raise ValueError('can\'t read --%s %r%s' % (name, getattr(options, name),
+                                 ' (%s)' % ', '.join(wrong) if wrong else ', it needs at least 2 notes'))
+    if 'contour' in needed and not CONTOUR_PATTERN.match(options.contour):
+        raise ValueError('can\'t read --contour %r, it should be * followed by u, d and r' % options.contour)
+
+    arguments = dict((name, getattr(options, name)) for name in needed)
+    if searchType in ('interval', 'generic', 'contour'):
+        arguments.update(inverse = options.inverse, retrograde = options.retrograde)
+    if searchType in ('generic', 'rhythmContour'):
+        arguments['approx'] = options.approx
+    if searchType == 'rhythm':
+        arguments['scale'] = None if options.any_scale else 1
+    if searchType == 'approximate':
+        arguments.update(maxEdits = options.max_edits, kind = options.edit_kind)
+    arguments['limit'] = options.limit
+
+    try: # the parsers raise on some motifs (e.g. a duration that doesn't exist), and every search then finds it compiled
+        if searchType == 'rhythmContour':
+            compiledMotif('rhythmContour', options.contour, options.rhythm)
+        elif searchType in ('rhythm', 'contour'):
+            compiledMotif(searchType, getattr(options, searchType))
+        else:
+            compiledMotif('notes', options.notes)
+    except Exception as error:
+        raise ValueError('can\'t read the motif: %s' % error)
+
+    name = options.name or ' / '.join(getattr(options, name) for name in needed)
+    return {'name': name, 'type': searchType, 'arguments': arguments}
+
+
+def readQueries(path):
+    """
+    # input: a queries file ('-' for stdin), one query per line with the options of queryParser(), e.g.
+    #    --type generic --notes 'C D E F' --inverse
+    #    --type contour --contour '*uud' --name rising
+    #    blank lines and lines starting with # are skipped
+    # output: list of the queries (see parseQuery()), raises ValueError naming the line of a wrong one
+    """
+    queryFile = sys.stdin if path == '-' else open(path)
+    queries = []
+    try:
+        for (lineNum, line) in enumerate(queryFile, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            where = '%s line %d' % (path, lineNum)
+            try:
+                queries.append(parseQuery(queryParser(where).parse_args(shlex.split(line))))
+            except ValueError as error:
+                raise ValueError('%s: %s' % (where, error))
+    finally:
+        if queryFile is not sys.stdin:
+            queryFile.close()
+    return queries
 
 
-def rhythmContourSearch(score, motifPart, motifStart, motifEnd, contour = None, print_ = 0, approx = 0, context = 0, sort = 'part'):
+def searchQueryFile(path, queries, cacheDir = None):
     """
-    # Unimplemented
+    # input: the file path of a score, the queries to run on it (see parseQuery()), and the cache directory
+    #    (see cachedScoreIndex())
+    # output: (path, a list of MatchRecords for every query, None), or (path, None, what went wrong) if the score
+    #    couldn't be read or searched
     #
-    # This search would search for contours over relative rhythm
-    #     Not all the notes will be used, just an approximation
+    # this is what every worker of searchQueries() runs: the score is read once for all the queries
+    """
+    level = quietLevel
+    setQuiet(logging.DEBUG) # workers would print on top of the results
+    try:
+        index = cachedScoreIndex(path, cacheDir)
+        return (path, [list(globals()[SEARCH_TYPES[query['type']]](index, **query['arguments'])) for query in queries], None)
+    except Exception as error:
+        return (path, None, '%s: %s' % (error.__class__.__name__, error))
+    finally:
+        setQuiet(level)
+
+
+def searchQueries(paths, queries, jobs = 1, cacheDir = None):
+    """
+    # input: score file paths, queries (see parseQuery()), how many processes to use (None for one per CPU),
+    #    and the cache directory (see cachedScoreIndex())
+    # generates (path, matches of every query, error) for every path, in order, as soon as it's done (see searchQueryFile())
+    """
+    if jobs == 1 or len(paths) <= 1: # not worth starting any processes
+        for path in paths:
+            yield searchQueryFile(path, queries, cacheDir)
+        return
+
+    executor = ProcessPoolExecutor(max_workers = jobs)
+    try:
+        for result in executor.map(searchQueryFile, paths, [queries] * len(paths), [cacheDir] * len(paths)):
+            yield result
+    finally:
+        executor.shutdown()
+
+
+def sourcePaths(sources):
+    """
+    # input: list of score files, directories, globs (e.g. 'scores/*.xml', or 'bach/bwv1*' in the corpus) or corpus paths
+    #    (e.g. 'bach/')
+    # output: sorted list of the score file paths of all of them, raises ValueError if one gives no score at all
+    """
+    paths = set()
+    for source in sources:
+        if glob.has_magic(source):
+            found = [path for match in glob.glob(source) for path in scorePaths(match)]
+            if not found: # a glob in the corpus
+                found = [str(path) for path in corpus.getPaths()
+                         if fnmatch.fnmatch(str(path).replace(os.sep, '/').split('/corpus/', 1)[-1], source)]
+        else:
+            found = scorePaths(source)
+        if not found:
+            raise ValueError('no score found for %s' % source)
+        paths.update(found)
+    return sorted(paths)
+
+
+def main(arguments = None):
+    """
+    # command line:
+    #    python -m musicSearch search --type generic --notes 'C D E F' --inverse scores/ 'more/*.mxl' bach/
+    #    python -m musicSearch search --queries queries.txt --jobs 4 --format jsonl --output matches.jsonl bach/
+    #    python -m musicSearch serve --port 8765 bach/ (see SearchServer)
     #
+    # output: exit status, 0 if every score was searched, 1 if some couldn't be read or searched,
+    #    2 if the command line or a query is wrong (nothing is searched then)
     """
-    matchList = []
-    
-    return matchList
+    parser = argparse.ArgumentParser(prog = 'python -m musicSearch', description = 'Search scores for motifs.')
+    commands = parser.add_subparsers(dest = 'command')
+    searchCommand = commands.add_parser('search', parents = [queryParser('search')],
+                                        help = 'search score files for a motif, or for every query of a file')
+    searchCommand.add_argument('sources', nargs = '+', metavar = 'source',
+                               help = 'score file, directory, glob or corpus path (e.g. bach/)')
+    searchCommand.add_argument('-q', '--queries', help = "file of queries, one per line ('-' for stdin), instead of the motif options")
+    searchCommand.add_argument('-j', '--jobs', type = int, default = 1,
+                               help = 'processes to search with, 0 for one per CPU (default: %(default)s)')
+    searchCommand.add_argument('-f', '--format', choices = ('text', 'jsonl', 'csv'), default = 'text',
+                               help = 'how to write the matches (default: %(default)s)')
+    searchCommand.add_argument('-o', '--output', default = '-', help = "file to write the matches to (default: stdout)")
+    searchCommand.add_argument('--cache-dir', help = 'where to cache the features of the scores (default: %s)' % CACHE_DIRECTORY)
+    searchCommand.add_argument('-v', '--verbose', action = 'store_true', help = 'log what the searches say to stderr')
 
+    serveCommand = commands.add_parser('serve', help = 'keep the scores in memory and answer searches over HTTP/JSON')
+    serveCommand.add_argument('sources', nargs = '+', metavar = 'source',
+                              help = 'score file, directory, glob or corpus path (e.g. bach/)')
+    serveCommand.add_argument('--host', default = '127.0.0.1', help = 'address to listen on (default: %(default)s)')
+    serveCommand.add_argument('-p', '--port', type = int, default = 8765, help = 'port to listen on (default: %(default)s)')
+    serveCommand.add_argument('--unix', help = 'listen on this Unix socket instead of host and port')
+    serveCommand.add_argument('-j', '--jobs', type = int, default = 0,
+                              help = 'processes to read the scores with, 0 for one per CPU (default: %(default)s)')
+    serveCommand.add_argument('--threads', type = int, default = 4,
+                              help = 'searches answered at the same time (default: %(default)s)')
+    serveCommand.add_argument('--cache-dir', help = 'where to cache the features of the scores (default: %s)' % CACHE_DIRECTORY)
+    serveCommand.add_argument('-v', '--verbose', action = 'store_true', help = 'log every request to stderr')
+    options = parser.parse_args(arguments)
 
-def colorScore(score, matchTupleList, noteColor = '#FF0000'):
+    if options.command == 'search':
+        return searchMain(options, searchCommand)
+    if options.command == 'serve':
+        return serveMain(options, serveCommand)
+    parser.error('a command is needed (search or serve)')
+
+
+def searchMain(options, searchCommand):
+    # the search command of main()
+    try:
+        queries = readQueries(options.queries) if options.queries else [parseQuery(options)]
+        if not queries:
+            raise ValueError('no query in %s' % options.queries)
+        paths = sourcePaths(options.sources)
+        if options.jobs < 0:
+            raise ValueError('--jobs must be 0 (one per CPU) or more, not %d' % options.jobs)
+        output = sys.stdout if options.output == '-' else open(options.output, 'w', buffering = 1, newline = '')
+    except (ValueError, IOError) as error:
+        searchCommand.error(str(error))
+
+    if options.verbose:
+        logging.basicConfig(level = logging.INFO, format = '%(message)s')
+    setQuiet(logging.INFO) # only the matches go to the output
+
+    exporter = MatchExporter(output, options.format, ('query',)) if options.format != 'text' else None
+    failures = 0
+    try:
+        for (path, results, error) in searchQueries(paths, queries, options.jobs or None, options.cache_dir):
+            if error is not None:
+                failures = failures + 1
+                sys.stderr.write('%s: %s\n' % (path, error))
+                continue
+            for (query, records) in zip(queries, results):
+                for record in records:
+                    if exporter is not None:
+                        exporter.write(record, query['name'])
+                    else:
+                        output.write('%s\t%s\tPart %d from measure %d to %d\t%s\n' % (query['name'], path, record.partNum,
+                                     record.measureStart, record.measureEnd, record.kind))
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if failures:
+        sys.stderr.write('%d of %d score(s) couldn\'t be searched\n' % (failures, len(paths)))
+        return 1
+    return 0
+
+
+JSON_OPTIONS = {'type': 'type', 'notes': 'notes', 'rhythm': 'rhythm', 'contour': 'contour', 'name': 'name',
+                'inverse': 'inverse', 'retrograde': 'retrograde', 'approx': 'approx', 'anyScale': 'any_scale',
+                'maxEdits': 'max_edits', 'editKind': 'edit_kind', 'limit': 'limit'} # query field of SearchServer -> queryParser() option
+
+
+def queryFromJson(fields):
     """
-    # Given a score and a matchTupleList (Stream, int)
-    #    for all the matchTuples: color its respective part in the score
+    # input: a query as a dictionary of JSON_OPTIONS fields, e.g. {"type": "generic", "notes": "C D E F", "inverse": true}
+    # output: the query (see parseQuery()), raises ValueError if it's wrong
+    """
+    if not isinstance(fields, dict):
+        raise ValueError('a query must be a JSON object')
+    options = queryParser('query').parse_args([]) # every option at its default
+    for (field, value) in fields.items():
+        if field not in JSON_OPTIONS:
+            raise ValueError('unknown query field %r (known: %s)' % (field, ', '.join(sorted(JSON_OPTIONS))))
+        if field in ('type', 'notes', 'rhythm', 'contour', 'name', 'editKind') and not isinstance(value, str):
+            raise ValueError('%s must be a string' % field)
+        if field in ('inverse', 'retrograde', 'approx', 'anyScale') and not isinstance(value, bool):
+            raise ValueError('%s must be true or false' % field)
+        if ((field == 'maxEdits' or (field == 'limit' and value is not None))
+                and (not isinstance(value, int) or isinstance(value, bool))):
+            raise ValueError('%s must be an integer' % field)
+        setattr(options, JSON_OPTIONS[field], value)
+    if options.type not in SEARCH_TYPES:
+        raise ValueError('unknown type %r (known: %s)' % (options.type, ', '.join(sorted(SEARCH_TYPES))))
+    if options.edit_kind not in ('pitch', 'interval', 'generic'):
+        raise ValueError('unknown editKind %r (known: pitch, interval, generic)' % options.edit_kind)
+    return parseQuery(options)
+
+
+def featureIndex(path, cacheDir = None):
+    """
+    # input: the file path of a score, and the cache directory (see cachedScoreIndex())
+    # output: its ScoreIndex with only parts, clefs and path, small enough to send back from a worker process
+    """
+    index = cachedScoreIndex(path, cacheDir)
+    index._score = index._flatParts = index._noteParts = None # parsed again from path if anyone needs them
+    return index
+
+
+class SearchServer(object):
+    """
+    # Keeps the ScoreIndexes of a set of scores in memory and answers searches on them over HTTP/JSON,
+    #    so a client pays for neither starting Python, importing music21 nor parsing any score
     #
-    # noteColor defines the color, red by default
+    #    python -m musicSearch serve --port 8765 bach/
+    #
+    # every score is read once when the server starts, in worker processes (see featureIndex()),
+    #    while it already answers /health; the searches run in a pool of threads, so the event loop only ever
+    #    reads requests and writes answers
+    #
+    # GET /health - {"status": "ok"} once every score is read ("loading" before, with status 503), how many were
+    #    read and the ones that couldn't be
+    # GET /metrics - requests, errors, searches per type, matches, latency percentiles of the last searches, ...
+    # POST /search - one query, e.g. {"type": "generic", "notes": "C D E F", "inverse": true} (see JSON_OPTIONS)
+    #    answers {"query": name, "matches": [MatchRecord fields of every match], "seconds": ...}
+    # POST /batch - {"queries": [query, ...]}, all of them searched at the same time
+    #    answers {"results": [answer of /search, or {"error": ...}, for every query], "seconds": ...}
+    #
+    # input:
+    #    paths - file paths of the scores
+    #    cacheDir - where to cache the features of the scores (see cachedScoreIndex())
+    #    jobs - processes to read the scores with, None for one per CPU
+    #    threads - searches answered at the same time
     """
-    
-    flatParts = []
-    matchPlace = -1
-    offsetMapList = []
-    
-    for part in score.parts: # for every part in the score
-        flatParts.append(part.flat) # flatten part in the score
-        offsetMapList.append(part.flat.notesAndRests.offsetMap) # extract notes and rests from the flattened part
-    
-    for match in matchTupleList: # for every match in matchTupleList
-        targetOffset = match[0].flat.notesAndRests[0].offset 
-            # define targetOffset as the offset (distance from the front) of the first element in match
-        partNum = match[1]
-        
-        for checkNoteNum in range(0, len(score.parts[partNum].flat.notesAndRests)): # for every note in the respective Part of the score
+    LATENCIES = 1000 # searches kept for the latency percentiles of /metrics
+    MAX_BODY = 1 << 20 # largest request body read, in bytes, anything bigger gets 413
 
-            if offsetMapList[partNum][checkNoteNum]['offset'] == targetOffset: # if the offset of the note from match is the same from score
-                matchPlace = checkNoteNum # we've found the first note to be colored
-                break
-            
+    def __init__(self, paths, cacheDir = None, jobs = None, threads = 4):
+        self.paths = paths
+        self.cacheDir = cacheDir
+        self.jobs = jobs
+        self.indexes = []
+        self.failed = {} # path -> why it couldn't be read
+        self.loaded = False
+        self.searchPool = ThreadPoolExecutor(max_workers = threads)
+        self.started = time.time()
+        self.requests = {} # 'METHOD /path' -> requests
+        self.errors = 0 # answers with a status of 400 or more
+        self.searches = {} # search type -> searches
+        self.matches = 0
+        self.inFlight = 0 # searches going on right now
+        self.latencies = deque(maxlen = SearchServer.LATENCIES)
 
-        
-        if matchPlace != -1: # if we found a note at the given offset
-            
-            for num in range(0, len(match[0].notesAndRests)):
-                score.parts[partNum].flat.notesAndRests[checkNoteNum + num].color = noteColor
-                
-            matchPlace = -1
-                
-        else: # if we didn't find any note at the given offset
-            print('Cannot color score as %s cannot be found' % match[0])
-            
-    
-    return score
+
+    async def load(self):
+        # reads every score, the slow part, in worker processes
+        loop = asyncio.get_event_loop()
+        with ProcessPoolExecutor(max_workers = self.jobs) as loadPool:
+            futures = [loop.run_in_executor(loadPool, featureIndex, path, self.cacheDir) for path in self.paths]
+            for (path, future) in zip(self.paths, futures):
+                try:
+                    self.indexes.append(await future)
+                except Exception as error:
+                    self.failed[path] = '%s: %s' % (error.__class__.__name__, error)
+                    logger.warning('%s: %s', path, self.failed[path])
+        self.loaded = True
+        logger.info('%d score(s) read, %d failed, in %.1fs', len(self.indexes), len(self.failed), time.time() - self.started)
+
+
+    def runQuery(self, query):
+        # every match of query in every score, runs in the thread pool
+        searchFn = globals()[SEARCH_TYPES[query['type']]]
+        return [record._asdict() for index in self.indexes for record in searchFn(index, **query['arguments'])]
+
+
+    async def search(self, fields):
+        # answer of one query, as /search gives it
+        query = queryFromJson(fields)
+        start = time.perf_counter()
+        self.inFlight = self.inFlight + 1
+        try:
+            matches = await asyncio.get_event_loop().run_in_executor(self.searchPool, self.runQuery, query)
+        finally:
+            self.inFlight = self.inFlight - 1
+        seconds = time.perf_counter() - start
+        self.latencies.append(seconds)
+        self.searches[query['type']] = self.searches.get(query['type'], 0) + 1
+        self.matches = self.matches + len(matches)
+        return {'query': query['name'], 'matches': matches, 'seconds': seconds}
+
+
+    async def batch(self, queries):
+        # answers of a batch of queries, all searched at the same time
+        async def answer(fields):
+            try:
+                return await self.search(fields)
+            except ValueError as error:
+                return {'error': str(error)}
+        return await asyncio.gather(*[answer(fields) for fields in queries])
+
+
+    def metrics(self):
+        latencies = numpy.array(self.latencies) * 1000
+        percentiles = dict(('p%d' % p, float(numpy.percentile(latencies, p)) if len(latencies) else None) for p in (50, 90, 99))
+        return {'uptime': time.time() - self.started, 'scores': len(self.indexes), 'failed': len(self.failed),
+                'requests': self.requests, 'errors': self.errors, 'searches': self.searches, 'matches': self.matches,
+                'inFlight': self.inFlight, 'latencyMilliseconds': percentiles, 'motifCache': motifCache.info()}
+
+
+    async def respond(self, method, path, body):
+        """
+        # input: the method, path and body of a request
+        # output: (status, JSON-able answer)
+        """
+        if path == '/health':
+            if method != 'GET':
+                return (405, {'error': 'use GET'})
+            return (200 if self.loaded else 503, {'status': 'ok' if self.loaded else 'loading', 'scores': len(self.indexes),
+                                                  'failed': self.failed})
+        if path == '/metrics':
+            if method != 'GET':
+                return (405, {'error': 'use GET'})
+            return (200, self.metrics())
+        if path not in ('/search', '/batch'):
+            return (404, {'error': 'no such path, use /search, /batch, /health or /metrics'})
+        if method != 'POST':
+            return (405, {'error': 'use POST'})
+        if not self.loaded:
+            return (503, {'error': 'still reading the scores, see /health'})
+
+        try:
+            fields = json.loads(body.decode('utf-8') or '{}')
+            if path == '/search':
+                return (200, await self.search(fields))
+            if not isinstance(fields, dict) or not isinstance(fields.get('queries'), list):
+                raise ValueError('a batch must be {"queries": [query, ...]}')
+            start = time.perf_counter()
+            results = await self.batch(fields['queries'])
+            return (200, {'results': results, 'seconds': time.perf_counter() - start})
+        except ValueError as error: # json errors are ValueErrors too
+            return (400, {'error': str(error)})
+
+
+    async def handle(self, reader, writer):
+        # answers the requests of one connection, keeping it open as HTTP/1.1 does
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    (name, colon, value) = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                status = None
+                try:
+                    (method, target, version) = requestLine.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError('negative Content-Length')
+                except ValueError:
+                    (method, target, version) = ('', '', 'HTTP/1.0')
+                    (status, answer) = (400, {'error': 'bad request'})
+                else:
+                    target = target.split('?', 1)[0]
+                    
+                if status is None and length > SearchServer.MAX_BODY: # never read, the connection is closed after answering
+                    (status, answer) = (413, {'error': 'request body over %d bytes' % SearchServer.MAX_BODY})
+                elif status is None:
+                    body = await reader.readexactly(length)
+                    key = '%s %s' % (method, target)
+                    self.requests[key] = self.requests.get(key, 0) + 1
+                    try:
+                        (status, answer) = await self.respond(method, target, body)
+                    except Exception as error: # a bug, but the server goes on
+                        logger.exception('%s %s', method, target)
+                        (status, answer) = (500, {'error': '%s: %s' % (error.__class__.__name__, error)})
+
+                if status >= 400:
+                    self.errors = self.errors + 1
+                logger.info('%s %s %d', method, target, status)
+                keepAlive = (headers.get('connection', '').lower() != 'close' if version == 'HTTP/1.1'
+                             else headers.get('connection', '').lower() == 'keep-alive') and status not in (400, 413)
+                data = json.dumps(answer).encode('utf-8')
+                writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n'
+                              % (status, http.HTTPStatus(status).phrase, len(data), 'keep-alive' if keepAlive else 'close')
+                              ).encode('latin-1') + data)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass # the client went away
+        finally:
+            writer.close()
+
+
+    async def serve(self, host = '127.0.0.1', port = 8765, unixPath = None):
+        # listens (on a Unix socket if unixPath is given), reads the scores, and answers requests until cancelled
+        if unixPath is not None:
+            server = await asyncio.start_unix_server(self.handle, unixPath)
+            logger.info('listening on %s', unixPath)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            logger.info('listening on %s:%d', host, port)
+        async with server:
+            await self.load()
+            await server.serve_forever()
+
+
+def serveMain(options, serveCommand):
+    # the serve command of main()
+    try:
+        paths = sourcePaths(options.sources)
+    except ValueError as error:
+        serveCommand.error(str(error))
+
+    logging.basicConfig(level = logging.INFO if options.verbose else logging.WARNING, format = '%(asctime)s %(message)s')
+    setQuiet(logging.DEBUG)
+    server = SearchServer(paths, options.cache_dir, options.jobs or None, options.threads)
+    try:
+        asyncio.run(server.serve(options.host, options.port, options.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
 
 
 def demo():
@@ -1356,4 +4192,7 @@ def demo():
 # Uncomment for an example
 # sBach6 = corpus.parse('bach/artOfFugue_bwv1080/06.zip')
 # test = genericIntervalSearch(sBach6, 4, 0, 10, show = 1, approx = 1, inverse = 1, sort = 'part')
-    
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,528 @@
+"""
+# Tests of musicSearch, run with: python -m pytest -q
+#
+# the searches are checked against brute force over the same PartFeatures arrays
+"""
+import os.path
+import io
+import contextlib
+import logging
+import json
+import csv
+import functools
+import random
+import numpy
+from music21 import corpus, interval
+import musicSearch
+import benchmark
+
+
+@functools.lru_cache(maxsize = None)
+def choraleIndex():
+    # a ScoreIndex of a short Bach chorale, built once for every test
+    return musicSearch.ScoreIndex(corpus.parse('bach/bwv66.6'))
+
+
+CHORALES = ('bach/bwv66.6', 'bach/bwv1.6', 'bach/bwv10.7') # a few small corpus scores for the corpus-wide tests
+
+
+def randomSequences(seed, count, length, alphabet):
+    # count random lists of up to length small integers, so patterns repeat and overlap often
+    generator = random.Random(seed)
+    return [[generator.randrange(alphabet) for num in range(0, generator.randrange(length))] for num in range(0, count)]
+
+
+def editDistance(first, second):
+    # plain dynamic programming edit distance
+    previous = list(range(0, len(second) + 1))
+    for (num, element) in enumerate(first):
+        current = [num + 1]
+        for (otherNum, other) in enumerate(second):
+            current.append(min(previous[otherNum + 1] + 1, current[otherNum] + 1, previous[otherNum] + (element != other)))
+        previous = current
+    return previous[-1]
+
+
+def bruteContourMatches(index, steps):
+    # (partNum, start, end) of every run of notes going up (1), down (-1) or repeating (0) as steps does
+    matches = []
+    for (partNum, part) in enumerate(index.parts):
+        for start in range(0, len(part.midi) - len(steps)):
+            end = start + len(steps) + 1
+            if part.isNote[start:end].all() and numpy.sign(numpy.diff(part.midi[start:end])).tolist() == steps:
+                matches.append((partNum, start, end))
+    return matches
+
+
+def noteKey(element, octave, rhythm):
+    # what exactNoteSearch (rhythm) or exactPitchSearch compares a note by, None for rests and chords
+    if not element.isNote:
+        return None
+    if octave: # octaves ignored
+        return (element.pitch.name, element.duration.type) if rhythm else (element.pitch.name,)
+    return (element.pitch.name, element.pitch.octave, element.duration.quarterLength) if rhythm else \
+           (element.pitch.name, element.pitch.octave)
+
+
+def testNoteAndPitchSearchMatchBruteForce():
+    index = choraleIndex()
+    found = 0
+    for (search, rhythm) in ((musicSearch.exactNoteSearch, 1), (musicSearch.exactPitchSearch, 0)):
+        for octave in (1, 0):
+            for (motifPart, motifStart) in ((0, 0), (1, 4), (3, 10)):
+                motif = [noteKey(element, octave, rhythm) for element in index.flatParts[motifPart].notes[motifStart:motifStart + 3]]
+                expected = []
+                for elements in index.noteParts:
+                    keys = [noteKey(element, octave, rhythm) for element in elements]
+                    expected.extend([id(element) for element in elements[start:start + 3]]
+                                    for start in range(0, len(keys) - 2) if keys[start:start + 3] == motif)
+                matches = search(index, motifPart, motifStart, motifStart + 3, octave = octave)
+                assert [[id(element) for element in match.notesAndRests] for match in matches] == expected
+                found = found + len(expected)
+    assert found > 0
+
+
+def testIterWindows():
+    for (sequence, pattern) in zip(randomSequences(1, 300, 40, 3), randomSequences(2, 300, 5, 3)):
+        if not pattern:
+            continue
+        expected = [start for start in range(0, len(sequence) - len(pattern) + 1) if sequence[start:start + len(pattern)] == pattern]
+        assert list(musicSearch.iterWindows(sequence, pattern)) == expected
+
+
+def testMotifAutomaton():
+    patterns = [pattern for pattern in randomSequences(3, 8, 5, 3) if pattern] + [[0], [0, 0], [0, 0]] # overlapping and repeated
+    automaton = musicSearch.MotifAutomaton(patterns)
+    for sequence in randomSequences(4, 200, 40, 3):
+        expected = [(start, patternNum) for (patternNum, pattern) in enumerate(patterns)
+                    for start in range(0, len(sequence) - len(pattern) + 1) if sequence[start:start + len(pattern)] == pattern]
+        assert sorted(automaton.search(sequence)) == sorted(expected)
+        assert sorted(automaton.iterSearch(sequence)) == sorted(expected)
+
+
+def testCorpusIndexLookup(tmp_path):
+    corpusIndex = musicSearch.CorpusIndex(4)
+    sequences = {'interval': [], 'pitch': []} # (scoreId, partNum, sequence) of every part
+    for path in CHORALES:
+        index = musicSearch.ScoreIndex(corpus.parse(path))
+        scoreId = corpusIndex.addScore(path, index)
+        for (partNum, part) in enumerate(index.parts):
+            sequences['interval'].append((scoreId, partNum, part.chromatic.tolist()))
+            sequences['pitch'].append((scoreId, partNum, part.midi.tolist()))
+    corpusIndex.save(str(tmp_path / 'chorales.index'))
+    loaded = musicSearch.CorpusIndex.load(str(tmp_path / 'chorales.index'))
+
+    for kind in ('interval', 'pitch'):
+        source = sequences[kind][0][2] # patterns come from the first part
+        for length in range(1, 8): # shorter than, as long as and longer than an n-gram
+            for start in range(0, len(source) - length + 1, 5):
+                pattern = source[start:start + length]
+                if musicSearch.NO_INTERVAL in pattern or -1 in pattern: # rests
+                    continue
+                expected = [(scoreId, partNum, noteNum) for (scoreId, partNum, sequence) in sequences[kind]
+                            for noteNum in range(0, len(sequence) - length + 1) if sequence[noteNum:noteNum + length] == pattern]
+                assert corpusIndex.lookup(kind, pattern) == expected
+                assert loaded.lookup(kind, pattern) == expected
+
+
+def testSearchCorpusMatchesSerialSearch():
+    paths = [str(corpus.getWork(path)) for path in CHORALES[:2]]
+    arguments = {'motifPart': 0, 'motifStart': 0, 'motifEnd': 4} # the opening of each score's own first part
+    serial = []
+    for path in paths:
+        serial.extend(sorted(musicSearch.searchScoreFile(path, musicSearch.exactIntervalSearch, arguments)))
+    matches = musicSearch.searchCorpus(paths, 'exactIntervalSearch', maxWorkers = 2, **arguments)
+    assert matches == serial
+    assert set(match[0] for match in matches) == set(paths)
+
+
+def testCorruptCacheIsRebuilt(tmp_path):
+    path = str(corpus.getWork('bach/bwv66.6'))
+    first = musicSearch.cachedScoreIndex(path, str(tmp_path))
+    assert first.clefs == choraleIndex().clefs
+    (cachePath,) = tmp_path.glob('*.npz')
+    for content in (cachePath.read_bytes()[:100], b'', b'not a zip file'): # truncated, empty, garbage
+        cachePath.write_bytes(content)
+        index = musicSearch.cachedScoreIndex(path, str(tmp_path))
+        assert [part.midi.tolist() for part in index.parts] == [part.midi.tolist() for part in first.parts]
+        with numpy.load(str(cachePath)) as cached: # written again
+            assert cached['partCount'] == len(first)
+
+
+def testSuffixArrayAndLCP():
+    for sequence in randomSequences(5, 200, 60, 4) + [[1] * 50, [0, 1] * 30]:
+        suffixArray = musicSearch.buildSuffixArray(sequence).tolist()
+        assert suffixArray == sorted(range(0, len(sequence)), key = lambda start: sequence[start:])
+        lcp = musicSearch.buildLCPArray(sequence, musicSearch.buildSuffixArray(sequence))
+        expected = [0] + [len(os.path.commonprefix([sequence[previous:], sequence[start:]]))
+                          for (previous, start) in zip(suffixArray, suffixArray[1:])]
+        assert list(lcp) == expected
+
+
+def testSuffixArrayIndexFind():
+    index = choraleIndex()
+    suffixIndex = musicSearch.SuffixArrayIndex(index)
+    parts = [part.chromatic.tolist() for part in index.parts]
+    for length in (1, 2, 3, 5, 8):
+        for start in range(0, len(parts[0]) - length + 1, 3):
+            pattern = parts[0][start:start + length]
+            if musicSearch.NO_INTERVAL in pattern:
+                continue
+            expected = [(0, partNum, noteNum) for (partNum, part) in enumerate(parts)
+                        for noteNum in range(0, len(part) - length + 1) if part[noteNum:noteNum + length] == pattern]
+            assert suffixIndex.find(pattern) == expected
+    assert suffixIndex.find([99, -99, 99]) == []
+
+
+def testMaximalRepeats():
+    suffixIndex = musicSearch.SuffixArrayIndex(choraleIndex())
+    sequence = suffixIndex.sequence
+    occurrences = {}
+    for start in range(0, len(sequence)):
+        for end in range(start + 2, len(sequence) + 1):
+            occurrences.setdefault(tuple(sequence[start:end]), []).append(start)
+    expected = set()
+    for (repeat, starts) in occurrences.items():
+        before = set(sequence[start - 1] if start > 0 else None for start in starts)
+        after = set(sequence[start + len(repeat)] if start + len(repeat) < len(sequence) else None for start in starts)
+        if len(starts) > 1 and len(before) > 1 and len(after) > 1: # can't be made longer on either side
+            expected.add((len(repeat), tuple(sorted(suffixIndex.position(start) for start in starts))))
+    repeats = suffixIndex.maximalRepeats(2)
+    assert len(repeats) == len(expected) > 0
+    assert set((length, tuple(positions)) for (length, positions) in repeats) == expected
+
+
+def testColorMatches():
+    spans = [(0, 2, 5), (1, 0, 3), (3, 10, 14), (3, 12, 13), (2, 20, 21)] # (partNum, start, end), some overlapping
+    expected = set((partNum, noteNum) for (partNum, start, end) in spans for noteNum in range(start, end))
+    for given in ('index', 'score'): # a ScoreIndex, and a plain score flattened by colorScore() itself
+        index = musicSearch.ScoreIndex(corpus.parse('bach/bwv66.6')) # not choraleIndex(), as it gets colored
+        matchTupleList = [(musicSearch.excerptMatch(index, partNum, start, end), partNum) for (partNum, start, end) in spans]
+        musicSearch.colorScore(index if given == 'index' else index.score, matchTupleList, '#00FF00')
+        colored = set((partNum, noteNum) for (partNum, elements) in enumerate(index.noteParts)
+                      for (noteNum, element) in enumerate(elements) if element.style.color == '#00FF00')
+        assert colored == expected
+
+
+def testMatchRecordsAndLazyExcerpts(tmp_path):
+    index = choraleIndex()
+    for (search, arguments) in ((musicSearch.exactNoteSearch, {}), (musicSearch.exactIntervalSearch, {'context': 1}),
+                                (musicSearch.genericIntervalSearch, {'inverse': 1}), (musicSearch.exactContourSearch, {'inverse': 1})):
+        matches = search(index, 0, 0, 4, **arguments)
+        records = search(index, 0, 0, 4, records = 1, **arguments)
+        assert len(records) == len(matches) > 0
+        for (record, match) in zip(records, matches): # the same matches, one as Streams, the other as plain values
+            assert all(isinstance(value, (int, float, str)) for value in record[1:])
+            assert [id(element) for element in record.excerpt(index).notesAndRests] == [id(element) for element in match.notesAndRests]
+            assert (record.measureStart, record.measureEnd) == (musicSearch.firstMeasure(match), musicSearch.lastMeasure(match))
+            assert record.offsetStart == match.notesAndRests[0].offset
+
+    path = str(corpus.getWork('bach/bwv66.6'))
+    musicSearch.cachedScoreIndex(path, str(tmp_path))
+    cached = musicSearch.cachedScoreIndex(path, str(tmp_path))
+    records = musicSearch.exactIntervalSearch(cached, 0, 0, 0, notes = 'A4 B4 C#5', records = 1)
+    assert records and cached._score is None # found without parsing the score
+    excerpt = records[0].excerpt(cached) # parses it now
+    assert [element.nameWithOctave for element in excerpt.notes] == \
+           [element.nameWithOctave for element in index.noteParts[records[0].partNum][records[0].noteStart:records[0].noteEnd]]
+
+
+def testIterSearchLimits():
+    index = choraleIndex()
+    everything = musicSearch.exactIntervalSearch(index, 0, 1, 3, records = 1)
+    assert len(everything) > 3 and len(set(record.partNum for record in everything)) > 1
+    assert list(musicSearch.iterExactIntervalSearch(index, 0, 1, 3)) == everything
+    for limit in range(0, len(everything) + 2):
+        assert list(musicSearch.iterExactIntervalSearch(index, 0, 1, 3, limit = limit)) == everything[:limit]
+    assert list(musicSearch.iterExactIntervalSearch(index, 0, 1, 3, stopAfterFirst = 1)) == everything[:1]
+    assert list(musicSearch.iterExactIntervalSearch(index, 0, 1, 3, parts = [1, 3])) == \
+           [record for record in everything if record.partNum in (1, 3)]
+    assert list(musicSearch.iterExactIntervalSearch(index, 0, 1, 3, measures = (2, 5))) == \
+           [record for record in everything if record.measureStart >= 2 and record.measureEnd <= 5]
+
+    pulled = [] # matches taken from the generator underneath
+    def matches():
+        motif = musicSearch.PartFeatures(musicSearch.motifFromScore(index, 0, 1, 3))
+        for match in musicSearch.intervalMatches(index, motif):
+            pulled.append(match)
+            yield match
+    assert len(list(musicSearch.iterMatches(index, matches(), limit = 2))) == 2
+    assert len(pulled) == 2 # nothing scanned past the second match
+
+
+def testEditWindows():
+    barrier = 9
+    for (sequence, pattern) in zip(randomSequences(6, 150, 40, 3), randomSequences(7, 150, 6, 3)):
+        sequence = [barrier if element == 2 and num % 7 == 0 else element for (num, element) in enumerate(sequence)]
+        for maxEdits in (1, 2):
+            if len(pattern) <= maxEdits:
+                continue
+            windows = list(musicSearch.editWindows(sequence, pattern, maxEdits, barrier))
+            expected = [] # (end, edits) of the closest end of each run of ends within maxEdits
+            first = 0
+            best = None
+            for end in range(1, len(sequence) + 1):
+                if sequence[end - 1] == barrier:
+                    if best is not None:
+                        expected.append(best)
+                    first = end
+                    best = None
+                    continue
+                edits = min(editDistance(pattern, sequence[start:end]) for start in range(first, end + 1))
+                if edits <= maxEdits:
+                    if best is None or edits < best[1]:
+                        best = (end, edits)
+                elif best is not None:
+                    expected.append(best)
+                    best = None
+            if best is not None:
+                expected.append(best)
+            assert [(end, edits) for (start, end, edits) in windows] == expected
+            for (start, end, edits) in windows:
+                assert barrier not in sequence[start:end]
+                assert editDistance(pattern, sequence[start:end]) == edits
+
+
+def oldApproxInterval(interval1, interval2):
+    # approxInterval() as it was before the class codes, straight from music21 GenericIntervals
+    if interval1 == interval2:
+        return True
+    for names in (('ascending second', 'ascending third'), ('descending second', 'descending third'),
+                  ('ascending fourth', 'ascending fifth'), ('descending fourth', 'descending fifth'),
+                  ('ascending sixth', 'ascending seventh'), ('descending sixth', 'descending seventh')):
+        group = [interval.GenericInterval(name) for name in names]
+        if interval1 in group and interval2 in group:
+            return True
+    return False
+
+
+def testApproxClassesMatchApproxInterval():
+    values = [1] + [sign * value for value in range(2, 16) for sign in (1, -1)]
+    for first in values:
+        for second in values:
+            (interval1, interval2) = (interval.GenericInterval(first), interval.GenericInterval(second))
+            assert musicSearch.approxInterval(interval1, interval2) == oldApproxInterval(interval1, interval2)
+
+    index = choraleIndex()
+    for (motifStart, motifEnd) in ((0, 4), (5, 9), (2, 5)):
+        motif = [interval.GenericInterval(value) for value in musicSearch.PartFeatures(
+                 musicSearch.motifFromScore(index, 0, motifStart, motifEnd)).generic.tolist()]
+        expected = [] # the window by window comparison genericIntervalSearch(approx = 1) used to do
+        for (partNum, part) in enumerate(index.parts):
+            partIntervals = part.generic.tolist()
+            for start in range(0, len(partIntervals) - len(motif) + 1):
+                window = partIntervals[start:start + len(motif)]
+                if musicSearch.NO_INTERVAL in window:
+                    continue
+                window = [interval.GenericInterval(value) for value in window]
+                if all(oldApproxInterval(window[num], motif[num]) for num in range(0, len(motif))):
+                    expected.append((partNum, start, 'regular'))
+                elif all(oldApproxInterval(window[num].reverse(), motif[num]) for num in range(0, len(motif))):
+                    expected.append((partNum, start, 'inverse'))
+        records = musicSearch.iterGenericIntervalSearch(index, 0, motifStart, motifEnd, approx = 1, inverse = 1)
+        assert [(record.partNum, record.noteStart, record.kind) for record in records] == expected
+        assert any(kind == 'inverse' for (partNum, start, kind) in expected)
+
+
+def testIntervalHashTable():
+    index = choraleIndex()
+    hashTable = musicSearch.IntervalHashTable([index])
+    parts = [part.chromatic.tolist() for part in index.parts]
+    for length in (1, 2, 3, 4, 5, 7): # hashed right away, and hashed on first use
+        for start in range(0, len(parts[0]) - length + 1, 3):
+            pattern = parts[0][start:start + length]
+            if musicSearch.NO_INTERVAL in pattern:
+                continue
+            expected = [(0, partNum, noteNum) for (partNum, part) in enumerate(parts)
+                        for noteNum in range(0, len(part) - length + 1) if part[noteNum:noteNum + length] == pattern]
+            assert hashTable.find(pattern) == expected
+    assert hashTable.find([99, -99, 99]) == []
+
+
+def testStrettoInverseByIntervals():
+    # with generic = 0, inverse entries are found through exact inversion
+    index = choraleIndex()
+    regular = musicSearch.strettoSearch(index, 3, 0, 3, generic = 0, records = 1)
+    both = musicSearch.strettoSearch(index, 3, 0, 3, generic = 0, inverse = 1, records = 1)
+    assert set(regular) <= set(both)
+    inverted = [pair for pair in both if 'inverse' in (pair[0].kind, pair[1].kind)]
+    assert inverted and len(both) == len(regular) + len(inverted)
+
+
+def testRhythmScale():
+    index = choraleIndex()
+    parts = [part.quarterLengths.tolist() for part in index.parts]
+    for (rhythm, scale, expected, kind) in (('C8 C8 C8 C8', 2, [1.0] * 4, 'augmentation'), # eighths, found as quarters
+                                            ('C2 C2 C2', 0.5, [1.0] * 3, 'diminution'), # halves, found as quarters
+                                            ('C4 C8 C8', 1, [1.0, 0.5, 0.5], 'regular')):
+        brute = [(partNum, start, kind) for (partNum, lengths) in enumerate(parts)
+                 for start in range(0, len(lengths) - len(expected) + 1) if lengths[start:start + len(expected)] == expected]
+        records = musicSearch.exactRhythmSearch(index, 0, 0, 0, rhythm = rhythm, scale = scale, records = 1)
+        assert [(record.partNum, record.noteStart, record.kind) for record in records] == brute
+        assert len(brute) > 0
+    assert musicSearch.exactRhythmSearch(index, 0, 0, 0, rhythm = 'C8 C8 C8 C8', scale = 3, records = 1) == []
+
+
+def testContourToNotes():
+    notes = musicSearch.contourToNotes('*udrU')
+    assert [nute.pitch.ps for nute in notes] == [67, 68, 67, 67, 68]
+
+
+def testContourSearchWithString():
+    index = choraleIndex()
+    records = musicSearch.exactContourSearch(index, 0, 0, 0, contour = '*udu', records = 1)
+    assert [(record.partNum, record.noteStart, record.noteEnd) for record in records] == bruteContourMatches(index, [1, -1, 1])
+    assert len(records) > 0
+
+
+def testRhythmContourSearch():
+    index = choraleIndex()
+    records = musicSearch.rhythmContourSearch(index, 0, 0, 0, contour = '*udu', rhythm = 'C4 C4 C4 C4', records = 1)
+    expected = [(partNum, start, end) for (partNum, start, end) in bruteContourMatches(index, [1, -1, 1])
+                if index.parts[partNum].quarterLengths[start:end].tolist() == [1.0] * 4]
+    assert [(record.partNum, record.noteStart, record.noteEnd) for record in records] == expected
+    assert len(expected) > 0
+
+
+def testRetrogradeIntervalSearch():
+    index = choraleIndex()
+    found = set()
+    for (motifStart, motifEnd) in ((0, 4), (4, 8), (9, 12)):
+        motifNotes = musicSearch.motifFromScore(index, 0, motifStart, motifEnd)
+        forward = musicSearch.PartFeatures(motifNotes).chromatic.tolist()
+        backward = ' '.join(nute.nameWithOctave for nute in reversed(list(motifNotes))) # the motif read backwards
+        forms = [('regular', [-value for value in forward[::-1]]), ('inverse', forward[::-1]),
+                 ('retrograde', forward), ('retrogradeInverse', [-value for value in forward])] # of the backward motif
+        expected = []
+        for (partNum, part) in enumerate(index.parts):
+            intervals = part.chromatic.tolist()
+            for start in range(0, len(intervals) - len(forward) + 1):
+                kinds = [kind for (kind, pattern) in forms if intervals[start:start + len(forward)] == pattern]
+                if kinds:
+                    expected.append((partNum, start, kinds[0]))
+        records = musicSearch.iterExactIntervalSearch(index, notes = backward, inverse = 1, retrograde = 1)
+        assert [(record.partNum, record.noteStart, record.kind) for record in records] == expected
+        assert (0, motifStart, 'retrograde') in expected # the motif itself
+        found.update(kind for (partNum, start, kind) in expected)
+    assert found == set(['regular', 'inverse', 'retrograde', 'retrogradeInverse'])
+
+
+def testSearchStatsAreFilledIn():
+    # a fresh score goes through every phase, a hook gets the same numbers
+    stats = musicSearch.SearchStats()
+    records = musicSearch.exactIntervalSearch(corpus.parse('bach/bwv66.6'), 0, 0, 4, records = 1, stats = stats)
+    assert stats.function == 'exactIntervalSearch' and stats.calls == 1 and stats.total > 0
+    assert records and stats.matches == len(records) and stats.windows >= stats.matches
+    assert set(['flatten', 'notesAndRests', 'features', 'match', 'excerpt']) <= set(stats.phases)
+    assert sum(stats.phases.values()) <= stats.total
+    
+    collector = musicSearch.StatsCollector()
+    musicSearch.setStatsHook(collector)
+    try:
+        musicSearch.exactIntervalSearch(choraleIndex(), 0, 0, 4, records = 1)
+        musicSearch.exactIntervalSearch(choraleIndex(), 0, 0, 4, records = 1)
+    finally:
+        musicSearch.setStatsHook(None)
+    collected = collector.byFunction['exactIntervalSearch']
+    assert collected.calls == 2 and collected.matches > 0 and collected.windows > 0
+    assert musicSearch.exactIntervalSearch(choraleIndex(), 0, 0, 4, records = 1) # no stats kept without a hook
+    assert collector.byFunction['exactIntervalSearch'].calls == 2
+
+
+def testBenchmarkRuns(tmp_path, capsys):
+    # the whole harness, on a small synthetic score and a real one, saved then compared
+    baseline = str(tmp_path / 'baseline.json')
+    arguments = ['--sizes', '200', '--repeat', '1', '--score', 'bach/bwv66.6']
+    assert benchmark.main(arguments + ['--save', baseline]) == 0
+    assert benchmark.main(arguments + ['--compare', baseline, '--threshold', '1000']) == 0
+    output = capsys.readouterr().out
+    assert 'colorScore synthetic-200' in output and 'rhythmContourSearch bwv66.6' in output
+    try:
+        benchmark.main(['--sizes', '200', '--score', 'no/such/scores'])
+    except SystemExit as error:
+        assert error.code == 2
+    else:
+        raise AssertionError('a --score without any score was accepted')
+
+
+def testQuietMode():
+    # nothing is printed once setQuiet() is called
+    index = choraleIndex()
+    output = io.StringIO()
+    musicSearch.setQuiet(logging.DEBUG)
+    try:
+        with contextlib.redirect_stdout(output):
+            musicSearch.exactNoteSearch(index, 0, 0, 3, records = 1)
+            musicSearch.exactPitchSearch(index, 0, 0, 3, records = 1)
+            musicSearch.exactRhythmSearch(index, 0, 0, 4, records = 1)
+            musicSearch.exactIntervalSearch(index, 0, 0, 4, records = 1)
+            musicSearch.exactContourSearch(index, 0, 0, 4, records = 1, inverse = 1)
+    finally:
+        musicSearch.setQuiet(None)
+    assert output.getvalue() == ''
+
+
+def testMatchExporterRoundTrip(tmp_path):
+    # JSON Lines and CSV files read back into the same records
+    records = musicSearch.exactIntervalSearch(choraleIndex(), 0, 0, 4, records = 1)
+    assert records
+    jsonPath = str(tmp_path / 'matches.jsonl')
+    csvPath = str(tmp_path / 'matches.csv')
+    assert musicSearch.exportMatches(iter(records), jsonPath) == len(records)
+    assert musicSearch.exportMatches(records, csvPath) == len(records)
+    
+    with open(jsonPath) as lines:
+        assert [musicSearch.MatchRecord(**json.loads(line)) for line in lines] == records
+    with open(csvPath, newline = '') as lines:
+        rows = list(csv.reader(lines))
+    assert tuple(rows[0]) == musicSearch.MatchRecord._fields
+    assert rows[1:] == [['' if value is None else str(value) for value in record] for record in records] # csv writes None as ''
+
+
+def exitStatus(arguments):
+    # what main(arguments) exits with, argparse errors included
+    try:
+        return musicSearch.main(arguments)
+    except SystemExit as error:
+        return error.code
+
+
+def testCommandLineExitStatus(tmp_path, capsys):
+    # 2 for a wrong motif, source, --jobs or --output (nothing searched), 1 for a score that can't be read
+    badScore = tmp_path / 'bad.xml'
+    badScore.write_text('not a score')
+    output = str(tmp_path / 'matches.jsonl')
+    assert exitStatus(['search', '--notes', 'C D E', '--format', 'jsonl', '--output', output, 'bach/bwv66.6']) == 0
+    assert exitStatus(['search', '--notes', 'C Q E', 'bach/bwv66.6']) == 2
+    assert exitStatus(['search', '--notes', 'C D E', str(tmp_path / 'missing')]) == 2
+    assert exitStatus(['search', '--notes', 'C D E', '--jobs', '-1', 'bach/bwv66.6']) == 2
+    assert exitStatus(['search', '--notes', 'C D E', '--output', str(tmp_path / 'missing' / 'out.txt'), 'bach/bwv66.6']) == 2
+    assert exitStatus(['search', '--notes', 'C D E', str(badScore)]) == 1
+    errors = capsys.readouterr().err
+    assert 'Traceback' not in errors and 'bad.xml' in errors
+
+
+def testQueryFromJsonRejectsBadFields():
+    # wrong types and negative counts are errors, not searches
+    for fields in ({'notes': 'C D E', 'inverse': 'yes'}, {'notes': 'C D E', 'retrograde': 1},
+                   {'type': 'approximate', 'notes': 'C D E', 'maxEdits': -1}, {'notes': 'C D E', 'limit': -2},
+                   {'notes': 'C D E', 'maxEdits': None}):
+        try:
+            musicSearch.queryFromJson(fields)
+        except ValueError:
+            continue
+        raise AssertionError('%r was accepted' % fields)
+    query = musicSearch.queryFromJson({'notes': 'C D E', 'inverse': True, 'limit': 0})
+    assert query['arguments']['inverse'] is True
+
+
+def testListSearchesUseMotifCache():
+    # the motif is parsed once, and a cached motif finds the same matches
+    index = choraleIndex()
+    musicSearch.motifCache.clear()
+    first = musicSearch.exactIntervalSearch(index, 0, 0, 0, notes = 'A4 B4 C#5', records = 1)
+    second = musicSearch.genericIntervalSearch(index, 0, 0, 0, notes = 'A4 B4 C#5', records = 1)
+    again = musicSearch.exactIntervalSearch(index, 0, 0, 0, notes = 'A4 B4 C#5', records = 1)
+    info = musicSearch.motifCache.info()
+    assert (info['misses'], info['hits']) == (1, 2)
+    assert first and first == again and len(second) >= len(first)